@@ -0,0 +1,163 @@
+import bisect
+import json
+import os
+from collections import namedtuple
+from datetime import date
+from functools import lru_cache
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "achievements.json")
+
+ANSWER_CORRECT = "answer_correct"
+LESSON_COMPLETED = "lesson_completed"
+# Lesson of a rule that counts for whichever lesson the event happened in
+ANY_LESSON = "*"
+
+# Game state kept by GameSession itself
+SESSION_COUNTERS = ("score", "streak", "best_streak", "lessons_completed")
+# Kept by AchievementTracker: lifetime, per lesson, and for the current day
+LIFETIME_COUNTERS = ("correct_answers",)
+LESSON_COUNTERS = ("lesson_correct_answers", "lesson_completions")
+DAY_COUNTERS = ("day_correct_answers", "day_lessons_completed")
+COUNTERS = SESSION_COUNTERS + LIFETIME_COUNTERS + LESSON_COUNTERS + DAY_COUNTERS
+
+# The counters an event can raise; only rules on these are looked at
+EVENT_COUNTERS = {
+    ANSWER_CORRECT: (
+        "score", "streak", "best_streak", "correct_answers", "lesson_correct_answers", "day_correct_answers"
+    ),
+    LESSON_COMPLETED: ("lessons_completed", "lesson_completions", "day_lessons_completed"),
+}
+
+Rule = namedtuple("Rule", ["badge", "description", "counter", "threshold", "lesson"])
+
+
+def parse_rules(data):
+    # Raises ValueError naming the first invalid rule
+    rules = []
+    badges = set()
+    for number, item in enumerate(data, 1):
+        try:
+            rule = Rule(item["badge"], item["description"], item["counter"], item["threshold"], item.get("lesson"))
+        except (KeyError, TypeError):
+            raise ValueError(f"Rule {number} needs badge, description, counter and threshold")
+        if rule.counter not in COUNTERS:
+            raise ValueError(f"Rule {number} ({rule.badge}): unknown counter {rule.counter!r}")
+        if not isinstance(rule.threshold, int) or rule.threshold < 1:
+            raise ValueError(f"Rule {number} ({rule.badge}): threshold must be a positive integer")
+        if (rule.lesson is not None) != (rule.counter in LESSON_COUNTERS):
+            raise ValueError(f"Rule {number} ({rule.badge}): 'lesson' is required for lesson counters and only for them")
+        if rule.badge in badges:
+            raise ValueError(f"Rule {number}: duplicate badge {rule.badge!r}")
+        badges.add(rule.badge)
+        rules.append(rule)
+    return AchievementRules(rules)
+
+
+def load_rules(path=DEFAULT_RULES_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return parse_rules(json.load(f))
+
+
+@lru_cache(maxsize=None)
+def default_rules():
+    return load_rules()
+
+
+class AchievementRules:
+    # Rules indexed by (counter, lesson) and sorted by threshold, so an increase finds the rules it crosses by bisection
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        by_key = {}
+        for rule in self.rules:
+            by_key.setdefault((rule.counter, rule.lesson), []).append(rule)
+        # (counter, lesson) -> (thresholds, rules) in ascending threshold order
+        self._index = {}
+        for key, rules_for_key in by_key.items():
+            rules_for_key.sort(key=lambda rule: rule.threshold)
+            self._index[key] = ([rule.threshold for rule in rules_for_key], rules_for_key)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def crossed(self, counter, lesson, old, new):
+        # Rules on counter with old < threshold <= new; lesson counters also match ANY_LESSON rules
+        keys = [(counter, lesson), (counter, ANY_LESSON)] if counter in LESSON_COUNTERS else [(counter, None)]
+        for key in keys:
+            entry = self._index.get(key)
+            if entry is None:
+                continue
+            thresholds, rules = entry
+            yield from rules[bisect.bisect_right(thresholds, old):bisect.bisect_right(thresholds, new)]
+
+
+class AchievementTracker:
+    # One learner's lesson and day counters plus the counter values rules were last checked against
+
+    def __init__(self, rules, counters=None, today=None):
+        self.rules = rules
+        counters = counters or {}
+        self.correct_answers = counters.get("correct_answers", 0)
+        # lesson -> {"correct_answers": n, "completions": n}
+        self.lessons = {name: dict(values) for name, values in counters.get("lessons", {}).items()}
+        self.day = dict(counters.get("day", {}))
+        self._roll_day(today)
+        # (counter, lesson or None) -> value last checked
+        self._checked = {}
+
+    def _roll_day(self, today=None):
+        today = (today or date.today()).isoformat()
+        if self.day.get("date") != today:
+            self.day = {"date": today, "correct_answers": 0, "lessons_completed": 0}
+
+    def to_dict(self):
+        return {"correct_answers": self.correct_answers, "lessons": self.lessons, "day": self.day}
+
+    def value(self, counter, lesson, stats):
+        if counter in SESSION_COUNTERS:
+            return stats[counter]
+        if counter == "correct_answers":
+            return self.correct_answers
+        if counter == "lesson_correct_answers":
+            return self.lessons.get(lesson, {}).get("correct_answers", 0)
+        if counter == "lesson_completions":
+            return self.lessons.get(lesson, {}).get("completions", 0)
+        return self.day["correct_answers" if counter == "day_correct_answers" else "lessons_completed"]
+
+    def _check(self, counter, lesson, stats, unlocked):
+        key = (counter, lesson if counter in LESSON_COUNTERS else None)
+        new = self.value(counter, lesson, stats)
+        old = self._checked.get(key, 0)
+        # After a counter dropped (a broken streak, a new day, a reset) everything up to its value is checked again
+        if new < old:
+            old = 0
+        self._checked[key] = new
+        return [rule for rule in self.rules.crossed(counter, lesson, old, new) if rule.badge not in unlocked]
+
+    def record(self, event, lesson, stats, unlocked):
+        # Counts the event and returns the not yet unlocked rules it satisfies; stats holds the SESSION_COUNTERS
+        self._roll_day()
+        counts = self.lessons.setdefault(lesson, {"correct_answers": 0, "completions": 0})
+        if event == ANSWER_CORRECT:
+            self.correct_answers += 1
+            counts["correct_answers"] += 1
+            self.day["correct_answers"] += 1
+        elif event == LESSON_COMPLETED:
+            counts["completions"] += 1
+            self.day["lessons_completed"] += 1
+        satisfied = []
+        for counter in EVENT_COUNTERS[event]:
+            satisfied.extend(self._check(counter, lesson, stats, unlocked))
+        return satisfied
+
+    def check_all(self, stats, unlocked):
+        # Full evaluation, once per loaded session, so rules added to the file later are awarded too
+        self._roll_day()
+        satisfied = []
+        for counter in COUNTERS:
+            if counter in LESSON_COUNTERS:
+                for lesson in self.lessons:
+                    satisfied.extend(self._check(counter, lesson, stats, unlocked))
+            else:
+                satisfied.extend(self._check(counter, None, stats, unlocked))
+        return satisfied
@@ -0,0 +1,477 @@
+import argparse
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from progress_store import JsonProgressBackend, SqliteProgressBackend, open_backend
+
+# Users handed to a worker process per task
+CHUNK_SIZE = 2000
+# Snapshot records written per SQLite transaction
+BATCH_SIZE = 5000
+SNAPSHOT_HEADER = {"format": "yigit-progress-snapshot", "version": 1}
+INT_FIELDS = ("score", "streak", "best_streak", "lessons_completed", "question_index")
+
+# Backend of the current worker process, opened once by _init_worker
+_backend = None
+
+
+def _init_worker(kind, location):
+    global _backend
+    _backend = open_backend(kind, location)
+
+
+def chunks(items, size=CHUNK_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def parallel_map(function, tasks, kind, location, workers, window=None):
+    # Like Executor.map over a process pool, but with at most window tasks in flight so results stream in bounded memory
+    window = window or workers * 4
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(kind, location)) as executor:
+        pending = deque()
+        for task in tasks:
+            pending.append(executor.submit(function, *task))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def progress_error(progress):
+    # Why progress cannot be used, or None
+    if not isinstance(progress, dict):
+        return "progress is not an object"
+    for field in INT_FIELDS:
+        value = progress.get(field, 0)
+        if not isinstance(value, int) or isinstance(value, bool) or value < 0:
+            return f"{field} is not a non-negative integer"
+    if not isinstance(progress.get("current_lesson"), (str, type(None))):
+        return "current_lesson is not a string"
+    if not isinstance(progress.get("counters", {}), dict):
+        return "counters is not an object"
+    return None
+
+
+def achievements_error(achievements):
+    if not isinstance(achievements, dict):
+        return "achievements are not an object"
+    if not all(isinstance(key, str) and isinstance(value, str) for key, value in achievements.items()):
+        return "achievements are not badge/description strings"
+    return None
+
+
+def load_user_parts(username):
+    # (progress, achievements, {"progress" and/or "achievements": error}) of one user of the worker's backend
+    progress, achievements, errors = None, None, {}
+    try:
+        progress = _backend.load_progress(username)
+    except ValueError as e:
+        errors["progress"] = f"unreadable: {e}"
+    else:
+        error = progress is not None and progress_error(progress)
+        if error:
+            errors["progress"] = error
+    try:
+        achievements = _backend.load_achievements(username)
+    except ValueError as e:
+        errors["achievements"] = f"unreadable: {e}"
+    else:
+        error = achievements_error(achievements)
+        if error:
+            errors["achievements"] = error
+    return progress, achievements, errors
+
+
+def load_user(username):
+    # (progress, achievements, error) of one user of the worker's backend
+    progress, achievements, errors = load_user_parts(username)
+    if errors:
+        return None, None, "; ".join(errors.values())
+    return progress, achievements, None
+
+
+def _quarantine_json(path, directory):
+    # Moves path out of the progress directory so the app treats the user as new instead of failing
+    if not os.path.exists(path):
+        return
+    os.makedirs(directory, exist_ok=True)
+    os.replace(path, os.path.join(directory, f"{os.path.basename(path)}.{int(time.time())}"))
+
+
+def validate_chunk(usernames, quarantine):
+    # [(username, error)] of the chunk's invalid users; when asked and the backend is JSON, their invalid files
+    # are quarantined and the valid ones kept
+    invalid = []
+    for username in usernames:
+        _, _, errors = load_user_parts(username)
+        if not errors:
+            continue
+        invalid.append((username, "; ".join(errors.values())))
+        if quarantine and isinstance(_backend, JsonProgressBackend):
+            if "progress" in errors:
+                _quarantine_json(_backend.progress_path(username), quarantine)
+            if "achievements" in errors:
+                _quarantine_json(_backend.achievements_path(username), quarantine)
+    return invalid
+
+
+def export_chunk(usernames):
+    # ([(username, progress, achievements)], [(username, error)])
+    records, invalid = [], []
+    for username in usernames:
+        progress, achievements, error = load_user(username)
+        if error is None:
+            records.append((username, progress, achievements))
+        else:
+            invalid.append((username, error))
+    return records, invalid
+
+
+def restore_chunk(records, overwrite):
+    # Number of users written; existing users are skipped unless overwrite
+    written = 0
+    for username, progress, achievements in records:
+        if not overwrite:
+            try:
+                if _backend.load_progress(username) is not None:
+                    continue
+            except ValueError:
+                # Unreadable state is replaced by the snapshot's
+                pass
+        # Users without badges get no achievements file, as in the app
+        _backend.save(username, progress=progress, achievements=achievements or None)
+        written += 1
+    return written
+
+
+def remap_progress(progress, mapping):
+    # The progress with renamed lessons, or None when nothing refers to a renamed lesson
+    changed = False
+    if progress.get("current_lesson") in mapping:
+        progress = dict(progress, current_lesson=mapping[progress["current_lesson"]])
+        changed = True
+    lessons = progress.get("counters", {}).get("lessons", {})
+    if any(name in mapping for name in lessons):
+        # Counters of two lessons merged into one by the rename are added up
+        remapped = {}
+        for name, counts in lessons.items():
+            target = remapped.setdefault(mapping.get(name, name), {})
+            for key, value in counts.items():
+                target[key] = target.get(key, 0) + value
+        progress = dict(progress, counters=dict(progress["counters"], lessons=remapped))
+        changed = True
+    return progress if changed else None
+
+
+def remap_chunk(usernames, mapping, dry_run):
+    remapped = 0
+    for username in usernames:
+        progress, _, error = load_user(username)
+        if error is not None or progress is None:
+            continue
+        progress = remap_progress(progress, mapping)
+        if progress is None:
+            continue
+        remapped += 1
+        if not dry_run:
+            _backend.save(username, progress=progress)
+    return remapped
+
+
+def stats_chunk(usernames):
+    stats = {
+        "users": 0,
+        "with_progress": 0,
+        "invalid": 0,
+        "scores": [],
+        "lessons_completed": [],
+        "current_lessons": Counter(),
+        "badges": Counter(),
+    }
+    for username in usernames:
+        stats["users"] += 1
+        progress, achievements, error = load_user(username)
+        if error is not None:
+            stats["invalid"] += 1
+            continue
+        stats["badges"].update(achievements.keys())
+        if progress is not None:
+            stats["with_progress"] += 1
+            stats["scores"].append(progress.get("score", 0))
+            stats["lessons_completed"].append(progress.get("lessons_completed", 0))
+            stats["current_lessons"][progress.get("current_lesson")] += 1
+    return stats
+
+
+def merge_stats(total, part):
+    for key, value in part.items():
+        if key not in total:
+            total[key] = value
+        elif isinstance(value, list):
+            total[key].extend(value)
+        else:
+            total[key] += value
+    return total
+
+
+def summarize(values):
+    if not values:
+        return {}
+    values.sort()
+    return {
+        "sum": sum(values),
+        "mean": round(sum(values) / len(values), 2),
+        "p50": values[len(values) // 2],
+        "p90": values[int(len(values) * 0.9)],
+        "max": values[-1],
+    }
+
+
+def open_snapshot_writer(path):
+    # Returns (write(records), close()) for a .jsonl.gz or SQLite snapshot
+    if path.endswith(".gz"):
+        f = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+        f.write(json.dumps(dict(SNAPSHOT_HEADER, created=time.time())) + "\n")
+
+        def write(records):
+            for username, progress, achievements in records:
+                f.write(json.dumps(
+                    {"username": username, "progress": progress, "achievements": achievements},
+                    ensure_ascii=False, separators=(",", ":")
+                ) + "\n")
+        return write, f.close
+    if os.path.exists(path):
+        raise SystemExit(f"{path} already exists")
+    target = SqliteProgressBackend(path)
+    return target.save_many, target.close
+
+
+def read_snapshot(path):
+    # Yields (username, progress, achievements) from a snapshot written by export
+    if path.endswith(".gz"):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline() or "{}")
+            if header.get("format") != SNAPSHOT_HEADER["format"]:
+                raise SystemExit(f"{path} is not a progress snapshot")
+            for line in f:
+                record = json.loads(line)
+                yield record["username"], record["progress"], record["achievements"]
+        return
+    try:
+        source = SqliteProgressBackend(path)
+        for username in source.usernames():
+            yield username, source.load_progress(username), source.load_achievements(username)
+    except sqlite3.DatabaseError as e:
+        raise SystemExit(f"{path} is not a progress snapshot: {e}")
+
+
+def batched(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def report_invalid(invalid, limit=20):
+    for username, error in invalid[:limit]:
+        print(f"  {username}: {error}")
+    if len(invalid) > limit:
+        print(f"  ... and {len(invalid) - limit} more")
+
+
+def list_usernames(args):
+    return open_backend(args.backend, args.location).usernames()
+
+
+def command_validate(args):
+    usernames = list_usernames(args)
+    if args.quarantine and args.backend != "json":
+        print("quarantine only moves JSON files; SQLite rows are reported only", file=sys.stderr)
+    invalid = []
+    for part in parallel_map(
+        validate_chunk, ((chunk, args.quarantine) for chunk in chunks(usernames)), args.backend, args.location,
+        args.workers
+    ):
+        invalid.extend(part)
+    if args.backend == "sqlite":
+        with sqlite3.connect(args.location) as conn:
+            integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        print(f"SQLite integrity check: {integrity}")
+    print(f"checked {len(usernames)} users, {len(invalid)} invalid")
+    report_invalid(invalid)
+    if invalid and args.quarantine and args.backend == "json":
+        print(f"moved their files to {args.quarantine}")
+    return 1 if invalid and not args.quarantine else 0
+
+
+def command_export(args):
+    usernames = list_usernames(args)
+    write, close = open_snapshot_writer(args.snapshot)
+    exported, invalid = 0, []
+    try:
+        for records, part_invalid in parallel_map(
+            export_chunk, ((chunk,) for chunk in chunks(usernames)), args.backend, args.location, args.workers
+        ):
+            write(records)
+            exported += len(records)
+            invalid.extend(part_invalid)
+    finally:
+        close()
+    print(f"exported {exported} users to {args.snapshot}, skipped {len(invalid)} invalid")
+    report_invalid(invalid)
+    return 0
+
+
+def command_restore(args):
+    # Restoring into a new, empty location is the usual case, so it is created rather than listed up front
+    records = read_snapshot(args.snapshot)
+    restored = 0
+    if args.backend == "sqlite":
+        # One writer with large transactions beats several processes contending for the database lock
+        target = SqliteProgressBackend(args.location)
+        existing = set(target.usernames())
+        for batch in batched(records, BATCH_SIZE):
+            if not args.overwrite:
+                batch = [record for record in batch if record[0] not in existing]
+            target.save_many(batch)
+            restored += len(batch)
+        target.close()
+    else:
+        os.makedirs(args.location, exist_ok=True)
+        tasks = ((batch, args.overwrite) for batch in batched(records, CHUNK_SIZE))
+        restored = sum(parallel_map(restore_chunk, tasks, args.backend, args.location, args.workers))
+    print(f"restored {restored} users from {args.snapshot}")
+    return 0
+
+
+def load_mapping(args):
+    mapping = {}
+    if args.mapping_file:
+        with open(args.mapping_file, "r", encoding="utf-8") as f:
+            mapping.update(json.load(f))
+    for pair in args.rename:
+        old, separator, new = pair.partition("=")
+        if not separator or not old or not new:
+            raise SystemExit(f"--rename expects OLD=NEW, got {pair!r}")
+        mapping[old] = new
+    if not mapping:
+        raise SystemExit("no renames given, use --rename OLD=NEW or --mapping-file")
+    return mapping
+
+
+def command_remap(args):
+    usernames = list_usernames(args)
+    mapping = load_mapping(args)
+    if args.lessons:
+        with open(args.lessons, "r", encoding="utf-8") as f:
+            known = set(json.load(f))
+        unknown = sorted(set(mapping.values()) - known)
+        if unknown:
+            raise SystemExit(f"not in {args.lessons}: {', '.join(unknown)}")
+    remapped = sum(parallel_map(
+        remap_chunk, ((chunk, mapping, args.dry_run) for chunk in chunks(usernames)), args.backend, args.location,
+        args.workers
+    ))
+    # Spaced-repetition cards refer to lessons by name as well
+    cards = 0
+    if args.reviews and os.path.exists(args.reviews):
+        with sqlite3.connect(args.reviews) as conn:
+            for old, new in mapping.items():
+                if args.dry_run:
+                    cards += conn.execute("SELECT COUNT(*) FROM cards WHERE lesson = ?", (old,)).fetchone()[0]
+                else:
+                    cards += conn.execute(
+                        "UPDATE OR REPLACE cards SET lesson = ? WHERE lesson = ?", (new, old)
+                    ).rowcount
+    verb = "would remap" if args.dry_run else "remapped"
+    print(f"{verb} {remapped} of {len(usernames)} users and {cards} review cards")
+    return 0
+
+
+def command_stats(args):
+    usernames = list_usernames(args)
+    total = {}
+    for part in parallel_map(
+        stats_chunk, ((chunk,) for chunk in chunks(usernames)), args.backend, args.location, args.workers
+    ):
+        merge_stats(total, part)
+    report = {
+        "users": total.get("users", 0),
+        "with_progress": total.get("with_progress", 0),
+        "invalid": total.get("invalid", 0),
+        "score": summarize(total.get("scores", [])),
+        "lessons_completed": summarize(total.get("lessons_completed", [])),
+        "current_lessons": dict(total.get("current_lessons", Counter()).most_common(args.top)),
+        "badges": dict(total.get("badges", Counter()).most_common(args.top)),
+    }
+    if args.backend == "json":
+        report["bytes_on_disk"] = sum(
+            entry.stat().st_size for entry in os.scandir(args.location)
+            if entry.is_file() and entry.name.endswith((JsonProgressBackend.PROGRESS_SUFFIX,
+                                                        JsonProgressBackend.ACHIEVEMENTS_SUFFIX))
+        )
+    else:
+        report["bytes_on_disk"] = os.path.getsize(args.location)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect, back up and repair the progress of all users.")
+    parser.add_argument("--backend", choices=["json", "sqlite"], default=os.environ.get("PROGRESS_BACKEND", "json"))
+    parser.add_argument("--location", help="progress directory or database, defaults to PROGRESS_PATH")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    validate = commands.add_parser("validate", help="check every user's state")
+    validate.add_argument("--quarantine", metavar="DIR", help="move corrupt JSON files to DIR")
+    validate.set_defaults(run=command_validate)
+
+    export = commands.add_parser("export", help="write all users to a .jsonl.gz or SQLite snapshot")
+    export.add_argument("snapshot")
+    export.set_defaults(run=command_export)
+
+    restore = commands.add_parser("restore", help="load users from a snapshot")
+    restore.add_argument("snapshot")
+    restore.add_argument("--overwrite", action="store_true", help="replace users that already exist")
+    restore.set_defaults(run=command_restore)
+
+    remap = commands.add_parser("remap-lessons", help="follow renamed lessons in current_lesson and counters")
+    remap.add_argument("--rename", action="append", default=[], metavar="OLD=NEW")
+    remap.add_argument("--mapping-file", help="JSON object of old to new lesson names")
+    remap.add_argument("--lessons", help="lessons.json that every new name must exist in")
+    remap.add_argument("--reviews", default=os.environ.get("REVIEW_DB_PATH", "reviews.db"),
+                       help="review database whose cards are renamed too")
+    remap.add_argument("--dry-run", action="store_true")
+    remap.set_defaults(run=command_remap)
+
+    stats = commands.add_parser("stats", help="report aggregate statistics")
+    stats.add_argument("--top", type=int, default=10)
+    stats.set_defaults(run=command_stats)
+
+    args = parser.parse_args(argv)
+    args.location = args.location or os.environ.get("PROGRESS_PATH") or (
+        "." if args.backend == "json" else "progress.db"
+    )
+    if args.command != "restore" and not os.path.exists(args.location):
+        raise SystemExit(f"{args.location} does not exist")
+
+    started = time.perf_counter()
+    status = args.run(args)
+    print(f"done in {time.perf_counter() - started:.1f} s", file=sys.stderr)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# transliterate: accept ae/oe/ue/ss for ä/ö/ü/ß; max_typos: character edits tolerated per word
+MatchOptions = namedtuple("MatchOptions", ["transliterate", "max_typos"], defaults=[False, 0])
+EXACT = MatchOptions()
+
+# Only words this long may contain typos, so short function words must still be exact
+MIN_TYPO_WORD_LENGTH = 4
+# Extra diagonals searched on top of the length difference of the two answers
+BAND_SLACK = 4
+
+EQUAL, APPROX, SUBSTITUTE, INSERT, DELETE = "equal", "approx", "substitute", "insert", "delete"
+MATCHED = (EQUAL, APPROX)
+
+_PUNCTUATION = re.compile(r'[,.]')
+_TRANSLITERATIONS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+
+
+def clean_text(text):
+    return _PUNCTUATION.sub('', text.lower().strip())
+
+
+@lru_cache(maxsize=8192)
+def answer_tokens(text):
+    # Lesson answers repeat on every attempt, so their normalized tokens are computed once
+    return tuple(clean_text(text).split())
+
+
+def edit_distance(a, b, limit):
+    # Levenshtein distance, or limit + 1 as soon as it is known to exceed limit
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+@lru_cache(maxsize=65536)
+def token_match(expected, actual, options=EXACT):
+    if expected == actual:
+        return EQUAL
+    if options.transliterate:
+        expected = expected.translate(_TRANSLITERATIONS)
+        actual = actual.translate(_TRANSLITERATIONS)
+        if expected == actual:
+            return APPROX
+    if options.max_typos and len(expected) >= MIN_TYPO_WORD_LENGTH:
+        if edit_distance(expected, actual, options.max_typos) <= options.max_typos:
+            return APPROX
+    return None
+
+
+def align(expected, actual, options=EXACT):
+    # Banded edit-distance alignment of two token sequences.
+    # Returns a list of (op, expected_token, actual_token) in sentence order.
+    n, m = len(expected), len(actual)
+    band = abs(n - m) + BAND_SLACK
+    infinity = float("inf")
+    # Costs are doubled so an approximate match (1) is cheaper than an edit (2) but dearer than an exact match (0)
+    cost = [[infinity] * (m + 1) for _ in range(n + 1)]
+    step = [[None] * (m + 1) for _ in range(n + 1)]
+    cost[0][0] = 0
+    for i in range(n + 1):
+        for j in range(max(0, i - band), min(m, i + band) + 1):
+            if i == 0 and j == 0:
+                continue
+            best, best_step = infinity, None
+            if i and j:
+                match = token_match(expected[i - 1], actual[j - 1], options)
+                if match == EQUAL:
+                    best, best_step = cost[i - 1][j - 1], EQUAL
+                elif match == APPROX:
+                    best, best_step = cost[i - 1][j - 1] + 1, APPROX
+                else:
+                    best, best_step = cost[i - 1][j - 1] + 2, SUBSTITUTE
+            # On a tie with a substitution the gap is taken here, at the later word: ops are read back from the end,
+            # so the sentence then starts with the substitution and a missing or extra word is reported last
+            if i and (cost[i - 1][j] + 2 < best or cost[i - 1][j] + 2 == best and best_step == SUBSTITUTE):
+                best, best_step = cost[i - 1][j] + 2, DELETE
+            if j and (cost[i][j - 1] + 2 < best or cost[i][j - 1] + 2 == best and best_step == SUBSTITUTE):
+                best, best_step = cost[i][j - 1] + 2, INSERT
+            cost[i][j] = best
+            step[i][j] = best_step
+
+    ops = []
+    i, j = n, m
+    while i or j:
+        op = step[i][j]
+        if op == DELETE:
+            ops.append((op, expected[i - 1], None))
+            i -= 1
+        elif op == INSERT:
+            ops.append((op, None, actual[j - 1]))
+            j -= 1
+        else:
+            ops.append((op, expected[i - 1], actual[j - 1]))
+            i -= 1
+            j -= 1
+    ops.reverse()
+    return ops
+
+
+def diff_answer(user_answer, correct_answer, options=EXACT):
+    return align(answer_tokens(correct_answer), tuple(clean_text(user_answer).split()), options)
+
+
+def is_correct(ops):
+    return all(op in MATCHED for op, _, _ in ops)
+
+
+def next_word(ops):
+    # First word of the correct answer that the user has not (yet) got right
+    for op, expected, _ in ops:
+        if op in (SUBSTITUTE, DELETE):
+            return expected
+    return ""
+
+
+def first_mistake(ops):
+    # (expected, given) at the first word that differs, with "" for a missing or an extra word; None if all match
+    for op, expected, actual in ops:
+        if op not in MATCHED:
+            return expected or "", actual or ""
+    return None
+
+
+def colored_html(ops):
+    colors = {EQUAL: "darkgreen", APPROX: "darkorange", SUBSTITUTE: "red", INSERT: "red"}
+    # Words missing at the end are simply not typed yet, only gaps inside the answer are marked
+    last_typed = max((k for k, (op, _, _) in enumerate(ops) if op != DELETE), default=-1)
+    words = []
+    for k, (op, _, actual) in enumerate(ops):
+        if op != DELETE:
+            words.append(f'<span style="color: {colors[op]};">{actual}</span>')
+        elif k < last_typed:
+            words.append('<span style="color: gray;">…</span>')
+    return " ".join(words)
@@ -0,0 +1,104 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOG_DIR = "attempt_logs"
+# A segment is closed and a new one started once it grows past this size
+DEFAULT_SEGMENT_BYTES = 16 * 1024 * 1024
+# Events waiting for the writer beyond this are dropped rather than held in memory
+MAX_PENDING_EVENTS = 100_000
+
+# Segments being written end in OPEN_SUFFIX and are renamed to CLOSED_SUFFIX when rotated or closed
+OPEN_SUFFIX = ".jsonl.part"
+CLOSED_SUFFIX = ".jsonl"
+
+
+def segment_name(path):
+    # Segment name without its open/closed suffix, stable across the rename on rotation
+    name = os.path.basename(path)
+    for suffix in (OPEN_SUFFIX, CLOSED_SUFFIX):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return None
+
+
+class AttemptLog:
+    # Append-only JSON Lines log of answer attempts; record() only queues, a background thread writes in batches
+
+    def __init__(self, directory=DEFAULT_LOG_DIR, segment_bytes=DEFAULT_SEGMENT_BYTES, flush_interval=1.0):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        # deque.append and popleft are atomic, so record() needs no lock
+        self._pending = deque()
+        self._file = None
+        self._segment = None
+        self._sequence = 0
+        # Serializes writes between the background thread and explicit flushes
+        self._write_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="attempt-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def record(self, event):
+        if len(self._pending) >= MAX_PENDING_EVENTS:
+            self.dropped += 1
+            return
+        self._pending.append(event)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def _open_segment(self):
+        self._sequence += 1
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        self._segment = os.path.join(self.directory, f"attempts-{stamp}-{os.getpid()}-{self._sequence}")
+        self._file = open(self._segment + OPEN_SUFFIX, "a", encoding="utf-8")
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.close()
+        os.replace(self._segment + OPEN_SUFFIX, self._segment + CLOSED_SUFFIX)
+        self._file = None
+        self._segment = None
+
+    def flush(self):
+        with self._write_lock:
+            lines = []
+            while self._pending:
+                lines.append(json.dumps(self._pending.popleft(), ensure_ascii=False, separators=(",", ":")))
+            if not lines:
+                return
+            try:
+                if self._file is None:
+                    self._open_segment()
+                self._file.write("\n".join(lines) + "\n")
+                self._file.flush()
+                self.written += len(lines)
+                if self._file.tell() >= self.segment_bytes:
+                    self._close_segment()
+            except OSError:
+                logger.exception("Could not write %d attempt events, dropping them", len(lines))
+                self.dropped += len(lines)
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+        with self._write_lock:
+            self._close_segment()
+        atexit.unregister(self.close)
@@ -0,0 +1,162 @@
+import argparse
+import json
+import os
+from collections import Counter
+from datetime import datetime
+
+from attempt_log import CLOSED_SUFFIX, DEFAULT_LOG_DIR, segment_name
+from sqlite_db import SqliteDatabase
+
+# Events read per transaction while aggregating
+BATCH_EVENTS = 50_000
+
+
+class AttemptStats(SqliteDatabase):
+    # Per-question difficulty and common mistakes, rolled up from the attempt log segments
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS question_stats (
+            lesson TEXT NOT NULL,
+            question_index INTEGER NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            wrong INTEGER NOT NULL DEFAULT 0,
+            solved INTEGER NOT NULL DEFAULT 0,
+            solved_first_try INTEGER NOT NULL DEFAULT 0,
+            latency_seconds REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (lesson, question_index)
+        );
+        CREATE TABLE IF NOT EXISTS mistakes (
+            lesson TEXT NOT NULL,
+            question_index INTEGER NOT NULL,
+            expected TEXT NOT NULL,
+            given TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (lesson, question_index, expected, given)
+        );
+        CREATE TABLE IF NOT EXISTS ingested (
+            segment TEXT PRIMARY KEY,
+            offset INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path="attempt_stats.db"):
+        super().__init__(path)
+
+    def _commit(self, questions, mistakes, segment, offset):
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO question_stats "
+                "(lesson, question_index, attempts, wrong, solved, solved_first_try, latency_seconds) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (lesson, question_index) DO UPDATE SET "
+                "attempts = attempts + excluded.attempts, wrong = wrong + excluded.wrong, "
+                "solved = solved + excluded.solved, solved_first_try = solved_first_try + excluded.solved_first_try, "
+                "latency_seconds = latency_seconds + excluded.latency_seconds",
+                [(*key, *counts) for key, counts in questions.items()],
+            )
+            conn.executemany(
+                "INSERT INTO mistakes (lesson, question_index, expected, given, count) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (lesson, question_index, expected, given) DO UPDATE SET count = count + excluded.count",
+                [(*key, count) for key, count in mistakes.items()],
+            )
+            conn.execute("INSERT OR REPLACE INTO ingested (segment, offset) VALUES (?, ?)", (segment, offset))
+
+    def _ingest(self, path, segment, offset):
+        # Adds the complete lines of one segment past offset and returns (events, new offset);
+        # a line still being written is left for the next run
+        questions = {}
+        mistakes = Counter()
+        events = 0
+        with open(path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                try:
+                    event = json.loads(line)
+                    key = (event["lesson"], event["question_index"])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                counts = questions.setdefault(key, [0, 0, 0, 0, 0.0])
+                counts[0] += 1
+                counts[4] += event.get("latency", 0.0)
+                if event.get("correct"):
+                    counts[2] += 1
+                    counts[3] += event.get("attempts") == 1
+                else:
+                    counts[1] += 1
+                    if event.get("expected") is not None:
+                        mistakes[(*key, event["expected"], event.get("given", ""))] += 1
+                events += 1
+                if events % BATCH_EVENTS == 0:
+                    self._commit(questions, mistakes, segment, offset)
+                    questions, mistakes = {}, Counter()
+        self._commit(questions, mistakes, segment, offset)
+        return events, offset
+
+    def aggregate(self, log_dir=DEFAULT_LOG_DIR, prune=False):
+        # Rolls up everything appended since the last run; returns the number of events added
+        done = dict(self._query("SELECT segment, offset FROM ingested"))
+        events = 0
+        for entry in sorted(os.scandir(log_dir), key=lambda entry: entry.name):
+            segment = segment_name(entry.name)
+            if segment is None or not entry.is_file():
+                continue
+            offset = done.get(segment, 0)
+            try:
+                size = entry.stat().st_size
+                if size > offset:
+                    added, offset = self._ingest(entry.path, segment, offset)
+                    events += added
+                # Closed segments are never appended to again
+                if prune and entry.name.endswith(CLOSED_SUFFIX) and offset >= size:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                # Renamed from OPEN_SUFFIX to CLOSED_SUFFIX meanwhile, picked up on the next run
+                continue
+        return events
+
+    def hardest(self, limit=20, min_attempts=5):
+        # [(lesson, question index, attempts, error rate, first-try rate, mean seconds)], highest error rate first
+        return self._query(
+            "SELECT lesson, question_index, attempts, CAST(wrong AS REAL) / attempts, "
+            "CAST(solved_first_try AS REAL) / MAX(solved, 1), latency_seconds / attempts "
+            "FROM question_stats WHERE attempts >= ? "
+            "ORDER BY CAST(wrong AS REAL) / attempts DESC, attempts DESC LIMIT ?",
+            (min_attempts, limit),
+        )
+
+    def common_mistakes(self, lesson, question_index, limit=10):
+        # [(expected word, given word, count)], "" standing for a missing or an extra word
+        return self._query(
+            "SELECT expected, given, count FROM mistakes WHERE lesson = ? AND question_index = ? "
+            "ORDER BY count DESC LIMIT ?",
+            (lesson, question_index, limit),
+        )
+
+    def lesson_difficulty(self):
+        # [(lesson, attempts, error rate)], hardest lesson first
+        return self._query(
+            "SELECT lesson, SUM(attempts), CAST(SUM(wrong) AS REAL) / SUM(attempts) FROM question_stats "
+            "GROUP BY lesson ORDER BY 3 DESC"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll the attempt event log up into per-question statistics.")
+    parser.add_argument("--log-dir", default=DEFAULT_LOG_DIR)
+    parser.add_argument("--db", default="attempt_stats.db")
+    parser.add_argument("--prune", action="store_true", help="delete closed segments once they are fully aggregated")
+    parser.add_argument("--top", type=int, default=20, help="print this many of the hardest questions")
+    args = parser.parse_args()
+
+    stats = AttemptStats(args.db)
+    started = datetime.now()
+    events = stats.aggregate(args.log_dir, prune=args.prune)
+    print(f"aggregated {events} events into {args.db} in {datetime.now() - started}")
+    for lesson, question_index, attempts, error_rate, first_try_rate, latency in stats.hardest(args.top):
+        print(f"{error_rate:6.1%} wrong of {attempts:6d}  {lesson} #{question_index + 1}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from custom_lesson_store import CustomLessonStore
+from metrics import span
+
+DEFAULT_CACHE_DIR = ".audio_cache"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def gtts_synthesize(text, lang, slow):
+    from gtts import gTTS
+
+    buffer = io.BytesIO()
+    gTTS(text=text, lang=lang, slow=slow).write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+def audio_key(text, lang='de', slow=False):
+    # Stable across processes, unlike the built-in hash() of a str
+    payload = json.dumps([text, lang, bool(slow)], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, synthesize=gtts_synthesize):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.synthesize = synthesize
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> size in bytes, least recently used first
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        # key -> Event for synthesis that is already in flight
+        self._pending = {}
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def _scan(self):
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".mp3"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _store(self, key, audio_bytes):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(audio_bytes)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(audio_bytes)
+            self._total_bytes += len(audio_bytes)
+            self._evict()
+
+    def get(self, text, lang='de', slow=False):
+        key = audio_key(text, lang, slow)
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    cached = True
+                else:
+                    pending = self._pending.get(key)
+                    if pending is None:
+                        self.misses += 1
+                        self._pending[key] = threading.Event()
+                    cached = False
+            if cached:
+                audio_bytes = self._read(key)
+                if audio_bytes is not None:
+                    return audio_bytes
+                # File was removed behind our back, forget it and synthesize again
+                with self._lock:
+                    self._total_bytes -= self._entries.pop(key, 0)
+                    self.hits -= 1
+                continue
+            if pending is not None:
+                pending.wait()
+                continue
+            break
+
+        try:
+            with span("tts_synthesize"):
+                audio_bytes = self.synthesize(text, lang, slow)
+            self._store(key, audio_bytes)
+            return audio_bytes
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+
+    def contains(self, text, lang='de', slow=False):
+        with self._lock:
+            return audio_key(text, lang, slow) in self._entries
+
+    def prewarm(self, texts, lang='de', slow=False, workers=4):
+        missing = []
+        seen = set()
+        for text in texts:
+            if text and text not in seen:
+                seen.add(text)
+                if not self.contains(text, lang, slow):
+                    missing.append(text)
+
+        failures = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(self.get, text, lang, slow): text for text in missing}
+            for future, text in futures.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    failures[text] = e
+        return len(missing) - len(failures), failures
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+def lesson_answers(*lesson_collections):
+    for lessons in lesson_collections:
+        for lesson in lessons.values():
+            for question in lesson.get("questions", []):
+                answer = question.get("answer")
+                if answer:
+                    yield answer
+
+
+def load_lesson_file(path):
+    try:
+        with open(path, "r") as f:
+            content = f.read()
+    except FileNotFoundError:
+        return {}
+    if not content.strip():
+        return {}
+    return json.loads(content)
+
+
+def load_lesson_store(path):
+    # Every lesson body in a CustomLessonStore database, keyed by content hash; a missing database has none
+    if not os.path.exists(path):
+        return {}
+    store = CustomLessonStore(path)
+    try:
+        return {digest: store.body(digest) for digest in store.digests()}
+    finally:
+        store.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-warm the TTS audio cache with every lesson answer.")
+    parser.add_argument("lesson_files", nargs="*", default=["lessons.json", "custom_lessons.json"])
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--lang", default="de")
+    parser.add_argument("--lessons-db", default=os.environ.get("CUSTOM_LESSONS_DB", "custom_lessons.db"),
+                        help="also read the lessons users created in the app from this database")
+    args = parser.parse_args(argv)
+
+    cache = AudioCache(args.cache_dir, max_bytes=args.max_bytes)
+    lessons = [load_lesson_file(path) for path in args.lesson_files]
+    lessons.append(load_lesson_store(args.lessons_db))
+    synthesized, failures = cache.prewarm(lesson_answers(*lessons), lang=args.lang, workers=args.workers)
+    for text, error in failures.items():
+        print(f"failed: {text!r}: {error}")
+    print(f"synthesized {synthesized} clips, {len(failures)} failures")
+    print(json.dumps(cache.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import argparse
+import base64
+import hashlib
+import json
+import statistics
+
+from audio_cache import DEFAULT_CACHE_DIR, AudioCache, lesson_answers, load_lesson_file
+
+# Assumed size of the response headers of a media request; not measured against a server
+HTTP_HEADER_BYTES = 350
+
+
+def data_uri_tag(audio_bytes):
+    # What text_to_speech() used to push through st.markdown on every click
+    audio_base64 = base64.b64encode(audio_bytes).decode()
+    return f'<audio autoplay="true" src="data:audio/mp3;base64,{audio_base64}">'
+
+
+def media_url(audio_bytes):
+    # Streamlit names media files by a hash of their content and mimetype
+    return f"/media/{hashlib.sha224(audio_bytes + b'audio/mp3').hexdigest()}.mp3"
+
+
+def websocket_bytes(element):
+    # Serialized size of the ForwardMsg that delivers element, or the size of its payload when Streamlit is missing
+    kind, payload = element
+    try:
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+    except ImportError:
+        return len(payload.encode("utf-8"))
+    message = ForwardMsg()
+    message.metadata.delta_path[:] = [0, 0, 3]
+    if kind == "markdown":
+        message.delta.new_element.markdown.body = payload
+        message.delta.new_element.markdown.allow_html = True
+    else:
+        message.delta.new_element.audio.url = payload
+    return message.ByteSize()
+
+
+def measure(clips):
+    # Estimated bytes per TTS click, computed from the messages rather than observed on the wire: the data-URI
+    # markdown before, the media URL element plus one full download of the clip after. Whether the browser
+    # re-downloads a clip on replay depends on its cache and is not modeled
+    before, after_websocket, after = [], [], []
+    for audio_bytes in clips:
+        before.append(websocket_bytes(("markdown", data_uri_tag(audio_bytes))))
+        url_bytes = websocket_bytes(("audio", media_url(audio_bytes)))
+        after_websocket.append(url_bytes)
+        after.append(url_bytes + HTTP_HEADER_BYTES + len(audio_bytes))
+    return {
+        "estimate": True,
+        "assumed_http_header_bytes": HTTP_HEADER_BYTES,
+        "clips": len(clips),
+        "mean_clip_bytes": round(statistics.mean(len(clip) for clip in clips)),
+        "before_bytes_per_click": round(statistics.mean(before)),
+        "after_websocket_bytes_per_click": round(statistics.mean(after_websocket)),
+        "after_bytes_per_download": round(statistics.mean(after)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate the bytes a TTS click sends as a data URI and as a media file.")
+    parser.add_argument("lesson_files", nargs="*", default=["lessons.json", "custom_lessons.json"])
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--cached-only", action="store_true", help="only use clips already in the cache, no synthesis")
+    args = parser.parse_args()
+
+    cache = AudioCache(args.cache_dir)
+    lessons = [load_lesson_file(path) for path in args.lesson_files]
+    clips = []
+    for text in lesson_answers(*lessons):
+        if len(clips) >= args.samples:
+            break
+        if args.cached_only and not cache.contains(text):
+            continue
+        clips.append(cache.get(text))
+    if not clips:
+        raise SystemExit("No audio clips available; run audio_cache.py first or drop --cached-only.")
+    print(json.dumps(measure(clips), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from game_session import GameSession
+from lesson_catalog import get_catalog
+from progress_store import JsonProgressBackend, SqliteProgressBackend
+from write_behind import WriteBehindStore
+
+
+def open_store(kind, directory):
+    if kind == "json":
+        return JsonProgressBackend(directory)
+    if kind == "sqlite":
+        return SqliteProgressBackend(os.path.join(directory, "progress.db"))
+    if kind == "json+write-behind":
+        return WriteBehindStore(JsonProgressBackend(directory))
+    if kind == "sqlite+write-behind":
+        return WriteBehindStore(SqliteProgressBackend(os.path.join(directory, "progress.db")))
+    raise ValueError(f"Unknown backend: {kind}")
+
+
+def process_bytes_written():
+    # Bytes handed to write() by this process, None where /proc is not available
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def directory_bytes(directory):
+    return sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+
+def wrong_answer(answer, rng):
+    words = answer.split()
+    if len(words) > 1:
+        del words[rng.randrange(len(words))]
+        return " ".join(words)
+    return answer + " falsch"
+
+
+def run_learner(learner_id, store, lessons, error_rate, latencies, seed):
+    rng = random.Random(seed + learner_id)
+    game = GameSession(f"learner{learner_id}", store, lessons)
+    game.load()
+    answers = 0
+    for lesson_name in lessons:
+        game.select_lesson(lesson_name)
+        game.restart_lesson()
+        while not game.lesson_finished():
+            answer = game.current_question()["answer"]
+            if rng.random() < error_rate:
+                started = time.perf_counter()
+                game.submit(wrong_answer(answer, rng))
+                latencies.append(time.perf_counter() - started)
+                answers += 1
+            started = time.perf_counter()
+            game.submit(answer)
+            game.advance()
+            latencies.append(time.perf_counter() - started)
+            answers += 1
+        game.complete_lesson()
+    return answers
+
+
+def run_benchmark(kind, learners, lessons, error_rate, seed):
+    with tempfile.TemporaryDirectory() as directory:
+        store = open_store(kind, directory)
+        latencies = []
+        counts = [0] * learners
+
+        def worker(learner_id):
+            counts[learner_id] = run_learner(learner_id, store, lessons, error_rate, latencies, seed)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(learners)]
+        written_before = process_bytes_written()
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        # Pending write-behind work is part of the cost of the run
+        store.close()
+        written_after = process_bytes_written()
+
+        answers = sum(counts)
+        if written_before is not None:
+            bytes_written = written_after - written_before
+        else:
+            bytes_written = directory_bytes(directory)
+        latencies.sort()
+        return {
+            "backend": kind,
+            "learners": learners,
+            "answers": answers,
+            "answers_per_sec": round(answers / elapsed, 1),
+            "p50_ms": round(statistics.median(latencies) * 1000, 3),
+            "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 3),
+            "bytes_written_per_answer": round(bytes_written / answers, 1),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent learners answering every lesson headlessly.")
+    parser.add_argument("--learners", type=int, default=8)
+    parser.add_argument("--lessons", default="lessons.json")
+    parser.add_argument("--error-rate", type=float, default=0.2, help="share of questions answered wrong once first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--backend",
+        action="append",
+        choices=["json", "sqlite", "json+write-behind", "sqlite+write-behind"],
+        help="may be given several times, defaults to all",
+    )
+    args = parser.parse_args()
+
+    lessons = get_catalog(args.lessons).get()
+    for kind in args.backend or ["json", "sqlite", "json+write-behind", "sqlite+write-behind"]:
+        print(json.dumps(run_benchmark(kind, args.learners, lessons, args.error_rate, args.seed)))
+
+
+if __name__ == "__main__":
+    main()
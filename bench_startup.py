@@ -0,0 +1,138 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_time(module, repeat):
+    # Wall time of importing module in a fresh interpreter, median of repeat runs
+    code = f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], cwd=HERE, capture_output=True, text=True, check=True)
+        samples.append(float(output.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def import_profile(module, top):
+    # Heaviest imports made directly by module according to python -X importtime, as (cumulative microseconds, name)
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=HERE, capture_output=True, text=True
+    )
+    lines = [line for line in output.stderr.splitlines() if line.startswith("import time:")][1:]
+    entries = []
+    # importtime prints dependencies before the module that imported them, indented two spaces per level
+    inside = False
+    for line in reversed(lines):
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            inside = name.strip() == module
+        elif inside and depth == 1:
+            entries.append((int(cumulative), name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_health(port, deadline):
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError("Streamlit server did not become healthy")
+
+
+async def first_render(port):
+    # Acts as a browser tab: opens a session, requests a script run and waits until it has finished
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+    from tornado.websocket import websocket_connect
+
+    connection = await websocket_connect(f"ws://127.0.0.1:{port}/_stcore/stream")
+    request = BackMsg()
+    request.rerun_script.query_string = ""
+    await connection.write_message(request.SerializeToString(), binary=True)
+    while True:
+        data = await connection.read_message()
+        if data is None:
+            raise ConnectionError("Streamlit closed the session before the first render finished")
+        message = ForwardMsg()
+        message.ParseFromString(data)
+        if message.WhichOneof("type") == "script_finished":
+            connection.close()
+            return
+
+
+def time_to_first_render(timeout):
+    port = free_port()
+    started = time.monotonic()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", "main.py",
+            "--server.headless", "true",
+            "--server.port", str(port),
+            "--browser.gatherUsageStats", "false",
+        ],
+        cwd=HERE,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_health(port, started + timeout)
+        healthy = time.monotonic() - started
+        asyncio.run(asyncio.wait_for(first_render(port), timeout))
+        return healthy, time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold-start cost of main.py.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--render", action="store_true", help="also start a server and time the first render")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--max-import-ms", type=float, help="exit with an error when importing main is slower")
+    parser.add_argument("--max-render-ms", type=float, help="exit with an error when the first render is slower")
+    args = parser.parse_args()
+
+    result = {
+        "import_main_ms": round(import_time("main", args.repeat) * 1000, 1),
+        "heaviest_imports_ms": [
+            [name, round(cumulative / 1000, 1)] for cumulative, name in import_profile("main", args.top)
+        ],
+    }
+    if args.render:
+        healthy, rendered = time_to_first_render(args.timeout)
+        result["server_healthy_ms"] = round(healthy * 1000, 1)
+        result["first_render_ms"] = round(rendered * 1000, 1)
+    print(json.dumps(result, indent=2))
+
+    failures = []
+    if args.max_import_ms is not None and result["import_main_ms"] > args.max_import_ms:
+        failures.append(f"import took {result['import_main_ms']} ms, budget {args.max_import_ms} ms")
+    if args.max_render_ms is not None and result.get("first_render_ms", 0) > args.max_render_ms:
+        failures.append(f"first render took {result['first_render_ms']} ms, budget {args.max_render_ms} ms")
+    if failures:
+        sys.exit("; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
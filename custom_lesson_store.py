@@ -0,0 +1,179 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from lesson_catalog import freeze
+from sqlite_db import SqliteDatabase
+
+# Parsed lesson bodies kept in memory, shared by every session of the process
+BODY_CACHE_SIZE = 256
+# Seconds a library trusts its index without local writes; other processes' changes show up within this time
+INDEX_TTL = 30
+
+
+def lesson_body(lesson):
+    # Canonical JSON of the parts of a lesson that are stored, so equal lessons hash equally
+    body = {"questions": [{"prompt": q["prompt"], "answer": q["answer"]} for q in lesson["questions"]]}
+    if lesson.get("title"):
+        body["title"] = lesson["title"]
+    return json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+class CustomLessonStore(SqliteDatabase):
+    # Lesson bodies are stored once by content hash; users own named references to them, optionally shared
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS lesson_bodies (
+            hash TEXT PRIMARY KEY,
+            body TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS user_lessons (
+            owner TEXT NOT NULL,
+            name TEXT NOT NULL,
+            hash TEXT NOT NULL REFERENCES lesson_bodies (hash),
+            shared INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (owner, name)
+        );
+        CREATE INDEX IF NOT EXISTS user_lessons_shared ON user_lessons (shared) WHERE shared = 1;
+        CREATE INDEX IF NOT EXISTS user_lessons_hash ON user_lessons (hash);
+    """
+
+    def __init__(self, path="custom_lessons.db"):
+        super().__init__(path)
+        self._cache_lock = threading.Lock()
+        self._bodies = OrderedDict()
+        # Bumped on every write, so libraries know when to re-read their index
+        self.version = 0
+
+    def _write(self, owner, name, statements):
+        with self._transaction() as conn:
+            previous = conn.execute(
+                "SELECT hash FROM user_lessons WHERE owner = ? AND name = ?", (owner, name)
+            ).fetchone()
+            for sql, params in statements:
+                conn.execute(sql, params)
+            if previous is not None:
+                # Drop the old body once nobody refers to it any more
+                conn.execute(
+                    "DELETE FROM lesson_bodies WHERE hash = ? "
+                    "AND NOT EXISTS (SELECT 1 FROM user_lessons WHERE hash = ?)",
+                    (previous[0], previous[0]),
+                )
+        self.version += 1
+
+    def save(self, owner, name, lesson, shared=None):
+        body = lesson_body(lesson)
+        digest = hashlib.sha256(body.encode("utf-8")).hexdigest()
+        # Keep the current sharing setting unless one is given
+        self._write(owner, name, [
+            ("INSERT OR IGNORE INTO lesson_bodies (hash, body) VALUES (?, ?)", (digest, body)),
+            (
+                "INSERT INTO user_lessons (owner, name, hash, shared) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (owner, name) DO UPDATE SET hash = excluded.hash, "
+                "shared = COALESCE(?, user_lessons.shared)",
+                (owner, name, digest, int(bool(shared)), None if shared is None else int(shared)),
+            ),
+        ])
+        return digest
+
+    def delete(self, owner, name):
+        self._write(owner, name, [("DELETE FROM user_lessons WHERE owner = ? AND name = ?", (owner, name))])
+
+    def set_shared(self, owner, name, shared):
+        self._write(owner, name, [
+            ("UPDATE user_lessons SET shared = ? WHERE owner = ? AND name = ?", (int(shared), owner, name))
+        ])
+
+    def index(self, username):
+        # [(display name, owner, hash, shared)]: the user's own lessons, then lessons others share
+        rows = self._query(
+            "SELECT name, owner, hash, shared FROM user_lessons WHERE owner = ? OR shared = 1 "
+            "ORDER BY owner != ?, owner, name",
+            (username, username),
+        )
+        entries = []
+        for name, owner, digest, shared in rows:
+            display_name = name if owner == username else f"{name} (von {owner})"
+            entries.append((display_name, owner, digest, bool(shared)))
+        return entries
+
+    def digests(self):
+        # Hashes of every stored lesson body
+        return [row[0] for row in self._query("SELECT hash FROM lesson_bodies")]
+
+    def body(self, digest):
+        with self._cache_lock:
+            lesson = self._bodies.get(digest)
+            if lesson is not None:
+                self._bodies.move_to_end(digest)
+                return lesson
+        rows = self._query("SELECT body FROM lesson_bodies WHERE hash = ?", (digest,))
+        if not rows:
+            raise KeyError(digest)
+        # Bodies never change for a given hash, so the parsed lesson can be shared read-only
+        lesson = freeze(json.loads(rows[0][0]))
+        with self._cache_lock:
+            self._bodies[digest] = lesson
+            if len(self._bodies) > BODY_CACHE_SIZE:
+                self._bodies.popitem(last=False)
+        return lesson
+
+
+class UserLessonLibrary(Mapping):
+    # A user's view of the store: names are listed eagerly, lesson bodies are loaded on first access
+
+    def __init__(self, store, username):
+        self.store = store
+        self.username = username
+        self._version = None
+        self._loaded_at = 0
+        self._entries = {}
+
+    def _index(self):
+        now = time.monotonic()
+        if self._version != self.store.version or now - self._loaded_at > INDEX_TTL:
+            self._version = self.store.version
+            self._loaded_at = now
+            self._entries = {entry[0]: entry for entry in self.store.index(self.username)}
+        return self._entries
+
+    def __getitem__(self, name):
+        return self.store.body(self._index()[name][2])
+
+    def __contains__(self, name):
+        return name in self._index()
+
+    def __iter__(self):
+        return iter(self._index())
+
+    def __len__(self):
+        return len(self._index())
+
+    def digest(self, name):
+        return self._index()[name][2]
+
+    def is_own(self, name):
+        entry = self._index().get(name)
+        return entry is not None and entry[1] == self.username
+
+    def is_shared(self, name):
+        return self._index()[name][3]
+
+    def save(self, name, lesson, shared=None):
+        self.store.save(self.username, name, lesson, shared)
+
+    def delete(self, name):
+        self.store.delete(self.username, name)
+
+    def set_shared(self, name, shared):
+        self.store.set_shared(self.username, name, shared)
+
+    def export(self):
+        # Plain dicts of the user's own lessons, for downloading
+        return {
+            name: {"questions": [dict(question) for question in self[name]["questions"]]}
+            for name in self if self.is_own(name)
+        }
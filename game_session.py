@@ -0,0 +1,281 @@
+import time
+from collections import deque
+from datetime import datetime
+
+from achievements import ANSWER_CORRECT, LESSON_COMPLETED, AchievementTracker, default_rules
+from answer_diff import EXACT, colored_html, diff_answer, first_mistake, is_correct, next_word
+from review_history import DEFAULT_CAP, ReviewHistory
+from review_scheduler import quality_from_attempts
+
+CORRECT_FEEDBACK = "🎉 Richtig! Weiter zur nächsten Frage..."
+POINTS_PER_ANSWER = 10
+
+
+class GameSession:
+    # All game state of one learner, independent of the UI that drives it
+
+    def __init__(self, username, store, lessons, match_options=EXACT, scheduler=None, review_history_cap=DEFAULT_CAP,
+                 event_log=None, achievement_rules=None):
+        self.username = username
+        self.store = store
+        self.lessons = lessons
+        self.match_options = match_options
+        self.scheduler = scheduler
+        # AttemptLog receiving one event per submitted answer, if any
+        self.event_log = event_log
+        # AchievementRules from achievements.json unless given
+        self.achievement_rules = achievement_rules if achievement_rules is not None else default_rules()
+
+        self.score = 0
+        self.streak = 0
+        self.best_streak = 0
+        self.lessons_completed = 0
+        self.current_lesson = None
+        self.question_index = 0
+        self.achievements = {}
+        # "progress" and/or "achievements" -> the error they could not be read with; those parts are never saved
+        self.unreadable = {}
+        self.achievement_tracker = AchievementTracker(self.achievement_rules)
+
+        self.feedback = ""
+        self.attempts = 0
+        self.answer_correct = False
+        self.colored_answer = None
+        # When the current question was shown or last answered, for attempt latencies
+        self.attempt_started = time.monotonic()
+        self.review_items = ReviewHistory(review_history_cap)
+        self.lesson_completion_recorded = False
+        # (lesson, question index) pairs of a spaced-repetition practice, None outside of it
+        self.review_queue = None
+
+    def load(self):
+        # Returns True for a returning user. Progress and achievements are read separately, so a corrupt part
+        # leaves the other one loaded; the corrupt part is recorded in self.unreadable and never written over
+        self.unreadable = {}
+        progress = None
+        try:
+            progress = self.store.load_progress(self.username)
+        except ValueError as e:
+            self.unreadable["progress"] = e
+        try:
+            self.achievements = self.store.load_achievements(self.username)
+        except ValueError as e:
+            self.unreadable["achievements"] = e
+        if progress is not None:
+            self.score = progress.get("score", 0)
+            self.streak = progress.get("streak", 0)
+            self.best_streak = progress.get("best_streak", self.streak)
+            self.lessons_completed = progress.get("lessons_completed", 0)
+            self.current_lesson = progress.get("current_lesson", None)
+            self.question_index = progress.get("question_index", 0)
+            self.achievement_tracker = AchievementTracker(self.achievement_rules, progress.get("counters"))
+        self.unlock(self.achievement_tracker.check_all(self.stats(), self.achievements))
+        return progress is not None
+
+    def stats(self):
+        return {
+            "score": self.score,
+            "streak": self.streak,
+            "best_streak": self.best_streak,
+            "lessons_completed": self.lessons_completed,
+        }
+
+    def progress(self):
+        return {
+            "score": self.score,
+            "streak": self.streak,
+            "best_streak": self.best_streak,
+            "lessons_completed": self.lessons_completed,
+            "current_lesson": self.current_lesson,
+            "question_index": self.question_index,
+            "counters": self.achievement_tracker.to_dict(),
+            "timestamp": str(datetime.now())
+        }
+
+    def save(self):
+        if "progress" in self.unreadable:
+            return
+        self.store.save_progress(self.username, self.progress())
+
+    def flush(self):
+        if hasattr(self.store, "flush"):
+            self.store.flush(self.username)
+
+    def questions(self):
+        lesson = self.lessons.get(self.current_lesson)
+        if lesson is None:
+            return ()
+        return lesson.get("questions", ())
+
+    def question_key(self):
+        if self.review_queue is not None:
+            return self.review_queue[0] if self.review_queue else None
+        return (self.current_lesson, self.question_index)
+
+    def lookup_question(self, lesson_name, question_index):
+        lesson = self.lessons.get(lesson_name)
+        if lesson is None:
+            return None
+        questions = lesson.get("questions", ())
+        if 0 <= question_index < len(questions):
+            return questions[question_index]
+        return None
+
+    def current_question(self):
+        key = self.question_key()
+        if key is None:
+            return None
+        return self.lookup_question(*key)
+
+    def lesson_finished(self):
+        return self.question_index >= len(self.questions())
+
+    def select_lesson(self, lesson_name):
+        if lesson_name != self.current_lesson:
+            self.current_lesson = lesson_name
+            self.lesson_completion_recorded = False
+
+    def submit(self, user_answer):
+        # Returns whether the answer is correct; False when there is no current question to answer
+        key = self.question_key()
+        question = self.lookup_question(*key) if key is not None else None
+        if question is None:
+            return False
+        correct_answer = question["answer"]
+        ops = diff_answer(user_answer, correct_answer, self.match_options)
+        correct = is_correct(ops)
+        if correct:
+            self.feedback = CORRECT_FEEDBACK
+            self.score += POINTS_PER_ANSWER
+            self.streak += 1
+            self.best_streak = max(self.best_streak, self.streak)
+            self.colored_answer = None
+        else:
+            self.feedback = f"Nicht ganz. Versuchen Sie es nochmal! Tipp: {next_word(ops)}"
+            self.streak = 0
+            self.colored_answer = colored_html(ops)
+        self.answer_correct = correct
+        self.review_items.record(*key, user_answer, correct)
+        self.attempts += 1
+        self.log_attempt(key, ops, correct)
+        return correct
+
+    def log_attempt(self, key, ops, correct):
+        now = time.monotonic()
+        latency, self.attempt_started = now - self.attempt_started, now
+        if self.event_log is None:
+            return
+        mistake = None if correct else first_mistake(ops)
+        self.event_log.record({
+            "time": round(time.time(), 3),
+            "lesson": key[0],
+            "question_index": key[1],
+            "correct": correct,
+            "attempts": self.attempts,
+            "expected": mistake[0] if mistake else None,
+            "given": mistake[1] if mistake else None,
+            "latency": round(latency, 3),
+            "review": self.review_queue is not None,
+        })
+
+    def clear_answer(self):
+        self.feedback = ""
+        self.attempts = 0
+        self.answer_correct = False
+        self.colored_answer = None
+        self.attempt_started = time.monotonic()
+
+    def next_question(self):
+        self.question_index += 1
+        self.clear_answer()
+
+    def jump_to(self, lesson_name, question_index):
+        # Opens a question found by the lesson search
+        self.select_lesson(lesson_name)
+        self.question_index = question_index
+        self.clear_answer()
+        self.save()
+
+    def start_review(self, limit=20):
+        # Queue up to limit due cards whose lesson is still available; returns the number queued
+        self.clear_answer()
+        cards = self.scheduler.due(self.username, limit) if self.scheduler else []
+        self.review_queue = deque(
+            (card.lesson, card.question_index) for card in cards
+            if self.lookup_question(card.lesson, card.question_index) is not None
+        )
+        return len(self.review_queue)
+
+    def stop_review(self):
+        if self.review_queue is not None:
+            self.review_queue = None
+            self.clear_answer()
+
+    def record_review(self):
+        if self.scheduler is not None:
+            lesson_name, question_index = self.question_key()
+            self.scheduler.review(self.username, lesson_name, question_index, quality_from_attempts(self.attempts))
+
+    def unlock(self, rules):
+        # Adds the badges of rules not unlocked yet and persists only when there are any; returns the new badges
+        new_achievements = []
+        for rule in rules:
+            if rule.badge not in self.achievements:
+                self.achievements[rule.badge] = rule.description
+                new_achievements.append(rule.badge)
+        if new_achievements and "achievements" not in self.unreadable:
+            self.store.save_achievements(self.username, self.achievements)
+        return new_achievements
+
+    def record_event(self, event, lesson_name):
+        # Only rules on counters the event raised are checked
+        return self.unlock(self.achievement_tracker.record(event, lesson_name, self.stats(), self.achievements))
+
+    def advance(self):
+        # After a correct answer: schedule the next review, move on, persist, and return newly unlocked achievements
+        lesson_name, _ = self.question_key()
+        self.record_review()
+        new_achievements = self.record_event(ANSWER_CORRECT, lesson_name)
+        if self.review_queue is not None:
+            self.review_queue.popleft()
+            self.clear_answer()
+        else:
+            self.next_question()
+        self.save()
+        return new_achievements
+
+    def complete_lesson(self):
+        # Counts the finished lesson once, however often its summary is rendered
+        if self.lesson_completion_recorded:
+            return []
+        self.lesson_completion_recorded = True
+        self.lessons_completed += 1
+        new_achievements = self.record_event(LESSON_COMPLETED, self.current_lesson)
+        self.save()
+        self.flush()
+        return new_achievements
+
+    def restart_lesson(self):
+        self.question_index = 0
+        self.feedback = ""
+        self.attempts = 0
+        self.answer_correct = False
+        self.colored_answer = None
+        self.review_items.clear()
+        self.lesson_completion_recorded = False
+        self.save()
+        self.flush()
+
+    def reset(self, first_lesson):
+        self.score = 0
+        self.streak = 0
+        self.best_streak = 0
+        self.question_index = 0
+        self.answer_correct = False
+        self.colored_answer = None
+        self.review_items.clear()
+        self.current_lesson = first_lesson
+        self.lesson_completion_recorded = False
+        # Unlocked achievements are kept; they were earned, whatever the score is now
+        self.save()
+        self.flush()
@@ -0,0 +1,153 @@
+import argparse
+import bisect
+import json
+import threading
+import time
+
+from progress_store import open_backend
+
+# metric -> German label, in the order the leaderboard page offers them
+METRICS = {
+    "score": "Punktzahl",
+    "best_streak": "Längste Serie",
+    "lessons_completed": "Abgeschlossene Lektionen",
+}
+DEFAULT_TOP = 10
+
+
+def metric_values(progress):
+    # Older progress has no best_streak yet; its current streak is the best known one
+    return {
+        "score": progress.get("score", 0),
+        "best_streak": max(progress.get("best_streak", 0), progress.get("streak", 0)),
+        "lessons_completed": progress.get("lessons_completed", 0),
+    }
+
+
+class RankIndex:
+    # Users ordered by one metric, highest first; ties are broken by username
+
+    def __init__(self):
+        # sorted [(-value, username)]
+        self._entries = []
+        self._values = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self, values):
+        # Replaces the index with username -> value in one sort instead of one insort per user
+        self._values = dict(values)
+        self._entries = sorted((-value, username) for username, value in self._values.items())
+
+    def value(self, username):
+        return self._values.get(username)
+
+    def update(self, username, value):
+        old = self._values.get(username)
+        if old == value:
+            return
+        if old is not None:
+            del self._entries[bisect.bisect_left(self._entries, (-old, username))]
+        self._values[username] = value
+        bisect.insort(self._entries, (-value, username))
+
+    def remove(self, username):
+        old = self._values.pop(username, None)
+        if old is not None:
+            del self._entries[bisect.bisect_left(self._entries, (-old, username))]
+
+    def top(self, k):
+        return [(username, -negative) for negative, username in self._entries[:k]]
+
+    def rank(self, username):
+        # 1-based; users with the same value share a rank
+        value = self._values.get(username)
+        if value is None:
+            return None
+        return bisect.bisect_left(self._entries, (-value, "")) + 1, value
+
+
+class Leaderboard:
+    # Cross-user rankings per metric, kept up to date from committed progress
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {metric: RankIndex() for metric in METRICS}
+        # Users updated while a rebuild was reading the backend, whose newer values the rebuild must keep
+        self._updated_during_rebuild = None
+        self.rebuilt_at = None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._indexes["score"])
+
+    def update(self, username, progress):
+        with self._lock:
+            for metric, value in metric_values(progress).items():
+                self._indexes[metric].update(username, value)
+            if self._updated_during_rebuild is not None:
+                self._updated_during_rebuild.add(username)
+
+    def on_commit(self, username, progress, achievements):
+        # WriteBehindStore listener
+        if progress is not None:
+            self.update(username, progress)
+
+    def remove(self, username):
+        with self._lock:
+            for index in self._indexes.values():
+                index.remove(username)
+
+    def rebuild(self, backend):
+        # One pass over all stored progress; returns the number of users ranked
+        with self._lock:
+            self._updated_during_rebuild = set()
+        columns = {metric: {} for metric in METRICS}
+        try:
+            for username, progress in backend.iter_progress():
+                for metric, value in metric_values(progress).items():
+                    columns[metric][username] = value
+        finally:
+            with self._lock:
+                updated, self._updated_during_rebuild = self._updated_during_rebuild, None
+        with self._lock:
+            for metric, values in columns.items():
+                index = self._indexes[metric]
+                for username in updated:
+                    current = index.value(username)
+                    if current is not None:
+                        values[username] = current
+                index.load(values)
+            self.rebuilt_at = time.time()
+            return len(self._indexes["score"])
+
+    def top(self, metric, k=DEFAULT_TOP):
+        with self._lock:
+            return self._indexes[metric].top(k)
+
+    def rank(self, metric, username):
+        # (rank, value) of username, or None for users without stored progress
+        with self._lock:
+            return self._indexes[metric].rank(username)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the leaderboard from stored progress and print the top users.")
+    parser.add_argument("--backend", choices=["json", "sqlite"], help="defaults to PROGRESS_BACKEND")
+    parser.add_argument("--location", help="directory or database, defaults to PROGRESS_PATH")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP)
+    args = parser.parse_args()
+
+    backend = open_backend(args.backend, args.location)
+    leaderboard = Leaderboard()
+    started = time.perf_counter()
+    users = leaderboard.rebuild(backend)
+    report = {"users": users, "rebuild_seconds": round(time.perf_counter() - started, 3)}
+    for metric in METRICS:
+        report[metric] = leaderboard.top(metric, args.top)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import hashlib
+import json
+import os
+import threading
+from collections import ChainMap
+from types import MappingProxyType
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class LessonCatalog:
+    def __init__(self, path):
+        self.path = path
+        self.loads = 0
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._digest = None
+        self._lessons = MappingProxyType({})
+
+    def _stat_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self):
+        # Raises FileNotFoundError when the file is missing, json.JSONDecodeError when it is invalid
+        stamp = self._stat_stamp()
+        if stamp is not None and stamp == self._stamp:
+            return self._lessons
+
+        with self._lock:
+            stamp = self._stat_stamp()
+            if stamp is None:
+                self._stamp = None
+                self._digest = None
+                self._lessons = MappingProxyType({})
+                raise FileNotFoundError(self.path)
+            if stamp == self._stamp:
+                return self._lessons
+
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            digest = hashlib.sha256(raw).hexdigest()
+            if digest != self._digest:
+                self._lessons = freeze(json.loads(raw)) if raw.strip() else MappingProxyType({})
+                self._digest = digest
+                self.loads += 1
+            self._stamp = stamp
+            return self._lessons
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(path="lessons.json"):
+    key = os.path.abspath(path)
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = LessonCatalog(path)
+        return catalog
+
+
+def overlay(built_in_lessons, custom_lessons):
+    # Custom lessons shadow built-in lessons of the same name, without copying either mapping
+    return ChainMap(custom_lessons, built_in_lessons)
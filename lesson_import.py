@@ -0,0 +1,267 @@
+import csv
+import hashlib
+import io
+import json
+import os
+
+from answer_diff import clean_text
+
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+MAX_QUESTIONS = 200_000
+MAX_FIELD_LENGTH = 2000
+MAX_LESSON_NAME_LENGTH = 200
+# Errors beyond this many are only counted
+MAX_REPORTED_ERRORS = 100
+# No single record of a JSON upload may be larger than this
+MAX_RECORD_CHARS = 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+# Characters that may follow a complete JSON value
+_VALUE_END = frozenset(",:]} \t\r\n")
+
+
+class UploadError(Exception):
+    # The upload as a whole cannot be read any further
+    pass
+
+
+class ImportReport:
+    def __init__(self):
+        self.lessons = {}
+        self.lesson_count = 0
+        self.imported = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors = []
+        self.truncated = False
+        self.fatal = None
+
+    def error(self, record_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((record_number, message))
+
+
+def question_hash(prompt, answer):
+    normalized = f"{clean_text(prompt)}\0{clean_text(answer)}"
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+def lesson_hashes(lessons):
+    hashes = set()
+    for lesson in lessons.values():
+        for question in lesson.get("questions", ()):
+            hashes.add(question_hash(question.get("prompt", ""), question.get("answer", "")))
+    return hashes
+
+
+class _ByteLimitedReader(io.RawIOBase):
+    # Stops the upload with an error once more than limit bytes have been read
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        self.bytes_read += len(data)
+        if self.bytes_read > self.limit:
+            raise UploadError(f"Die Datei ist größer als {self.limit // (1024 * 1024)} MB.")
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class _JsonStream:
+    # Walks a JSON document in chunks, decoding only small values (keys, question objects) at a time
+
+    def __init__(self, text_stream):
+        self.stream = text_stream
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.stream.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # Next non-whitespace character, or "" at the end of the input
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if char == "" or char not in chars:
+            raise UploadError(f"Ungültiges JSON: '{chars}' erwartet, '{char or 'Dateiende'}' gefunden.")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # The value may just be cut off at the end of the buffer
+                if len(self.buffer) - self.pos > MAX_RECORD_CHARS:
+                    raise UploadError("Ein Eintrag der Datei ist zu groß.")
+                if not self._fill():
+                    raise UploadError(f"Ungültiges JSON: {e.msg}.")
+                continue
+            # A number or literal cut off by the buffer end may decode as a shorter one ("-0." as -0),
+            # so it is only taken once the character after it has been read
+            if (
+                not isinstance(value, (dict, list, str)) and not self.eof
+                and (end == len(self.buffer) or self.buffer[end] not in _VALUE_END)
+                and len(self.buffer) - self.pos <= MAX_RECORD_CHARS
+            ):
+                if self._fill():
+                    continue
+            self.pos = end
+            return value
+
+    def items(self, close):
+        # Yields once per element of the array/object that was just opened, consuming the separators
+        if self.peek() == close:
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.expect("," + close) == close:
+                return
+
+
+def iter_json_records(text_stream):
+    # Yields (lesson name or None, record) from either {"Lesson": {"questions": [...]}} or [{"lesson", "prompt", "answer"}]
+    reader = _JsonStream(text_stream)
+    opening = reader.expect("{[")
+    if opening == "[":
+        for _ in reader.items("]"):
+            yield None, reader.value()
+    else:
+        for _ in reader.items("}"):
+            lesson_name = reader.value()
+            reader.expect(":")
+            if reader.peek() == "[":
+                reader.expect("[")
+                for _ in reader.items("]"):
+                    yield lesson_name, reader.value()
+                continue
+            if reader.peek() != "{":
+                yield lesson_name, reader.value()
+                continue
+            reader.expect("{")
+            for _ in reader.items("}"):
+                key = reader.value()
+                reader.expect(":")
+                if key == "questions" and reader.peek() == "[":
+                    reader.expect("[")
+                    for _ in reader.items("]"):
+                        yield lesson_name, reader.value()
+                else:
+                    reader.value()
+    if reader.peek() != "":
+        raise UploadError("Ungültiges JSON: unerwartete Daten nach dem Ende.")
+
+
+def iter_jsonl_records(text_stream):
+    for line in text_stream:
+        if line.strip():
+            try:
+                yield None, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield None, e
+
+
+def iter_delimited_records(text_stream, delimiter):
+    reader = csv.DictReader(text_stream, delimiter=delimiter)
+    if reader.fieldnames is None or not {"prompt", "answer"} <= {name.strip().lower() for name in reader.fieldnames}:
+        raise UploadError("Die Kopfzeile muss die Spalten 'prompt' und 'answer' enthalten (optional 'lesson').")
+    for row in reader:
+        yield None, {(key or "").strip().lower(): value for key, value in row.items()}
+
+
+def validate(lesson_name, record, default_lesson):
+    # Returns (lesson, prompt, answer) or raises ValueError with a message for the report
+    if isinstance(record, Exception):
+        raise ValueError(f"Ungültiges JSON: {record}")
+    if not isinstance(record, dict):
+        raise ValueError("Eintrag ist kein Objekt.")
+    lesson = lesson_name if lesson_name is not None else (record.get("lesson") or default_lesson)
+    if not isinstance(lesson, str) or not lesson.strip():
+        raise ValueError("Lektionsname fehlt.")
+    if len(lesson) > MAX_LESSON_NAME_LENGTH:
+        raise ValueError("Lektionsname ist zu lang.")
+    fields = []
+    for field in ("prompt", "answer"):
+        value = record.get(field)
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"'{field}' fehlt oder ist leer.")
+        if len(value) > MAX_FIELD_LENGTH:
+            raise ValueError(f"'{field}' ist länger als {MAX_FIELD_LENGTH} Zeichen.")
+        fields.append(value.strip())
+    return lesson.strip(), fields[0], fields[1]
+
+
+def import_lessons(binary_stream, file_name, existing_lessons=None, max_bytes=MAX_UPLOAD_BYTES,
+                   max_questions=MAX_QUESTIONS):
+    # Reads JSON, JSON Lines, CSV or TSV (by extension) record by record into an ImportReport
+    report = ImportReport()
+    known = lesson_hashes(existing_lessons) if existing_lessons else set()
+    default_lesson = os.path.splitext(os.path.basename(file_name))[0]
+    extension = os.path.splitext(file_name)[1].lower()
+
+    limited = io.BufferedReader(_ByteLimitedReader(binary_stream, max_bytes), CHUNK_SIZE)
+    text_stream = io.TextIOWrapper(limited, encoding="utf-8-sig", newline="")
+    if extension == ".csv":
+        records = iter_delimited_records(text_stream, ",")
+    elif extension == ".tsv":
+        records = iter_delimited_records(text_stream, "\t")
+    elif extension == ".jsonl":
+        records = iter_jsonl_records(text_stream)
+    else:
+        records = iter_json_records(text_stream)
+
+    record_number = 0
+    try:
+        for lesson_name, record in records:
+            record_number += 1
+            try:
+                lesson, prompt, answer = validate(lesson_name, record, default_lesson)
+            except ValueError as e:
+                report.error(record_number, str(e))
+                continue
+            digest = question_hash(prompt, answer)
+            if digest in known:
+                report.duplicates += 1
+                continue
+            if report.imported >= max_questions:
+                report.truncated = True
+                break
+            known.add(digest)
+            report.lessons.setdefault(lesson, {"questions": []})["questions"].append(
+                {"prompt": prompt, "answer": answer}
+            )
+            report.imported += 1
+    except (UploadError, UnicodeDecodeError, csv.Error) as e:
+        if isinstance(e, UnicodeDecodeError):
+            e = "Die Datei ist nicht UTF-8-kodiert."
+        report.fatal = str(e)
+    report.lesson_count = len(report.lessons)
+    return report
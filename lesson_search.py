@@ -0,0 +1,244 @@
+import bisect
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import Counter
+
+from answer_diff import clean_text
+
+# Keeps phrases from matching across the end of a prompt and the start of its answer
+ANSWER_POSITION_OFFSET = 100_000
+DEFAULT_LIMIT = 50
+# Lessons saved by other processes are picked up at most this many seconds late
+STORE_CHECK_INTERVAL = 30
+
+_QUERY_TERMS = re.compile(r'"([^"]*)"?|(\S+)')
+
+
+def tokenize(text):
+    return clean_text(text).split()
+
+
+def parse_query(query, prefix_last=True):
+    # Returns [(kind, tokens)] with kind "word", "prefix" or "phrase"; a trailing * or, while typing, the last word is a prefix
+    terms = []
+    for phrase, word in _QUERY_TERMS.findall(query):
+        if phrase:
+            tokens = tokenize(phrase)
+            if len(tokens) == 1:
+                terms.append(("word", tokens))
+            elif tokens:
+                terms.append(("phrase", tokens))
+        elif word.endswith("*"):
+            tokens = tokenize(word.rstrip("*"))
+            if tokens:
+                terms.append(("prefix", tokens[-1:]))
+        else:
+            tokens = tokenize(word)
+            if tokens:
+                terms.append(("word", tokens))
+    if prefix_last and terms and terms[-1][0] == "word" and not query.endswith((" ", '"')):
+        terms[-1] = ("prefix", terms[-1][1])
+    return terms
+
+
+class LessonIndex:
+    # Positional inverted index over question prompts and answers; a document is (lesson key, question index)
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # token -> {lesson key: {question index: positions}}
+        self._postings = {}
+        # sorted tokens, for prefix queries
+        self._vocabulary = []
+        # lesson key -> {token: occurrences}, to remove a lesson again
+        self._lesson_tokens = {}
+        self._public = set()
+        # lesson key -> insertion number, so hits are listed in lesson order
+        self._order = {}
+        self._sequence = itertools.count()
+        self.frequencies = Counter()
+
+    def __contains__(self, key):
+        return key in self._lesson_tokens
+
+    def keys(self):
+        with self._lock:
+            return list(self._lesson_tokens)
+
+    def add_lesson(self, key, lesson, public=True):
+        # public lessons count towards the vocabulary frequency view
+        with self._lock:
+            if key in self._lesson_tokens:
+                self.remove_lesson(key)
+            counts = Counter()
+            for question_index, question in enumerate(lesson.get("questions", ())):
+                for offset, field in ((0, "prompt"), (ANSWER_POSITION_OFFSET, "answer")):
+                    for position, token in enumerate(tokenize(question.get(field, "")), offset):
+                        postings = self._postings.get(token)
+                        if postings is None:
+                            postings = self._postings[token] = {}
+                            bisect.insort(self._vocabulary, token)
+                        postings.setdefault(key, {}).setdefault(question_index, []).append(position)
+                        counts[token] += 1
+            self._lesson_tokens[key] = counts
+            self._order[key] = next(self._sequence)
+            if public:
+                self._public.add(key)
+                self.frequencies.update(counts)
+
+    def remove_lesson(self, key):
+        with self._lock:
+            counts = self._lesson_tokens.pop(key, None)
+            if counts is None:
+                return
+            del self._order[key]
+            for token in counts:
+                postings = self._postings[token]
+                del postings[key]
+                if not postings:
+                    del self._postings[token]
+                    del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+            if key in self._public:
+                self._public.discard(key)
+                self.frequencies.subtract(counts)
+                self.frequencies += Counter()
+
+    def _documents(self, token):
+        return {
+            (key, question_index)
+            for key, questions in self._postings.get(token, {}).items()
+            for question_index in questions
+        }
+
+    def _prefix_documents(self, prefix):
+        documents = set()
+        start = bisect.bisect_left(self._vocabulary, prefix)
+        for token in self._vocabulary[start:]:
+            if not token.startswith(prefix):
+                break
+            documents.update(self._documents(token))
+        return documents
+
+    def _phrase_documents(self, tokens):
+        postings = [self._postings.get(token) for token in tokens]
+        if not all(postings):
+            return set()
+        keys = set(min(postings, key=len))
+        for token_postings in postings:
+            keys.intersection_update(token_postings)
+        matches = set()
+        for key in keys:
+            questions = [token_postings[key] for token_postings in postings]
+            for question_index in set(questions[0]).intersection(*questions[1:]):
+                starts = set(questions[0][question_index])
+                for shift, token_questions in enumerate(questions[1:], 1):
+                    starts.intersection_update(position - shift for position in token_questions[question_index])
+                    if not starts:
+                        break
+                if starts:
+                    matches.add((key, question_index))
+        return matches
+
+    def search(self, query, keys=None, limit=DEFAULT_LIMIT, prefix_last=True):
+        # [(lesson key, question index)] matching every term of query, restricted to lesson keys if given
+        with self._lock:
+            terms = parse_query(query, prefix_last)
+            if not terms:
+                return []
+            result = None
+            # Cheapest terms first, so the candidate set shrinks early
+            for kind, tokens in sorted(terms, key=lambda term: term[0] == "prefix"):
+                if kind == "word":
+                    documents = self._documents(tokens[0])
+                elif kind == "prefix":
+                    documents = self._prefix_documents(tokens[0])
+                else:
+                    documents = self._phrase_documents(tokens)
+                result = documents if result is None else result & documents
+                if not result:
+                    return []
+            if keys is not None:
+                result = [document for document in result if document[0] in keys]
+            order = self._order
+            return heapq.nsmallest(limit, result, key=lambda document: (order[document[0]], document[1]))
+
+    def search_lessons(self, query, lesson_keys, limit=DEFAULT_LIMIT, prefix_last=True):
+        # [(lesson name, question index)] matching query among lesson_keys, {lesson name: lesson key}; lessons
+        # indexed under the same key, such as two custom lessons with the same content, each get their hits
+        names = {}
+        for name, key in lesson_keys.items():
+            names.setdefault(key, []).append(name)
+        hits = self.search(query, names, limit, prefix_last)
+        results = []
+        for key, documents in itertools.groupby(hits, key=lambda document: document[0]):
+            question_indexes = [question_index for _, question_index in documents]
+            results.extend((name, question_index) for name in names[key] for question_index in question_indexes)
+        return results[:limit]
+
+    def vocabulary(self, prefix="", limit=DEFAULT_LIMIT):
+        # [(token, occurrences)] of public lessons, most frequent first
+        with self._lock:
+            if not prefix:
+                return self.frequencies.most_common(limit)
+            start = bisect.bisect_left(self._vocabulary, prefix)
+            matches = []
+            for token in self._vocabulary[start:]:
+                if not token.startswith(prefix):
+                    break
+                if self.frequencies[token] > 0:
+                    matches.append((token, self.frequencies[token]))
+            matches.sort(key=lambda item: -item[1])
+            return matches[:limit]
+
+
+class LibraryIndexer:
+    # Keeps a LessonIndex in step with lesson catalogs and the custom lesson store, re-indexing only what changed
+
+    def __init__(self, index=None):
+        self.index = index or LessonIndex()
+        self._lock = threading.Lock()
+        self._catalog_versions = {}
+        self._store_version = None
+        self._store_checked_at = 0
+
+    def sync_catalog(self, source, catalog):
+        # Catalog lessons are keyed (source, lesson name) and re-indexed when the catalog re-parses its file
+        try:
+            lessons = catalog.get()
+        except (FileNotFoundError, ValueError):
+            lessons = {}
+        with self._lock:
+            if self._catalog_versions.get(source) == (catalog.loads, len(lessons)):
+                return
+            self._catalog_versions[source] = (catalog.loads, len(lessons))
+            for key in self.index.keys():
+                if isinstance(key, tuple) and key[0] == source and key[1] not in lessons:
+                    self.index.remove_lesson(key)
+            for name, lesson in lessons.items():
+                self.index.add_lesson((source, name), lesson)
+
+    def sync_store(self, store, digests):
+        # Indexes the stored lessons among digests, the ones the searching user can see, on their first search.
+        # Stored lessons are keyed by content hash, so a body is indexed once however many users refer to it;
+        # bodies deleted from the store are dropped again
+        with self._lock:
+            now = time.monotonic()
+            if self._store_version != store.version or now - self._store_checked_at >= STORE_CHECK_INTERVAL:
+                self._store_version = store.version
+                self._store_checked_at = now
+                stored = set(store.digests())
+                for key in self.index.keys():
+                    if isinstance(key, str) and key not in stored:
+                        self.index.remove_lesson(key)
+            for digest in digests:
+                if digest in self.index:
+                    continue
+                try:
+                    lesson = store.body(digest)
+                except KeyError:
+                    # Deleted since the user's library listed it
+                    continue
+                self.index.add_lesson(digest, lesson, public=False)
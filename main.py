@@ -1,199 +1,267 @@
 import streamlit as st
 import json
-from datetime import datetime
-import re
 import random
-import time
-from gtts import gTTS
 import os
-import base64
-
-# Try to import speech_recognition and pyaudio, but don't fail if they're not available
-try:
-    import speech_recognition as sr
-    import pyaudio
-    speech_recognition_available = True
-except ImportError:
-    speech_recognition_available = False
-
-def save_progress(username):
-    progress = {
-        "score": st.session_state.score,
-        "streak": st.session_state.streak,
-        "lessons_completed": st.session_state.lessons_completed,
-        "current_lesson": st.session_state.current_lesson,
-        "question_index": st.session_state.question_index,
-        "timestamp": str(datetime.now())
-    }
-    with open(f"{username}_progress.json", "w") as f:
-        json.dump(progress, f)
-
-def load_progress(username):
+import hmac
+import importlib.util
+from collections import deque
+from achievements import DEFAULT_RULES_PATH, load_rules
+from answer_diff import MatchOptions, colored_html, diff_answer, next_word
+from attempt_log import AttemptLog
+from attempt_stats import AttemptStats
+from audio_cache import AudioCache
+from custom_lesson_store import CustomLessonStore, UserLessonLibrary
+from game_session import CORRECT_FEEDBACK, GameSession
+from leaderboard import METRICS as LEADERBOARD_METRICS, Leaderboard
+from lesson_catalog import get_catalog, overlay
+from lesson_import import import_lessons
+from lesson_search import LibraryIndexer, tokenize
+import metrics
+from metrics import span, timed
+from progress_store import open_backend
+from review_scheduler import ReviewScheduler
+from speech_recognizer import RecognitionError, RecognitionPool, open_backend as open_speech_backend
+from write_behind import SessionFlushGuard, WriteBehindStore
+
+# Accept "ae"/"oe"/"ue"/"ss" for umlauts and ß; set max_typos to also forgive small misspellings
+ANSWER_MATCHING = MatchOptions(transliterate=True, max_typos=0)
+
+# Questions kept in a session's review history, and shown per page of the lesson-end review
+REVIEW_HISTORY_CAP = 500
+REVIEW_PAGE_SIZE = 10
+
+# Limits for uploaded custom lessons
+MAX_IMPORT_BYTES = 50 * 1024 * 1024
+MAX_IMPORT_QUESTIONS = 200_000
+
+# Hits listed under the sidebar search box, and words in its vocabulary view
+SEARCH_RESULT_LIMIT = 20
+VOCABULARY_SIZE = 30
+
+# Questions listed on the error analysis page
+ERROR_ANALYSIS_SIZE = 20
+
+# Users listed per leaderboard metric
+LEADERBOARD_SIZE = 10
+
+# Cards per "Wiederholung" round
+REVIEW_BATCH_SIZE = 20
+
+# A submitted answer should cost exactly one script run; YIGIT_STRICT_RERUNS=1 turns overruns into errors
+MAX_RUNS_PER_ANSWER = 1
+STRICT_RERUNS = os.environ.get("YIGIT_STRICT_RERUNS") == "1"
+
+def module_available(name):
+    # Looks the module up without importing it
     try:
-        with open(f"{username}_progress.json", "r") as f:
-            progress = json.load(f)
-        
-        # Initialize session state with loaded progress
-        st.session_state.score = progress.get("score", 0)
-        st.session_state.streak = progress.get("streak", 0)
-        st.session_state.lessons_completed = progress.get("lessons_completed", 0)
-        st.session_state.current_lesson = progress.get("current_lesson", None)
-        st.session_state.question_index = progress.get("question_index", 0)
-        
-        return True
-    except FileNotFoundError:
-        # Initialize default values for new users
-        st.session_state.score = 0
-        st.session_state.streak = 0
-        st.session_state.lessons_completed = 0
-        st.session_state.current_lesson = None
-        st.session_state.question_index = 0
-        
-        return False
-    except json.JSONDecodeError:
-        st.error(f"Error reading progress file for {username}. File may be corrupted.")
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
         return False
 
-def clean_text(text):
-    return re.sub(r'[,.]', '', text.lower().strip())
+# Usernames are typed in without a password, so they cannot decide who is an administrator. The metrics and
+# error analysis pages are shown to sessions that entered YIGIT_ADMIN_TOKEN instead, and to nobody when it is unset
+ADMIN_TOKEN = os.environ.get("YIGIT_ADMIN_TOKEN", "")
+
+# Selects the speech recognition backend, see get_speech_backend
+SPEECH_BACKEND = os.environ.get("SPEECH_BACKEND", "google")
+
+# Recording from the microphone needs both SpeechRecognition and PyAudio, a recorded file only SpeechRecognition,
+# the fake backend neither; they are only imported on first use
+if SPEECH_BACKEND == "fake":
+    speech_recognition_available = True
+elif SPEECH_BACKEND == "file":
+    speech_recognition_available = module_available("speech_recognition")
+else:
+    speech_recognition_available = module_available("speech_recognition") and module_available("pyaudio")
+
+# Seconds to wait for speech to start, for a phrase to end, and between checks for a result
+LISTEN_TIMEOUT = 5
+PHRASE_TIME_LIMIT = 15
+VOICE_POLL_INTERVAL = 0.3
+
+@st.cache_resource
+def get_progress_backend():
+    # Selected with PROGRESS_BACKEND=json|sqlite and PROGRESS_PATH, written behind the request thread
+    return WriteBehindStore(open_backend())
+
+@st.cache_resource
+def get_leaderboard():
+    # Built from all stored progress once per process, then updated whenever the write-behind store commits
+    leaderboard = Leaderboard()
+    store = get_progress_backend()
+    store.add_listener(leaderboard.on_commit)
+    leaderboard.rebuild(store)
+    return leaderboard
+
+@st.cache_resource
+def get_attempt_log():
+    # Every answer attempt of every learner, appended in the background for attempt_stats.py to aggregate
+    return AttemptLog(os.environ.get("ATTEMPT_LOG_DIR", "attempt_logs"))
+
+@st.cache_resource
+def get_attempt_stats():
+    return AttemptStats(os.environ.get("ATTEMPT_STATS_DB", "attempt_stats.db"))
+
+@st.cache_resource
+def get_achievement_rules():
+    # Declarative rules, see achievements.json; ACHIEVEMENTS_PATH points to another rule file
+    return load_rules(os.environ.get("ACHIEVEMENTS_PATH", DEFAULT_RULES_PATH))
+
+@st.cache_resource
+def get_review_scheduler():
+    return ReviewScheduler(os.environ.get("REVIEW_DB_PATH", "reviews.db"))
+
+def load_game(username):
+    # Returns (game, returning_user); game.unreadable names the stored state that could not be read
+    all_lessons, _, _ = load_lessons()
+    game = GameSession(
+        username, get_progress_backend(), all_lessons, ANSWER_MATCHING, get_review_scheduler(), REVIEW_HISTORY_CAP,
+        get_attempt_log(), get_achievement_rules()
+    )
+    return game, game.load()
 
 def get_colored_answer(user_answer, correct_answer):
-    user_words = clean_text(user_answer).split()
-    correct_words = clean_text(correct_answer).split()
-    colored_words = []
-    for i, word in enumerate(user_words):
-        if i < len(correct_words) and word == correct_words[i]:
-            colored_words.append(f'<span style="color: darkgreen;">{word}</span>')
-        else:
-            colored_words.append(f'<span style="color: red;">{word}</span>')
-    return " ".join(colored_words)
+    return colored_html(diff_answer(user_answer, correct_answer, ANSWER_MATCHING))
 
 def get_next_word(correct_answer, user_answer):
-    correct_words = clean_text(correct_answer).split()
-    user_words = clean_text(user_answer).split()
-    for i, word in enumerate(correct_words):
-        if i >= len(user_words) or user_words[i] != word:
-            return word
-    return ""
+    return next_word(diff_answer(user_answer, correct_answer, ANSWER_MATCHING))
+
+@st.cache_resource
+def get_audio_cache():
+    # Shared by all sessions of this process
+    return AudioCache()
 
+@timed("text_to_speech")
 def text_to_speech(text, lang='de'):
-    tts = gTTS(text=text, lang=lang, slow=False)
-    filename = f"temp_audio_{hash(text)}.mp3"
-    tts.save(filename)
-    with open(filename, "rb") as f:
-        audio_bytes = f.read()
-    os.remove(filename)
-    audio_base64 = base64.b64encode(audio_bytes).decode()
-    audio_tag = f'<audio autoplay="true" src="data:audio/mp3;base64,{audio_base64}">'
-    st.markdown(audio_tag, unsafe_allow_html=True)
-
-def voice_to_text():
+    # The clip is served as raw bytes by Streamlit's media endpoint under a URL derived from its content,
+    # so only the URL goes over the websocket and the browser can cache and range-request the file
+    st.audio(get_audio_cache().get(text, lang=lang, slow=False), format="audio/mp3")
+
+@st.cache_resource
+def get_recognition_pool():
+    return RecognitionPool(workers=2)
+
+@st.cache_resource
+def get_speech_backend():
+    # SPEECH_BACKEND=google sends audio to Google, SPEECH_BACKEND=whisper recognizes it locally.
+    # Without a microphone, SPEECH_BACKEND=file transcribes the recording at SPEECH_FILE and
+    # SPEECH_BACKEND=fake answers with the "|"-separated SPEECH_FAKE_ANSWERS, one per click
+    return open_speech_backend(
+        SPEECH_BACKEND,
+        path=os.environ.get("SPEECH_FILE"),
+        answers=[answer for answer in os.environ.get("SPEECH_FAKE_ANSWERS", "").split("|") if answer],
+        listen_timeout=LISTEN_TIMEOUT,
+        phrase_time_limit=PHRASE_TIME_LIMIT
+    )
+
+def start_voice_answer():
     if not speech_recognition_available:
-        st.error("Spracherkennung ist nicht verfügbar. Bitte installieren Sie die benötigten Pakete (SpeechRecognition und PyAudio).")
-        return ""
-
+        st.session_state.voice_error = "Spracherkennung ist nicht verfügbar. Bitte installieren Sie die benötigten Pakete (SpeechRecognition und PyAudio)."
+        return
+    st.session_state.voice_job = get_recognition_pool().submit(
+        get_speech_backend(), key=st.session_state.game.question_key()
+    )
+
+def cancel_voice_answer():
+    job = st.session_state.pop("voice_job", None)
+    if job is not None:
+        job.cancel()
+
+def poll_voice_answer():
+    # Called before the question is rendered, so a recognized correct answer already shows the next question
+    job = st.session_state.get("voice_job")
+    if job is None or not job.done():
+        return
+    del st.session_state.voice_job
     try:
-        r = sr.Recognizer()
-        with sr.Microphone() as source:
-            st.write("Sprechen Sie jetzt...")
-            audio = r.listen(source)
-            st.write("Spracherkennung läuft...")
-    
-        text = r.recognize_google(audio, language="de-DE")
-        return text
-    except sr.UnknownValueError:
-        st.error("Entschuldigung, ich konnte das nicht verstehen.")
-        return ""
-    except sr.RequestError as e:
-        st.error(f"Konnte keine Ergebnisse vom Google Speech Recognition service abrufen; {e}")
-        return ""
-    except Exception as e:
-        st.error(f"Ein Fehler ist aufgetreten: {str(e)}")
-        return ""
-
-def check_answer():
-    user_answer = st.session_state.get('user_input', '')
-    correct_answer = st.session_state.correct_answer
-    if clean_text(user_answer) == clean_text(correct_answer):
-        st.session_state.feedback = "🎉 Richtig! Weiter zur nächsten Frage..."
-        st.session_state.score += 10
-        st.session_state.streak += 1
-        st.session_state.answer_correct = True
-        st.session_state.move_to_next = True
-        st.session_state.colored_answer = None
-        st.session_state.review_items.append({
-            "question": st.session_state.current_question["prompt"],
-            "correct_answer": correct_answer,
-            "user_answer": user_answer,
-            "is_correct": True
-        })
+        user_input = job.result()
+    except RecognitionError as e:
+        st.session_state.voice_error = str(e)
+        return
+    game = st.session_state.game
+    # The learner may have switched lessons or pages while speaking; the answer belongs to another question then
+    if job.key != game.question_key() or game.current_question() is None:
+        return
+    if user_input:
+        st.session_state.user_input = user_input
+        st.session_state.recognized_answer = user_input
+        check_answer()
+
+def render_voice_input():
+    job = st.session_state.get("voice_job")
+    if job is None:
+        st.button("Klicken Sie hier, um zu sprechen", on_click=start_voice_answer)
     else:
-        next_word = get_next_word(correct_answer, user_answer)
-        st.session_state.feedback = f"Nicht ganz. Versuchen Sie es nochmal! Tipp: {next_word}"
-        st.session_state.streak = 0
-        st.session_state.answer_correct = False
-        st.session_state.colored_answer = get_colored_answer(user_answer, correct_answer)
-        st.session_state.review_items.append({
-            "question": st.session_state.current_question["prompt"],
-            "correct_answer": correct_answer,
-            "user_answer": user_answer,
-            "is_correct": False
-        })
-    st.session_state.attempts += 1
-
-def next_question():
-    st.session_state.question_index += 1
-    st.session_state.feedback = ""
-    st.session_state.attempts = 0
-    st.session_state.answer_correct = False
-    st.session_state.move_to_next = False
-    st.session_state.reset_input = True
-    st.session_state.colored_answer = None
-
-def load_achievements():
-    try:
-        with open(f"{st.session_state.username}_achievements.json", "r") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {}
-
-def save_achievements(achievements):
-    with open(f"{st.session_state.username}_achievements.json", "w") as f:
-        json.dump(achievements, f)
-
-def check_achievements(achievements):
-    score = st.session_state.score
-    streak = st.session_state.streak
-    lessons_completed = st.session_state.lessons_completed
+        st.info("Sprechen Sie jetzt... Die Spracherkennung läuft im Hintergrund.")
+        st.button("Abbrechen", on_click=cancel_voice_answer)
     
-    new_achievements = []
-
-    if score >= 100 and "Punktesammler" not in achievements:
-        achievements["Punktesammler"] = "100 Punkte erreicht"
-        new_achievements.append("Punktesammler")
-
-    if score >= 500 and "Punkteprofi" not in achievements:
-        achievements["Punkteprofi"] = "500 Punkte erreicht"
-        new_achievements.append("Punkteprofi")
-
-    if streak >= 5 and "Streber" not in achievements:
-        achievements["Streber"] = "5er Serie erreicht"
-        new_achievements.append("Streber")
-
-    if streak >= 10 and "Serienmeister" not in achievements:
-        achievements["Serienmeister"] = "10er Serie erreicht"
-        new_achievements.append("Serienmeister")
-
-    if lessons_completed >= 1 and "Anfänger" not in achievements:
-        achievements["Anfänger"] = "Erste Lektion abgeschlossen"
-        new_achievements.append("Anfänger")
-
-    if lessons_completed >= 5 and "Fleißiger Schüler" not in achievements:
-        achievements["Fleißiger Schüler"] = "5 Lektionen abgeschlossen"
-        new_achievements.append("Fleißiger Schüler")
+    voice_error = st.session_state.pop("voice_error", None)
+    if voice_error:
+        st.error(voice_error)
+    recognized_answer = st.session_state.pop("recognized_answer", None)
+    if recognized_answer:
+        st.write(f"Erkannte Antwort: {recognized_answer}")
+    
+    if job is not None:
+        # Poll instead of blocking on the microphone; the page stays interactive between polls
+        job.wait(VOICE_POLL_INTERVAL)
+        st.experimental_rerun()
 
-    save_achievements(achievements)
-    return new_achievements, achievements
+def check_answer():
+    game = st.session_state.game
+    # Attribute the script runs that follow to this answer
+    st.session_state.answer_in_flight = True
+    st.session_state.runs_per_answer.append(0)
+    if game.submit(st.session_state.get('user_input', '')):
+        # Advance inside the callback, so the single rerun of this submit already shows the next question
+        new_achievements = game.advance()
+        st.session_state.flash = (CORRECT_FEEDBACK, new_achievements)
+        st.session_state.user_input = ""
+
+def start_review():
+    st.session_state.game.start_review(REVIEW_BATCH_SIZE)
+    st.session_state.user_input = ""
+
+def reset_progress(first_lesson):
+    st.session_state.game.reset(first_lesson)
+    st.session_state.user_input = ""
+
+def play_again():
+    st.session_state.game.restart_lesson()
+    st.session_state.review_page = 0
+    st.session_state.user_input = ""
+
+def start_script_run():
+    st.session_state.script_runs = st.session_state.get("script_runs", 0) + 1
+    if "runs_per_answer" not in st.session_state:
+        st.session_state.runs_per_answer = deque(maxlen=100)
+    if st.session_state.get("answer_in_flight"):
+        st.session_state.runs_per_answer[-1] += 1
+
+def finish_script_run():
+    # Only reached by runs that did not end in a rerun
+    if st.session_state.get("answer_in_flight"):
+        st.session_state.answer_in_flight = False
+        runs = st.session_state.runs_per_answer[-1]
+        if STRICT_RERUNS:
+            assert runs <= MAX_RUNS_PER_ANSWER, f"Answer took {runs} script runs, expected {MAX_RUNS_PER_ANSWER}"
+
+def show_flash():
+    # Shown once on the run after a correct answer and faded out by the browser, not by a server-side sleep
+    flash = st.session_state.pop("flash", None)
+    if flash:
+        message, new_achievements = flash
+        st.markdown(
+            f'''<style>
+            @keyframes answer-flash {{ 0%, 70% {{ opacity: 1; }} 100% {{ opacity: 0; }} }}
+            .answer-flash {{ animation: answer-flash 1.5s forwards; padding: 0.75rem 1rem; border-radius: 0.5rem;
+                             background-color: rgba(33, 195, 84, 0.1); color: rgb(23, 114, 51); }}
+            </style>
+            <div class="answer-flash">{message}</div>''',
+            unsafe_allow_html=True
+        )
+        if new_achievements:
+            st.success(f"Neue Errungenschaften freigeschaltet: {', '.join(new_achievements)}")
 
 def display_achievements(achievements):
     st.sidebar.subheader("Errungenschaften")
@@ -203,30 +271,137 @@ def display_achievements(achievements):
     else:
         st.sidebar.info("Noch keine Errungenschaften freigeschaltet.")
 
+@timed("load_lessons")
 def load_lessons():
-    # Load built-in lessons
+    # Load built-in lessons, parsed once per process and shared by all sessions
     try:
-        with open("lessons.json", "r") as f:
-            built_in_lessons = json.load(f)
+        built_in_lessons = get_catalog("lessons.json").get()
     except FileNotFoundError:
         st.error("lessons.json file not found. Please make sure it exists in the same directory as the script.")
         built_in_lessons = {}
     
-    # Load custom lessons from session state
-    custom_lessons = st.session_state.get('custom_lessons', {})
+    # Shared custom lessons shipped in custom_lessons.json
+    try:
+        shared_lessons = get_catalog("custom_lessons.json").get()
+    except FileNotFoundError:
+        shared_lessons = {}
+    except ValueError:
+        st.error("custom_lessons.json could not be read and is ignored.")
+        shared_lessons = {}
+    
+    # The user's own and shared lessons from the persistent store, loaded lesson by lesson on access
+    user_lessons = st.session_state.get('custom_lessons', {})
+    custom_lessons = overlay(shared_lessons, user_lessons)
     
     # Combine built-in and custom lessons
-    all_lessons = {}
-    all_lessons.update(built_in_lessons)
-    all_lessons.update(custom_lessons)
+    all_lessons = overlay(built_in_lessons, custom_lessons)
     
     return all_lessons, built_in_lessons, custom_lessons
 
-def save_custom_lesson(lesson_name, questions):
-    if 'custom_lessons' not in st.session_state:
-        st.session_state.custom_lessons = {}
+@st.cache_resource
+def get_custom_lesson_store():
+    return CustomLessonStore(os.environ.get("CUSTOM_LESSONS_DB", "custom_lessons.db"))
+
+@st.cache_resource
+def get_lesson_indexer():
+    # One search index per process; built-in lessons and stored lesson bodies are each indexed once,
+    # stored ones only when a user who can see them searches
+    return LibraryIndexer()
+
+def search_keys(built_in_lessons, custom_lessons):
+    # Lesson name -> index key for the lessons this user can see; custom lessons shadow built-in ones
+    library = st.session_state.custom_lessons
+    keys = {name: ("lessons.json", name) for name in built_in_lessons if name not in custom_lessons}
+    for name in custom_lessons:
+        keys[name] = library.digest(name) if name in library else ("custom_lessons.json", name)
+    return keys
+
+def sync_catalogs(indexer):
+    for path in ("lessons.json", "custom_lessons.json"):
+        indexer.sync_catalog(path, get_catalog(path))
+
+def open_search_result(lesson_name, question_index):
+    st.session_state.game.jump_to(lesson_name, question_index)
+    st.session_state.user_input = ""
+
+def lesson_search(game, built_in_lessons, custom_lessons):
+    query = st.text_input("Lektionen durchsuchen", key="lesson_query", placeholder='Wort, Präfix* oder "Phrase"')
+    indexer = get_lesson_indexer()
+    if query:
+        # Only the lessons that changed since the last search are (re-)indexed
+        sync_catalogs(indexer)
+        keys = search_keys(built_in_lessons, custom_lessons)
+        indexer.sync_store(get_custom_lesson_store(), [key for key in keys.values() if isinstance(key, str)])
+        hits = indexer.index.search_lessons(query, keys, SEARCH_RESULT_LIMIT)
+        if not hits:
+            st.caption("Keine Treffer.")
+        for lesson_name, question_index in hits:
+            question = game.lookup_question(lesson_name, question_index)
+            if question is None:
+                continue
+            st.button(
+                f"{lesson_name} · {question_index + 1}: {question['prompt']}",
+                key=f"search_{lesson_name}_{question_index}",
+                on_click=open_search_result,
+                args=(lesson_name, question_index)
+            )
+        if len(hits) == SEARCH_RESULT_LIMIT:
+            st.caption(f"Nur die ersten {SEARCH_RESULT_LIMIT} Treffer werden angezeigt.")
     
-    st.session_state.custom_lessons[lesson_name] = {"questions": questions}
+    # Word frequencies of the built-in and shipped lessons, narrowed to the word being typed
+    if st.checkbox("Wortschatz anzeigen", key="show_vocabulary"):
+        sync_catalogs(indexer)
+        typed = tokenize(query) if query and not query.endswith((" ", '"')) else []
+        words = indexer.index.vocabulary(typed[-1] if typed else "", VOCABULARY_SIZE)
+        if words:
+            st.write(", ".join(f"{word} ({count})" for word, count in words))
+        else:
+            st.caption("Keine Wörter gefunden.")
+
+def save_custom_lesson(lesson_name, questions):
+    st.session_state.custom_lessons.save(lesson_name, {"questions": questions})
+
+def add_draft_question():
+    prompt = st.session_state.new_prompt.strip()
+    answer = st.session_state.new_answer.strip()
+    if not prompt or not answer:
+        st.session_state.draft_message = "Bitte geben Sie eine Frage und eine Antwort ein."
+        return
+    st.session_state.draft_questions.append({"prompt": prompt, "answer": answer})
+    st.session_state.new_prompt = ""
+    st.session_state.new_answer = ""
+    st.session_state.draft_message = None
+
+def merge_imported_lessons(imported_lessons):
+    library = st.session_state.custom_lessons
+    for lesson_name, lesson in imported_lessons.items():
+        if library.is_own(lesson_name):
+            lesson = {"questions": list(library[lesson_name]["questions"]) + lesson["questions"]}
+        library.save(lesson_name, lesson)
+
+def delete_custom_lesson(lesson_name):
+    st.session_state.custom_lessons.delete(lesson_name)
+    st.session_state.lesson_message = f"Lektion '{lesson_name}' wurde gelöscht!"
+
+def toggle_shared_lesson(lesson_name):
+    st.session_state.custom_lessons.set_shared(lesson_name, st.session_state[f"share_{lesson_name}"])
+
+def show_import_report(report):
+    if report.fatal:
+        st.error(f"Import abgebrochen: {report.fatal} Es wurden keine Fragen gespeichert.")
+    elif report.imported:
+        st.success(f"{report.imported} Fragen in {report.lesson_count} Lektionen importiert.")
+    if report.duplicates:
+        st.info(f"{report.duplicates} doppelte Fragen übersprungen.")
+    if report.truncated:
+        st.warning(f"Es wurden nur die ersten {MAX_IMPORT_QUESTIONS} Fragen importiert.")
+    if report.error_count:
+        st.warning(f"{report.error_count} ungültige Einträge übersprungen.")
+        with st.expander("Fehlerbericht"):
+            for record_number, message in report.errors:
+                st.write(f"Eintrag {record_number}: {message}")
+            if report.error_count > len(report.errors):
+                st.write(f"... und {report.error_count - len(report.errors)} weitere.")
 
 def custom_lesson_manager():
     st.header("Benutzerdefinierte Lektionen verwalten")
@@ -236,62 +411,313 @@ def custom_lesson_manager():
     # Create new lesson
     st.subheader("Neue Lektion erstellen")
     lesson_name = st.text_input("Lektionsname")
-    questions = []
+    # Questions added so far survive the reruns between "Frage hinzufügen" clicks
+    if "draft_questions" not in st.session_state:
+        st.session_state.draft_questions = []
+    questions = st.session_state.draft_questions
     
     if lesson_name:
         st.write("Fügen Sie Fragen hinzu:")
-        new_prompt = st.text_input("Frage")
-        new_answer = st.text_input("Antwort")
-        if st.button("Frage hinzufügen"):
-            questions.append({"prompt": new_prompt, "answer": new_answer})
-            st.success("Frage hinzugefügt!")
+        st.text_input("Frage", key="new_prompt")
+        st.text_input("Antwort", key="new_answer")
+        st.button("Frage hinzufügen", on_click=add_draft_question)
+        if st.session_state.get("draft_message"):
+            st.warning(st.session_state.draft_message)
+        
+        if questions:
+            st.write(f"{len(questions)} Fragen hinzugefügt, zuletzt: {questions[-1]['prompt']}")
         
         if questions and st.button("Lektion speichern"):
             save_custom_lesson(lesson_name, questions)
+            st.session_state.draft_questions = []
             st.success(f"Lektion '{lesson_name}' wurde gespeichert!")
             lessons_changed = True
     
-    # View and delete custom lessons
+    # View, share and delete custom lessons; only names are listed, lesson bodies stay in the store
     st.subheader("Benutzerdefinierte Lektionen")
-    custom_lessons = st.session_state.get('custom_lessons', {})
+    custom_lessons = st.session_state.custom_lessons
+    lesson_message = st.session_state.pop("lesson_message", None)
+    if lesson_message:
+        st.success(lesson_message)
     
     if custom_lessons:
-        for lesson, content in custom_lessons.items():
+        for lesson in custom_lessons:
+            if not custom_lessons.is_own(lesson):
+                st.write(f"Geteilte Lektion: {lesson}")
+                continue
             st.write(f"Lektion: {lesson}")
-            if st.button(f"Löschen: {lesson}"):
-                del st.session_state.custom_lessons[lesson]
-                st.success(f"Lektion '{lesson}' wurde gelöscht!")
-                lessons_changed = True
-                st.experimental_rerun()
+            st.checkbox(
+                "Mit allen teilen",
+                value=custom_lessons.is_shared(lesson),
+                key=f"share_{lesson}",
+                on_change=toggle_shared_lesson,
+                args=(lesson,)
+            )
+            st.button(f"Löschen: {lesson}", on_click=delete_custom_lesson, args=(lesson,))
     else:
         st.info("Noch keine benutzerdefinierten Lektionen vorhanden.")
     
-    # Download custom lessons as JSON
-    if custom_lessons:
+    # Download own custom lessons as JSON, materialized only when asked for
+    if custom_lessons and st.button("Download vorbereiten"):
         st.download_button(
             label="Benutzerdefinierte Lektionen herunterladen",
-            data=json.dumps(custom_lessons, indent=2),
+            data=json.dumps(custom_lessons.export(), indent=2, ensure_ascii=False),
             file_name="custom_lessons.json",
             mime="application/json"
         )
     
-    # Upload custom lessons
-    uploaded_file = st.file_uploader("Benutzerdefinierte Lektionen hochladen", type="json")
-    if uploaded_file is not None:
-        uploaded_lessons = json.load(uploaded_file)
-        st.session_state.custom_lessons.update(uploaded_lessons)
-        st.success("Benutzerdefinierte Lektionen wurden hochgeladen!")
-        lessons_changed = True
+    # Upload custom lessons as JSON, JSON Lines, CSV or TSV, read record by record
+    uploaded_file = st.file_uploader(
+        "Benutzerdefinierte Lektionen hochladen (JSON, JSONL, CSV oder TSV mit den Spalten prompt, answer, lesson)",
+        type=["json", "jsonl", "csv", "tsv"]
+    )
+    if uploaded_file is not None and st.session_state.get("imported_upload") != uploaded_file.id:
+        all_lessons, _, _ = load_lessons()
+        report = import_lessons(
+            uploaded_file, uploaded_file.name, all_lessons, MAX_IMPORT_BYTES, MAX_IMPORT_QUESTIONS
+        )
+        # A file that could not be read to the end is rejected as a whole rather than saved in part
+        if not report.fatal:
+            merge_imported_lessons(report.lessons)
+            lessons_changed = bool(report.imported)
+        # Only the counts and errors are kept in the session, not the imported questions
+        report.lessons = {}
+        # The uploader keeps the file across reruns, import it only once
+        st.session_state.imported_upload = uploaded_file.id
+        st.session_state.import_report = report
+    
+    if uploaded_file is not None and "import_report" in st.session_state:
+        show_import_report(st.session_state.import_report)
     
     return lessons_changed
 
 def main():
     st.set_page_config(layout="wide", page_title="Deutsch Lernspiel")
+    start_script_run()
+    with span("rerun"):
+        render_page()
+    finish_script_run()
+
+def render_question(game, question):
+    st.header(question["prompt"])
     
-    # Initialize custom_lessons in session state if not present
-    if 'custom_lessons' not in st.session_state:
-        st.session_state.custom_lessons = {}
+    # Text-to-speech button
+    if st.button("Hören Sie die Antwort"):
+        text_to_speech(question["answer"], lang='de')
     
+    # Add voice input option only if speech recognition is available
+    if speech_recognition_available:
+        input_method = st.radio("Wie möchten Sie antworten?", ("Text", "Stimme"))
+    else:
+        input_method = "Text"
+        st.warning("Spracherkennung ist nicht verfügbar. Bitte verwenden Sie die Texteingabe.")
+    
+    if input_method == "Text":
+        st.text_input("Ihre Antwort:", key="user_input", on_change=check_answer)
+    else:
+        render_voice_input()
+    
+    if game.feedback and not game.answer_correct:
+        st.warning(game.feedback)
+        if game.colored_answer:
+            st.markdown(f"Ihre Antwort bisher: {game.colored_answer}", unsafe_allow_html=True)
+
+def change_review_page(page_number):
+    st.session_state.review_page = page_number
+
+def review_history_page(game):
+    st.subheader("Überprüfungsmodus")
+    page_count = game.review_items.page_count(REVIEW_PAGE_SIZE)
+    page_number = min(st.session_state.get("review_page", 0), page_count - 1)
+    
+    # Only the visible page gets widgets
+    start, records = game.review_items.page(page_number, REVIEW_PAGE_SIZE)
+    for i, record in enumerate(records, start):
+        question = game.lookup_question(record.lesson, record.question_index)
+        if question is None:
+            continue
+        with st.expander(f"Frage {i+1}: {question['prompt']}"):
+            st.write(f"Richtige Antwort: {question['answer']}")
+            st.write(f"Ihre Antwort: {record.last_answer}")
+            st.write(f"Versuche: {record.attempts}")
+            if record.is_correct:
+                st.success("Richtig!")
+            else:
+                st.error("Falsch")
+            if st.button(f"Hören Sie die richtige Antwort (F{i+1})", key=f"listen_{i}"):
+                text_to_speech(question['answer'], lang='de')
+    
+    if page_count > 1:
+        previous_column, label_column, next_column = st.columns(3)
+        previous_column.button(
+            "◀ Zurück", disabled=page_number == 0, on_click=change_review_page, args=(page_number - 1,)
+        )
+        label_column.write(f"Seite {page_number + 1} von {page_count}")
+        next_column.button(
+            "Weiter ▶", disabled=page_number >= page_count - 1, on_click=change_review_page, args=(page_number + 1,)
+        )
+
+def review_practice(game):
+    st.title("Wiederholung")
+    poll_voice_answer()
+    show_flash()
+    
+    if game.review_queue is None or not game.review_queue:
+        due_count = get_review_scheduler().due_count(game.username)
+        if game.review_queue is not None:
+            st.success("🎉 Alle fälligen Karten dieser Runde wiederholt!")
+        if due_count:
+            st.write(f"Fällige Karten: {due_count}")
+            st.button("Wiederholung starten", on_click=start_review)
+        else:
+            st.info("Keine Karten fällig. Beantworten Sie Fragen im Lernspiel, um Karten zu sammeln.")
+        return
+    
+    st.caption(f"Noch {len(game.review_queue)} Karten in dieser Runde")
+    lesson_name, _ = game.question_key()
+    st.write(f"Lektion: {lesson_name}")
+    render_question(game, game.current_question())
+
+def leaderboard_page(game):
+    st.title("Bestenliste")
+    leaderboard = get_leaderboard()
+    # Commit this user's pending progress so their own rank is current
+    game.flush()
+    metric = st.radio(
+        "Rangliste nach", list(LEADERBOARD_METRICS), format_func=LEADERBOARD_METRICS.get, horizontal=True
+    )
+    
+    top = leaderboard.top(metric, LEADERBOARD_SIZE)
+    if not top:
+        st.info("Noch keine Einträge.")
+        return
+    st.table([
+        {"Rang": leaderboard.rank(metric, username)[0], "Benutzer": username, LEADERBOARD_METRICS[metric]: value}
+        for username, value in top
+    ])
+    
+    own_rank = leaderboard.rank(metric, game.username)
+    if own_rank is not None:
+        rank, value = own_rank
+        st.write(f"Ihr Rang: {rank} von {len(leaderboard)} ({LEADERBOARD_METRICS[metric]}: {value})")
+
+def format_ms(seconds):
+    return "–" if seconds is None else f"{seconds * 1000:.1f}"
+
+def metrics_page():
+    st.title("Metriken")
+    if not metrics.ENABLED:
+        st.info("Die Zeitmessung ist ausgeschaltet. Starten Sie die App mit YIGIT_METRICS=1, um sie einzuschalten.")
+    
+    snapshot = metrics.REGISTRY.snapshot()
+    st.subheader("Zeitmessung (ms, pro Prozess)")
+    if snapshot["spans"]:
+        st.table([
+            {
+                "Span": name,
+                "Anzahl": stats["count"],
+                "Gesamt": format_ms(stats["total_seconds"]),
+                "Mittel": format_ms(stats["mean_seconds"]),
+                "p50 ≤": format_ms(stats["p50_seconds"]),
+                "p99 ≤": format_ms(stats["p99_seconds"]),
+            }
+            for name, stats in snapshot["spans"].items()
+        ])
+    else:
+        st.write("Noch keine Messungen.")
+    
+    st.subheader("Spracherkennung (s)")
+    speech_stats = get_recognition_pool().latency_stats()
+    if speech_stats:
+        st.table([{"Backend": name, **stats} for name, stats in speech_stats.items()])
+    else:
+        st.write("Noch keine Spracherkennungen.")
+    
+    st.subheader("Speicher und Audio")
+    store = get_progress_backend()
+    st.write(f"Fortschritt: {store.writes} Schreibvorgänge, {store.skipped} unveränderte übersprungen, {store.pending()} ausstehend")
+    st.write(f"Audio-Cache: {json.dumps(get_audio_cache().stats())}")
+    runs = st.session_state.get("runs_per_answer")
+    if runs:
+        st.write(f"Skriptläufe pro Antwort (diese Sitzung): {sum(runs) / len(runs):.2f} im Mittel, höchstens {max(runs)}")
+    
+    st.download_button("Prometheus-Export", metrics.REGISTRY.prometheus(), file_name="yigit_metrics.prom", mime="text/plain")
+    st.download_button(
+        "JSON-Export", json.dumps(snapshot, indent=2), file_name="yigit_metrics.json", mime="application/json"
+    )
+    st.button("Messungen zurücksetzen", on_click=metrics.REGISTRY.reset)
+
+def aggregate_attempts():
+    get_attempt_log().flush()
+    st.session_state.aggregated_events = get_attempt_stats().aggregate(os.environ.get("ATTEMPT_LOG_DIR", "attempt_logs"))
+
+def error_analysis_page(game):
+    st.title("Fehleranalyse")
+    st.caption("Aus dem Antwortprotokoll aller Lernenden; attempt_stats.py aktualisiert die Tabellen auch offline.")
+    st.button("Protokoll jetzt auswerten", on_click=aggregate_attempts)
+    aggregated_events = st.session_state.pop("aggregated_events", None)
+    if aggregated_events is not None:
+        st.success(f"{aggregated_events} neue Versuche ausgewertet.")
+    
+    stats = get_attempt_stats()
+    min_attempts = st.number_input("Mindestanzahl Versuche", min_value=1, value=5)
+    hardest = stats.hardest(ERROR_ANALYSIS_SIZE, min_attempts)
+    if not hardest:
+        st.info("Noch keine ausgewerteten Versuche.")
+        return
+    
+    st.subheader("Schwierigste Fragen")
+    rows = []
+    for lesson, question_index, attempts, error_rate, first_try_rate, latency in hardest:
+        question = game.lookup_question(lesson, question_index)
+        rows.append({
+            "Lektion": lesson,
+            "Frage": question["prompt"] if question else f"#{question_index + 1} (nicht mehr vorhanden)",
+            "Versuche": attempts,
+            "Fehlerquote": f"{error_rate:.0%}",
+            "Beim ersten Versuch": f"{first_try_rate:.0%}",
+            "Ø Sekunden": f"{latency:.1f}",
+        })
+    st.table(rows)
+    
+    st.subheader("Häufige Fehler")
+    selected = st.selectbox(
+        "Frage", range(len(hardest)), format_func=lambda i: f"{rows[i]['Lektion']}: {rows[i]['Frage']}"
+    )
+    lesson, question_index = hardest[selected][:2]
+    question = game.lookup_question(lesson, question_index)
+    if question:
+        st.write(f"Richtige Antwort: {question['answer']}")
+    mistakes = stats.common_mistakes(lesson, question_index)
+    if mistakes:
+        st.table([
+            {"Erwartet": expected or "(zusätzliches Wort)", "Eingegeben": given or "(fehlt)", "Anzahl": count}
+            for expected, given, count in mistakes
+        ])
+    
+    st.subheader("Lektionen nach Fehlerquote")
+    st.table([
+        {"Lektion": lesson, "Versuche": attempts, "Fehlerquote": f"{error_rate:.0%}"}
+        for lesson, attempts, error_rate in stats.lesson_difficulty()
+    ])
+
+def check_admin_token():
+    st.session_state.admin = hmac.compare_digest(st.session_state.pop("admin_token", "").encode(), ADMIN_TOKEN.encode())
+    if not st.session_state.admin:
+        st.session_state.admin_error = "Ungültiger Admin-Schlüssel."
+
+def is_admin():
+    if not ADMIN_TOKEN:
+        return False
+    if not st.session_state.get("admin"):
+        with st.sidebar.expander("Administration"):
+            st.text_input("Admin-Schlüssel", type="password", key="admin_token", on_change=check_admin_token)
+            admin_error = st.session_state.pop("admin_error", None)
+            if admin_error:
+                st.error(admin_error)
+    return st.session_state.get("admin", False)
+
+def render_page():
     if "username" not in st.session_state:
         st.session_state.username = ""
     
@@ -299,32 +725,47 @@ def main():
         st.title("Willkommen beim Deutsch Lernspiel!")
         username = st.text_input("Geben Sie Ihren Benutzernamen ein, um zu beginnen:")
         if username:
+            game, returning_user = load_game(username)
+            if game.unreadable:
+                # Playing on would save over the state that could not be read, so the login is refused
+                st.error(
+                    f"Error reading {' and '.join(game.unreadable)} for {username}. File may be corrupted; "
+                    "an administrator can move it aside with `python admin.py validate --quarantine DIR`."
+                )
+                return
             st.session_state.username = username
-            if load_progress(username):
+            st.session_state.flush_guard = SessionFlushGuard(get_progress_backend(), username)
+            st.session_state.custom_lessons = UserLessonLibrary(get_custom_lesson_store(), username)
+            st.session_state.game = game
+            if returning_user:
                 st.success("Willkommen zurück! Ihr Fortschritt wurde geladen.")
             else:
                 st.success(f"Willkommen, {username}! Ein neues Spiel wurde für Sie gestartet.")
             st.experimental_rerun()
         return
 
-    # Load achievements
-    if "achievements" not in st.session_state:
-        st.session_state.achievements = load_achievements()
+    game = st.session_state.game
 
     # Navigation
-    page = st.sidebar.radio("Navigation", ["Lernspiel", "Benutzerdefinierte Lektionen"])
+    pages = ["Lernspiel", "Wiederholung", "Bestenliste", "Benutzerdefinierte Lektionen"]
+    if is_admin():
+        pages.extend(["Metriken", "Fehleranalyse"])
+    page = st.sidebar.radio("Navigation", pages)
+    if page != "Wiederholung":
+        game.stop_review()
 
     if page == "Lernspiel":
         # Load lessons data
         all_lessons, built_in_lessons, custom_lessons = load_lessons()
+        game.lessons = all_lessons
 
         # Sidebar for lesson selection and stats
         with st.sidebar:
             st.title(f"Willkommen, {st.session_state.username}!")
             
             # Handle the case where current_lesson might not be set
-            if "current_lesson" not in st.session_state or st.session_state.current_lesson not in all_lessons:
-                st.session_state.current_lesson = list(all_lessons.keys())[0] if all_lessons else None
+            if game.current_lesson not in all_lessons:
+                game.select_lesson(list(all_lessons.keys())[0] if all_lessons else None)
             
             # Create a list of lesson options with separators
             lesson_options = []
@@ -339,62 +780,40 @@ def main():
                 selected_lesson = st.selectbox(
                     "Wählen Sie eine Lektion:", 
                     lesson_options,
-                    index=lesson_options.index(st.session_state.current_lesson) if st.session_state.current_lesson in lesson_options else 0
+                    index=lesson_options.index(game.current_lesson) if game.current_lesson in lesson_options else 0
                 )
                 
                 # Update current_lesson only if a valid lesson is selected
                 if selected_lesson in all_lessons:
-                    st.session_state.current_lesson = selected_lesson
+                    game.select_lesson(selected_lesson)
             else:
                 st.warning("Keine Lektionen verfügbar. Bitte fügen Sie einige hinzu.")
+            
+            lesson_search(game, built_in_lessons, custom_lessons)
 
-            st.metric("Punktzahl", st.session_state.score)
-            st.metric("Serie", st.session_state.streak)
-            st.metric("Abgeschlossene Lektionen", st.session_state.lessons_completed)
-            if st.button("Fortschritt zurücksetzen"):
-                st.session_state.score = 0
-                st.session_state.streak = 0
-                st.session_state.question_index = 0
-                st.session_state.answer_correct = False
-                st.session_state.move_to_next = False
-                st.session_state.reset_input = True
-                st.session_state.colored_answer = None
-                st.session_state.review_items = []
-                st.session_state.current_lesson = list(all_lessons.keys())[0] if all_lessons else None
-                st.session_state.achievements = {}  # Reset achievements
-                save_progress(st.session_state.username)
-                save_achievements({})  # Reset achievements file
-                st.experimental_rerun()
+            st.metric("Punktzahl", game.score)
+            st.metric("Serie", game.streak)
+            st.metric("Abgeschlossene Lektionen", game.lessons_completed)
+            st.button(
+                "Fortschritt zurücksetzen",
+                on_click=reset_progress,
+                args=(list(all_lessons.keys())[0] if all_lessons else None,)
+            )
 
         # Display achievements
-        display_achievements(st.session_state.achievements)
-
-        if st.session_state.current_lesson in all_lessons:
-            current_lesson = all_lessons[st.session_state.current_lesson]
-
-            # Initialize session state
-            if "review_items" not in st.session_state:
-                st.session_state.review_items = []
-            if "feedback" not in st.session_state:
-                st.session_state.feedback = ""
-            if "attempts" not in st.session_state:
-                st.session_state.attempts = 0
-            if "answer_correct" not in st.session_state:
-                st.session_state.answer_correct = False
-            if "move_to_next" not in st.session_state:
-                st.session_state.move_to_next = False
-            if "reset_input" not in st.session_state:
-                st.session_state.reset_input = False
-            if "colored_answer" not in st.session_state:
-                st.session_state.colored_answer = None
+        display_achievements(game.achievements)
 
+        if game.current_lesson in all_lessons:
             # Main game area
             st.title("Deutsch Lernspiel")
+            poll_voice_answer()
+            show_flash()
             
             # Progress bar
-            if "questions" in current_lesson and len(current_lesson["questions"]) > 0:
-                if st.session_state.question_index < len(current_lesson["questions"]):
-                    progress = st.session_state.question_index / len(current_lesson["questions"])
+            questions = game.questions()
+            if len(questions) > 0:
+                if game.question_index < len(questions):
+                    progress = game.question_index / len(questions)
                     st.progress(progress)
                 else:
                     st.progress(1.0)  # Set progress to 100% if all questions are answered
@@ -403,107 +822,44 @@ def main():
                 return  # Exit the function if there are no questions
 
             # Get current question
-            if st.session_state.question_index < len(current_lesson["questions"]):
-                question = current_lesson["questions"][st.session_state.question_index]
-                st.session_state.current_question = question
-                
-                st.header(question["prompt"])
-                
-                st.session_state.correct_answer = question["answer"]
-                
-                # Text-to-speech button
-                if st.button("Hören Sie die Antwort"):
-                    text_to_speech(question["answer"], lang='de')
-                
-                # Reset input if flag is set
-                if st.session_state.reset_input:
-                    st.session_state.user_input = ""
-                    st.session_state.reset_input = False
-                
-                # Add voice input option only if speech recognition is available
-                if speech_recognition_available:
-                    input_method = st.radio("Wie möchten Sie antworten?", ("Text", "Stimme"))
-                else:
-                    input_method = "Text"
-                    st.warning("Spracherkennung ist nicht verfügbar. Bitte verwenden Sie die Texteingabe.")
-                
-                if input_method == "Text":
-                    user_input = st.text_input("Ihre Antwort:", key="user_input", on_change=check_answer)
-                else:
-                    if st.button("Klicken Sie hier, um zu sprechen"):
-                        user_input = voice_to_text()
-                        if user_input:
-                            st.session_state.user_input = user_input
-                            st.write(f"Erkannte Antwort: {user_input}")
-                            check_answer()
-                
-                if st.session_state.feedback:
-                    if "Richtig" in st.session_state.feedback:
-                        st.success(st.session_state.feedback)
-                        time.sleep(1)  # Wait for 1 second
-                        next_question()
-                        save_progress(st.session_state.username)  # Save progress after each correct answer
-                        
-                        # Check for new achievements
-                        new_achievements, st.session_state.achievements = check_achievements(st.session_state.achievements)
-                        if new_achievements:
-                            st.success(f"Neue Errungenschaften freigeschaltet: {', '.join(new_achievements)}")
-                        
-                        st.experimental_rerun()
-                    else:
-                        st.warning(st.session_state.feedback)
-                        if st.session_state.colored_answer:
-                            st.markdown(f"Ihre Antwort bisher: {st.session_state.colored_answer}", unsafe_allow_html=True)
-                
-                if st.session_state.move_to_next:
-                    next_question()
-                    save_progress(st.session_state.username)  # Save progress after moving to next question
-                    st.experimental_rerun()
+            question = game.current_question()
+            if question is not None:
+                render_question(game, question)
 
             else:
                 st.balloons()
                 st.success("🎉 Herzlichen Glückwunsch! Sie haben alle Fragen in dieser Lektion beantwortet.")
-                st.write(f"Ihre Endpunktzahl: {st.session_state.score}")
+                st.write(f"Ihre Endpunktzahl: {game.score}")
                 
-                # Increment completed lessons
-                st.session_state.lessons_completed += 1
-                save_progress(st.session_state.username)  # Save progress after completing a lesson
-                
-                # Check for new achievements
-                new_achievements, st.session_state.achievements = check_achievements(st.session_state.achievements)
+                # Count the completed lesson and check for new achievements
+                new_achievements = game.complete_lesson()
                 if new_achievements:
                     st.success(f"Neue Errungenschaften freigeschaltet: {', '.join(new_achievements)}")
                 
                 # Review mode
-                st.subheader("Überprüfungsmodus")
-                for i, item in enumerate(st.session_state.review_items):
-                    with st.expander(f"Frage {i+1}: {item['question']}"):
-                        st.write(f"Richtige Antwort: {item['correct_answer']}")
-                        st.write(f"Ihre Antwort: {item['user_answer']}")
-                        if item['is_correct']:
-                            st.success("Richtig!")
-                        else:
-                            st.error("Falsch")
-                        if st.button(f"Hören Sie die richtige Antwort (F{i+1})", key=f"listen_{i}"):
-                            text_to_speech(item['correct_answer'], lang='de')
+                review_history_page(game)
                 
-                if st.button("Nochmal spielen"):
-                    st.session_state.question_index = 0
-                    st.session_state.feedback = ""
-                    st.session_state.attempts = 0
-                    st.session_state.answer_correct = False
-                    st.session_state.move_to_next = False
-                    st.session_state.reset_input = True
-                    st.session_state.colored_answer = None
-                    st.session_state.review_items = []
-                    save_progress(st.session_state.username)
-                    st.experimental_rerun()
+                st.button("Nochmal spielen", on_click=play_again)
+
+    elif page == "Wiederholung":
+        game.lessons, _, _ = load_lessons()
+        review_practice(game)
+
+    elif page == "Bestenliste":
+        leaderboard_page(game)
 
     elif page == "Benutzerdefinierte Lektionen":
         lessons_changed = custom_lesson_manager()
         if lessons_changed:
             st.experimental_rerun()
 
+    elif page == "Metriken":
+        metrics_page()
+
+    elif page == "Fehleranalyse":
+        game.lessons, _, _ = load_lessons()
+        error_analysis_page(game)
+
     # Fun facts or tips
     if random.random() < 0.3:  # 30% chance to show a tip
         st.sidebar.info("💡 Tipp: Üben Sie regelmäßig, um Ihre Deutschkenntnisse zu verbessern!")
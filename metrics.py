@@ -0,0 +1,148 @@
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+# YIGIT_METRICS=1 turns timing spans on; when off, timed() returns functions unchanged and span() a shared no-op
+ENABLED = os.environ.get("YIGIT_METRICS") == "1"
+# Where to write the final snapshot when the process exits, see Registry.write()
+EXPORT_PATH = os.environ.get("YIGIT_METRICS_FILE")
+
+# Upper bounds in seconds of the latency histogram buckets; slower calls land in +Inf
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_NO_SPAN = nullcontext()
+
+
+class Histogram:
+    __slots__ = ("count", "total", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation; None when the histogram is empty
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    # Per-process span statistics by name
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self.started = time.time()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
+            self.started = time.time()
+
+    def snapshot(self):
+        with self._lock:
+            spans = {}
+            for name, histogram in sorted(self._histograms.items()):
+                spans[name] = {
+                    "count": histogram.count,
+                    "total_seconds": histogram.total,
+                    "mean_seconds": histogram.total / histogram.count,
+                    "p50_seconds": histogram.quantile(0.5),
+                    "p99_seconds": histogram.quantile(0.99),
+                    "buckets": dict(zip([str(bound) for bound in BUCKETS] + ["+Inf"], histogram.buckets)),
+                }
+            return {"started": self.started, "taken": time.time(), "spans": spans}
+
+    def prometheus(self):
+        # Prometheus text exposition format, one histogram with a span label
+        lines = [
+            "# HELP yigit_span_seconds Time spent in instrumented code paths.",
+            "# TYPE yigit_span_seconds histogram",
+        ]
+        with self._lock:
+            for name, histogram in sorted(self._histograms.items()):
+                cumulative = 0
+                for bound, count in zip([repr(bound) for bound in BUCKETS] + ["+Inf"], histogram.buckets):
+                    cumulative += count
+                    lines.append(f'yigit_span_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+                lines.append(f'yigit_span_seconds_sum{{span="{name}"}} {histogram.total!r}')
+                lines.append(f'yigit_span_seconds_count{{span="{name}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        # Prometheus text for .prom/.txt files, a JSON snapshot otherwise; replaced atomically for scrapers
+        if path.endswith((".prom", ".txt")):
+            content = self.prometheus()
+        else:
+            content = json.dumps(self.snapshot(), indent=2)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+
+REGISTRY = Registry()
+
+if ENABLED and EXPORT_PATH:
+    atexit.register(REGISTRY.write, EXPORT_PATH)
+
+
+class _Span:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        REGISTRY.observe(self.name, time.perf_counter() - self.started)
+
+
+def span(name):
+    # with span("name"): ... records the block's wall time, errors included
+    return _Span(name) if ENABLED else _NO_SPAN
+
+
+def timed(name):
+    # Decorator recording every call of the function as a span
+    def decorate(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                REGISTRY.observe(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
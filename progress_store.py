@@ -0,0 +1,250 @@
+import argparse
+import json
+import os
+import threading
+from datetime import datetime
+
+from metrics import timed
+from sqlite_db import SqliteDatabase
+
+PROGRESS_FIELDS = ("score", "streak", "lessons_completed", "current_lesson", "question_index", "timestamp")
+
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ProgressBackend:
+    # load_progress() returns None for unknown users and raises ValueError for unreadable state
+
+    def load_progress(self, username):
+        raise NotImplementedError
+
+    def load_achievements(self, username):
+        raise NotImplementedError
+
+    def save(self, username, progress=None, achievements=None):
+        raise NotImplementedError
+
+    def usernames(self):
+        raise NotImplementedError
+
+    def iter_progress(self):
+        # Yields (username, progress) for every user with readable progress, skipping unreadable state
+        for username in self.usernames():
+            try:
+                progress = self.load_progress(username)
+            except ValueError:
+                continue
+            if progress is not None:
+                yield username, progress
+
+    def save_many(self, records):
+        # records: iterable of (username, progress, achievements), either of the latter may be None
+        for username, progress, achievements in records:
+            self.save(username, progress=progress, achievements=achievements)
+
+    @timed("save_progress")
+    def save_progress(self, username, progress):
+        self.save(username, progress=progress)
+
+    @timed("save_achievements")
+    def save_achievements(self, username, achievements):
+        self.save(username, achievements=achievements)
+
+    def close(self):
+        pass
+
+
+class JsonProgressBackend(ProgressBackend):
+    PROGRESS_SUFFIX = "_progress.json"
+    ACHIEVEMENTS_SUFFIX = "_achievements.json"
+
+    def __init__(self, directory="."):
+        self.directory = directory
+
+    def progress_path(self, username):
+        return os.path.join(self.directory, f"{username}{self.PROGRESS_SUFFIX}")
+
+    def achievements_path(self, username):
+        return os.path.join(self.directory, f"{username}{self.ACHIEVEMENTS_SUFFIX}")
+
+    def load_progress(self, username):
+        try:
+            with open(self.progress_path(username), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def load_achievements(self, username):
+        try:
+            with open(self.achievements_path(username), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def save(self, username, progress=None, achievements=None):
+        if progress is not None:
+            write_json_atomic(self.progress_path(username), progress)
+        if achievements is not None:
+            write_json_atomic(self.achievements_path(username), achievements)
+
+    def usernames(self):
+        names = set()
+        for entry in os.scandir(self.directory):
+            for suffix in (self.PROGRESS_SUFFIX, self.ACHIEVEMENTS_SUFFIX):
+                if entry.name.endswith(suffix) and entry.is_file():
+                    names.add(entry.name[:-len(suffix)])
+        return sorted(names)
+
+
+class SqliteProgressBackend(SqliteDatabase, ProgressBackend):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS progress (
+            username TEXT PRIMARY KEY,
+            score INTEGER NOT NULL DEFAULT 0,
+            streak INTEGER NOT NULL DEFAULT 0,
+            lessons_completed INTEGER NOT NULL DEFAULT 0,
+            current_lesson TEXT,
+            question_index INTEGER NOT NULL DEFAULT 0,
+            timestamp TEXT,
+            extra TEXT
+        );
+        CREATE TABLE IF NOT EXISTS achievements (
+            username TEXT NOT NULL,
+            badge TEXT NOT NULL,
+            description TEXT NOT NULL,
+            PRIMARY KEY (username, badge)
+        );
+    """
+
+    def __init__(self, path="progress.db"):
+        super().__init__(path)
+
+    def load_progress(self, username):
+        rows = self._query(
+            "SELECT score, streak, lessons_completed, current_lesson, question_index, timestamp, extra "
+            "FROM progress WHERE username = ?",
+            (username,),
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        progress = json.loads(row[6]) if row[6] else {}
+        progress.update(zip(PROGRESS_FIELDS, row[:6]))
+        return progress
+
+    def load_achievements(self, username):
+        return dict(self._query(
+            "SELECT badge, description FROM achievements WHERE username = ? ORDER BY rowid", (username,)
+        ))
+
+    def save(self, username, progress=None, achievements=None):
+        self.save_many([(username, progress, achievements)])
+
+    def save_many(self, records):
+        # All records in one transaction
+        with self._transaction() as conn:
+            for username, progress, achievements in records:
+                self._write(conn, username, progress, achievements)
+
+    def _write(self, conn, username, progress, achievements):
+        if progress is not None:
+            extra = {key: value for key, value in progress.items() if key not in PROGRESS_FIELDS}
+            conn.execute(
+                "INSERT OR REPLACE INTO progress "
+                "(username, score, streak, lessons_completed, current_lesson, question_index, timestamp, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    username,
+                    progress.get("score", 0),
+                    progress.get("streak", 0),
+                    progress.get("lessons_completed", 0),
+                    progress.get("current_lesson"),
+                    progress.get("question_index", 0),
+                    progress.get("timestamp"),
+                    json.dumps(extra) if extra else None,
+                ),
+            )
+        if achievements is not None:
+            conn.execute("DELETE FROM achievements WHERE username = ?", (username,))
+            conn.executemany(
+                "INSERT INTO achievements (username, badge, description) VALUES (?, ?, ?)",
+                [(username, badge, description) for badge, description in achievements.items()],
+            )
+
+    def usernames(self):
+        rows = self._query(
+            "SELECT username FROM progress UNION SELECT username FROM achievements ORDER BY username"
+        )
+        return [row[0] for row in rows]
+
+    def iter_progress(self, batch_size=1000):
+        # Pages through the table by username, so the shared connection is not held while the caller works
+        last = ""
+        while True:
+            rows = self._query(
+                "SELECT username, score, streak, lessons_completed, current_lesson, question_index, timestamp, "
+                "extra FROM progress WHERE username > ? ORDER BY username LIMIT ?",
+                (last, batch_size),
+            )
+            for row in rows:
+                progress = json.loads(row[7]) if row[7] else {}
+                progress.update(zip(PROGRESS_FIELDS, row[1:7]))
+                yield row[0], progress
+            if len(rows) < batch_size:
+                return
+            last = rows[-1][0]
+
+
+def open_backend(kind=None, location=None):
+    kind = kind or os.environ.get("PROGRESS_BACKEND", "json")
+    location = location or os.environ.get("PROGRESS_PATH")
+    if kind == "json":
+        return JsonProgressBackend(location or ".")
+    if kind == "sqlite":
+        return SqliteProgressBackend(location or "progress.db")
+    raise ValueError(f"Unknown progress backend: {kind}")
+
+
+def migrate(source, target, skip_existing=True):
+    # Returns (imported usernames, {username: error} for unreadable source state)
+    imported = []
+    errors = {}
+    for username in source.usernames():
+        if skip_existing and target.load_progress(username) is not None:
+            continue
+        try:
+            progress = source.load_progress(username)
+            achievements = source.load_achievements(username)
+        except ValueError as e:
+            errors[username] = e
+            continue
+        target.save(username, progress=progress, achievements=achievements)
+        imported.append(username)
+    return imported, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import *_progress.json and *_achievements.json files into SQLite.")
+    parser.add_argument("--json-dir", default=".")
+    parser.add_argument("--db", default="progress.db")
+    parser.add_argument("--overwrite", action="store_true", help="replace users that already exist in the database")
+    args = parser.parse_args()
+
+    target = SqliteProgressBackend(args.db)
+    started = datetime.now()
+    imported, errors = migrate(JsonProgressBackend(args.json_dir), target, skip_existing=not args.overwrite)
+    target.close()
+    for username, error in errors.items():
+        print(f"skipped {username}: {error}")
+    print(f"imported {len(imported)} users into {args.db} in {datetime.now() - started}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+from collections import OrderedDict
+
+DEFAULT_CAP = 500
+
+
+class ReviewRecord:
+    # One per question; prompt and answer are looked up from the lesson when displayed
+    __slots__ = ("lesson", "question_index", "attempts", "wrong_attempts", "last_answer", "is_correct")
+
+    def __init__(self, lesson, question_index):
+        self.lesson = lesson
+        self.question_index = question_index
+        self.attempts = 0
+        self.wrong_attempts = 0
+        self.last_answer = ""
+        self.is_correct = False
+
+
+class ReviewHistory:
+    # Attempts aggregated per (lesson, question index); the oldest questions are dropped beyond cap
+
+    def __init__(self, cap=DEFAULT_CAP):
+        self.cap = cap
+        self._records = OrderedDict()
+
+    def record(self, lesson, question_index, user_answer, is_correct):
+        key = (lesson, question_index)
+        record = self._records.get(key)
+        if record is None:
+            record = self._records[key] = ReviewRecord(lesson, question_index)
+            if len(self._records) > self.cap:
+                self._records.popitem(last=False)
+        record.attempts += 1
+        record.wrong_attempts += not is_correct
+        record.last_answer = user_answer
+        record.is_correct = is_correct
+        return record
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records.values())
+
+    def page_count(self, page_size):
+        return max(1, -(-len(self._records) // page_size))
+
+    def page(self, number, page_size):
+        # Records of the zero-based page number, without materializing the others
+        start = number * page_size
+        records = []
+        for offset, record in enumerate(self._records.values()):
+            if offset >= start + page_size:
+                break
+            if offset >= start:
+                records.append(record)
+        return start, records
+
+    def clear(self):
+        self._records.clear()
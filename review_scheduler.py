@@ -0,0 +1,101 @@
+import time
+from collections import namedtuple
+
+from sqlite_db import SqliteDatabase
+
+DAY = 24 * 60 * 60
+# A failed card comes back within the same practice session
+RELEARN_DELAY = 10 * 60
+MIN_EASE = 1.3
+# Longest gap between two reviews of a card
+MAX_INTERVAL = 365 * DAY
+DEFAULT_EASE = 2.5
+
+Card = namedtuple("Card", ["lesson", "question_index", "repetitions", "interval", "ease", "due", "lapses"])
+
+
+def quality_from_attempts(attempts):
+    # SM-2 grade (0-5) for a question that was eventually answered correctly after this many tries
+    return {1: 5, 2: 4, 3: 3}.get(attempts, 2)
+
+
+def sm2(repetitions, interval, ease, quality):
+    # Returns (repetitions, interval in seconds, ease) after a review of the given quality
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return 0, RELEARN_DELAY, ease
+    repetitions += 1
+    if repetitions == 1:
+        interval = DAY
+    elif repetitions == 2:
+        interval = 6 * DAY
+    else:
+        interval = min(MAX_INTERVAL, round(interval * ease))
+    return repetitions, float(interval), ease
+
+
+class ReviewScheduler(SqliteDatabase):
+    # One card per (user, lesson, question index) seen; due cards are read through an index on (username, due)
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS cards (
+            username TEXT NOT NULL,
+            lesson TEXT NOT NULL,
+            question_index INTEGER NOT NULL,
+            repetitions INTEGER NOT NULL,
+            interval REAL NOT NULL,
+            ease REAL NOT NULL,
+            due REAL NOT NULL,
+            lapses INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (username, lesson, question_index)
+        );
+        CREATE INDEX IF NOT EXISTS cards_due ON cards (username, due);
+    """
+
+    def __init__(self, path="reviews.db"):
+        super().__init__(path)
+
+    def card(self, username, lesson, question_index):
+        rows = self._query(
+            "SELECT lesson, question_index, repetitions, interval, ease, due, lapses FROM cards "
+            "WHERE username = ? AND lesson = ? AND question_index = ?",
+            (username, lesson, question_index),
+        )
+        return Card(*rows[0]) if rows else None
+
+    def review(self, username, lesson, question_index, quality, now=None):
+        # Schedules a card the first time its question is answered and reschedules it once it is due; answering
+        # it again before then, e.g. by replaying its lesson, leaves it alone instead of stretching its interval
+        now = time.time() if now is None else now
+        with self._transaction() as conn:
+            card = self.card(username, lesson, question_index)
+            if card is None:
+                card = Card(lesson, question_index, 0, 0, DEFAULT_EASE, now, 0)
+            elif card.due > now:
+                return card
+            repetitions, interval, ease = sm2(card.repetitions, card.interval, card.ease, quality)
+            lapses = card.lapses + (quality < 3)
+            conn.execute(
+                "INSERT OR REPLACE INTO cards "
+                "(username, lesson, question_index, repetitions, interval, ease, due, lapses) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (username, lesson, question_index, repetitions, interval, ease, now + interval, lapses),
+            )
+        return Card(lesson, question_index, repetitions, interval, ease, now + interval, lapses)
+
+    def due(self, username, limit=20, now=None):
+        # Walks the (username, due) index, so the cost is O(log n + limit) per call
+        now = time.time() if now is None else now
+        rows = self._query(
+            "SELECT lesson, question_index, repetitions, interval, ease, due, lapses FROM cards "
+            "WHERE username = ? AND due <= ? ORDER BY due LIMIT ?",
+            (username, now, limit),
+        )
+        return [Card(*row) for row in rows]
+
+    def due_count(self, username, now=None):
+        now = time.time() if now is None else now
+        return self._query("SELECT COUNT(*) FROM cards WHERE username = ? AND due <= ?", (username, now))[0][0]
+
+    def next_due(self, username):
+        return self._query("SELECT MIN(due) FROM cards WHERE username = ?", (username,))[0][0]
@@ -0,0 +1,237 @@
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+import metrics
+
+DEFAULT_LISTEN_TIMEOUT = 5
+DEFAULT_PHRASE_TIME_LIMIT = 15
+
+
+def speech_recognition():
+    # Imported on first use, most reruns never touch the microphone
+    import speech_recognition as sr
+    return sr
+
+
+class RecognitionError(Exception):
+    # Carries a message that can be shown to the learner as is
+    pass
+
+
+class RecognitionCancelled(RecognitionError):
+    def __init__(self):
+        super().__init__("Spracherkennung abgebrochen.")
+
+
+class SpeechBackend:
+    name = "base"
+
+    def recognize(self, cancelled):
+        # Returns the recognized text; cancelled is a threading.Event set when the caller gave up
+        raise NotImplementedError
+
+
+def run_recognition(capture, transcribe, cancelled):
+    # capture(sr, recognizer) -> audio, transcribe(sr, recognizer, audio) -> text
+    sr = speech_recognition()
+    recognizer = sr.Recognizer()
+    try:
+        audio = capture(sr, recognizer)
+        if cancelled.is_set():
+            raise RecognitionCancelled()
+        text = transcribe(sr, recognizer, audio)
+    except sr.WaitTimeoutError:
+        raise RecognitionError("Keine Sprache erkannt. Bitte versuchen Sie es nochmal.")
+    except sr.UnknownValueError:
+        raise RecognitionError("Entschuldigung, ich konnte das nicht verstehen.")
+    except sr.RequestError as e:
+        raise RecognitionError(f"Konnte keine Ergebnisse vom Spracherkennungsdienst abrufen; {e}")
+    if cancelled.is_set():
+        raise RecognitionCancelled()
+    return text
+
+
+class MicrophoneBackend(SpeechBackend):
+    def __init__(self, language="de-DE", listen_timeout=DEFAULT_LISTEN_TIMEOUT,
+                 phrase_time_limit=DEFAULT_PHRASE_TIME_LIMIT):
+        self.language = language
+        self.listen_timeout = listen_timeout
+        self.phrase_time_limit = phrase_time_limit
+
+    def capture(self, sr, recognizer):
+        with sr.Microphone() as source:
+            return recognizer.listen(source, timeout=self.listen_timeout, phrase_time_limit=self.phrase_time_limit)
+
+    def transcribe(self, sr, recognizer, audio):
+        raise NotImplementedError
+
+    def recognize(self, cancelled):
+        return run_recognition(self.capture, self.transcribe, cancelled)
+
+
+class GoogleBackend(MicrophoneBackend):
+    name = "google"
+
+    def transcribe(self, sr, recognizer, audio):
+        return recognizer.recognize_google(audio, language=self.language)
+
+
+class WhisperBackend(MicrophoneBackend):
+    # Runs a local Whisper model, no audio leaves the machine
+    name = "whisper"
+
+    def __init__(self, model="base", **kwargs):
+        super().__init__(**kwargs)
+        self.model = model
+
+    def transcribe(self, sr, recognizer, audio):
+        return recognizer.recognize_whisper(audio, model=self.model, language=self.language.split("-")[0])
+
+
+class FileBackend(SpeechBackend):
+    # Recognizes a recorded WAV/AIFF/FLAC file with another backend's transcription instead of the microphone
+    name = "file"
+
+    def __init__(self, path, transcriber=None):
+        self.path = path
+        self.transcriber = transcriber or GoogleBackend()
+
+    def recognize(self, cancelled):
+        return run_recognition(self.capture, self.transcriber.transcribe, cancelled)
+
+    def capture(self, sr, recognizer):
+        with sr.AudioFile(self.path) as source:
+            return recognizer.record(source)
+
+
+class FakeBackend(SpeechBackend):
+    # Returns scripted answers without audio hardware; an Exception instance in answers is raised instead
+    name = "fake"
+
+    def __init__(self, answers, delay=0.0):
+        self.answers = deque(answers)
+        self.delay = delay
+
+    def recognize(self, cancelled):
+        if cancelled.wait(self.delay):
+            raise RecognitionCancelled()
+        if not self.answers:
+            raise RecognitionError("Keine Sprache erkannt. Bitte versuchen Sie es nochmal.")
+        answer = self.answers.popleft()
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+
+class RecognitionJob:
+    def __init__(self, job_id, backend_name, future, cancelled, key=None):
+        self.id = job_id
+        self.backend_name = backend_name
+        # Whatever the caller needs to tell what the recording answers, e.g. the question it was started for
+        self.key = key
+        self._future = future
+        self._cancelled = cancelled
+
+    def done(self):
+        return self._future.done()
+
+    def wait(self, timeout):
+        # Returns True once the job has finished, waiting at most timeout seconds
+        try:
+            self._future.exception(timeout=timeout)
+        except FutureTimeoutError:
+            return False
+        except CancelledError:
+            pass
+        return True
+
+    def cancel(self):
+        self._cancelled.set()
+        self._future.cancel()
+
+    def result(self):
+        # Raises RecognitionError (or RecognitionCancelled) when no text was recognized
+        if self._cancelled.is_set():
+            raise RecognitionCancelled()
+        return self._future.result()
+
+
+class RecognitionPool:
+    # Runs recognitions off the script thread and keeps per-backend latency statistics
+
+    def __init__(self, workers=2, history=200):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="speech")
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._history = history
+        # backend name -> {"count", "errors", "total_seconds", "recent": deque of seconds}
+        self._latencies = {}
+
+    def submit(self, backend, key=None):
+        cancelled = threading.Event()
+        future = self._executor.submit(self._run, backend, cancelled)
+        return RecognitionJob(next(self._ids), backend.name, future, cancelled, key)
+
+    def _run(self, backend, cancelled):
+        started = time.perf_counter()
+        failed = False
+        try:
+            return backend.recognize(cancelled)
+        except RecognitionError:
+            failed = True
+            raise
+        except Exception as e:
+            failed = True
+            raise RecognitionError(f"Ein Fehler ist aufgetreten: {e}") from e
+        finally:
+            self._record(backend.name, time.perf_counter() - started, failed)
+
+    def _record(self, backend_name, seconds, failed):
+        if metrics.ENABLED:
+            metrics.REGISTRY.observe("voice_to_text", seconds)
+        with self._lock:
+            stats = self._latencies.get(backend_name)
+            if stats is None:
+                stats = self._latencies[backend_name] = {
+                    "count": 0, "errors": 0, "total_seconds": 0.0, "recent": deque(maxlen=self._history)
+                }
+            stats["count"] += 1
+            stats["errors"] += failed
+            stats["total_seconds"] += seconds
+            stats["recent"].append(seconds)
+
+    def latency_stats(self):
+        with self._lock:
+            report = {}
+            for backend_name, stats in self._latencies.items():
+                recent = sorted(stats["recent"])
+                report[backend_name] = {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "mean_seconds": stats["total_seconds"] / stats["count"],
+                    "p50_seconds": recent[len(recent) // 2],
+                    "p99_seconds": recent[min(len(recent) - 1, int(len(recent) * 0.99))],
+                }
+            return report
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def open_backend(kind="google", path=None, answers=(), **kwargs):
+    # kwargs go to the microphone backends; "file" transcribes the recording at path with Google, "fake" returns
+    # the given answers one per recognition
+    if kind == "google":
+        return GoogleBackend(**kwargs)
+    if kind == "whisper":
+        return WhisperBackend(**kwargs)
+    if kind == "file":
+        if not path:
+            raise ValueError("The file speech backend needs the path of a recording")
+        return FileBackend(path)
+    if kind == "fake":
+        return FakeBackend(answers)
+    raise ValueError(f"Unknown speech backend: {kind}")
@@ -0,0 +1,52 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class SqliteDatabase:
+    # Base of the SQLite stores: one connection shared by all threads behind a lock, in WAL mode and autocommit
+    # with explicit write transactions; subclasses define SCHEMA.
+    # Streamlit runs script runs and callbacks on short-lived threads, so a connection per thread would pile up
+
+    SCHEMA = ""
+
+    def __init__(self, path):
+        self.path = path
+        # Reentrant, so reads can be made inside a transaction
+        self._lock = threading.RLock()
+        self._conn = None
+        with self._lock:
+            self._connect().executescript(self.SCHEMA)
+
+    def _connect(self):
+        # Only called with the lock held
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+        return self._conn
+
+    def _query(self, sql, params=()):
+        # All rows of a read, fetched under the lock so no other thread's transaction runs in between
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    @contextmanager
+    def _transaction(self):
+        # Takes the write lock up front, so reads inside the transaction see what it will overwrite
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        # The next call opens the database again
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,117 @@
+from datetime import date
+
+import pytest
+
+from achievements import (
+    ANSWER_CORRECT, LESSON_COMPLETED, AchievementTracker, default_rules, parse_rules,
+)
+
+
+def rule(badge, counter, threshold, lesson=None):
+    item = {"badge": badge, "description": badge, "counter": counter, "threshold": threshold}
+    if lesson is not None:
+        item["lesson"] = lesson
+    return item
+
+
+def stats(score=0, streak=0, best_streak=0, lessons_completed=0):
+    return {"score": score, "streak": streak, "best_streak": best_streak, "lessons_completed": lessons_completed}
+
+
+def badges(rules):
+    return [rule.badge for rule in rules]
+
+
+@pytest.mark.parametrize("item, message", [
+    ({"badge": "X", "counter": "score", "threshold": 1}, "needs badge"),
+    (rule("X", "clicks", 1), "unknown counter"),
+    (rule("X", "score", 0), "positive integer"),
+    (rule("X", "score", 1.5), "positive integer"),
+    (rule("X", "lesson_completions", 1), "'lesson' is required"),
+    (rule("X", "score", 1, lesson="Greetings"), "'lesson' is required"),
+])
+def test_invalid_rules_are_rejected(item, message):
+    with pytest.raises(ValueError, match=message):
+        parse_rules([item])
+
+
+def test_duplicate_badges_are_rejected():
+    with pytest.raises(ValueError, match="duplicate badge"):
+        parse_rules([rule("X", "score", 1), rule("X", "streak", 2)])
+
+
+def test_shipped_rules_are_valid():
+    assert len(default_rules()) > 0
+
+
+def test_crossed_returns_the_rules_between_the_old_and_new_value():
+    rules = parse_rules([rule("10", "score", 10), rule("20", "score", 20), rule("30", "score", 30)])
+    assert badges(rules.crossed("score", None, 5, 25)) == ["10", "20"]
+    assert badges(rules.crossed("score", None, 10, 29)) == ["20"]
+    assert badges(rules.crossed("score", None, 30, 40)) == []
+
+
+def test_lesson_rules_match_their_lesson_or_any_lesson():
+    rules = parse_rules([
+        rule("Greetings done", "lesson_completions", 1, lesson="Greetings"),
+        rule("Any lesson twice", "lesson_completions", 2, lesson="*"),
+    ])
+    tracker = AchievementTracker(rules)
+    assert badges(tracker.record(LESSON_COMPLETED, "Numbers", stats(), set())) == []
+    assert badges(tracker.record(LESSON_COMPLETED, "Greetings", stats(), set())) == ["Greetings done"]
+    assert badges(tracker.record(LESSON_COMPLETED, "Numbers", stats(), set())) == ["Any lesson twice"]
+
+
+def test_a_rule_is_reported_once_and_not_when_already_unlocked():
+    tracker = AchievementTracker(parse_rules([rule("Three right", "correct_answers", 3)]))
+    results = [badges(tracker.record(ANSWER_CORRECT, "L", stats(), set())) for _ in range(4)]
+    assert results == [[], [], ["Three right"], []]
+    tracker = AchievementTracker(parse_rules([rule("Three right", "correct_answers", 3)]))
+    for _ in range(3):
+        assert tracker.record(ANSWER_CORRECT, "L", stats(), {"Three right"}) == []
+
+
+def test_session_counters_are_read_from_the_stats():
+    tracker = AchievementTracker(parse_rules([rule("Streak 3", "streak", 3), rule("100", "score", 100)]))
+    assert badges(tracker.record(ANSWER_CORRECT, "L", stats(score=50, streak=2), set())) == []
+    assert badges(tracker.record(ANSWER_CORRECT, "L", stats(score=110, streak=3), set())) == ["100", "Streak 3"]
+
+
+def test_a_counter_that_dropped_is_checked_from_zero_again():
+    tracker = AchievementTracker(parse_rules([rule("Streak 3", "streak", 3)]))
+    tracker.record(ANSWER_CORRECT, "L", stats(streak=2), set())
+    # The streak broke and was built up again; a badge lost meanwhile (not in unlocked) is awarded again
+    tracker.record(ANSWER_CORRECT, "L", stats(streak=1), set())
+    assert badges(tracker.record(ANSWER_CORRECT, "L", stats(streak=3), set())) == ["Streak 3"]
+
+
+def test_day_counters_start_over_on_a_new_day():
+    counters = {"correct_answers": 7, "day": {"date": "2020-01-01", "correct_answers": 9, "lessons_completed": 1}}
+    tracker = AchievementTracker(parse_rules([rule("Ten today", "day_correct_answers", 10)]), counters)
+    assert tracker.day == {"date": date.today().isoformat(), "correct_answers": 0, "lessons_completed": 0}
+    assert tracker.record(ANSWER_CORRECT, "L", stats(), set()) == []
+    assert tracker.to_dict()["correct_answers"] == 8
+
+
+def test_check_all_awards_rules_already_met_by_stored_counters():
+    rules = parse_rules([
+        rule("Five right", "correct_answers", 5),
+        rule("Greetings twice", "lesson_completions", 2, lesson="Greetings"),
+        rule("Best streak 10", "best_streak", 10),
+        rule("Twenty right", "correct_answers", 20),
+    ])
+    counters = {"correct_answers": 6, "lessons": {"Greetings": {"correct_answers": 6, "completions": 2}}}
+    tracker = AchievementTracker(rules, counters)
+    assert sorted(badges(tracker.check_all(stats(best_streak=10), {"Best streak 10"}))) == [
+        "Five right", "Greetings twice"]
+    # Already checked, so the next event does not report them again
+    assert tracker.record(ANSWER_CORRECT, "Greetings", stats(best_streak=10), set()) == []
+
+
+def test_counters_round_trip_through_to_dict():
+    tracker = AchievementTracker(parse_rules([]))
+    tracker.record(ANSWER_CORRECT, "Greetings", stats(), set())
+    tracker.record(LESSON_COMPLETED, "Greetings", stats(), set())
+    restored = AchievementTracker(parse_rules([]), tracker.to_dict())
+    assert restored.to_dict() == tracker.to_dict()
+    assert restored.lessons == {"Greetings": {"correct_answers": 1, "completions": 1}}
@@ -0,0 +1,116 @@
+import json
+import os
+
+import pytest
+
+import admin
+from progress_store import JsonProgressBackend, SqliteProgressBackend
+
+USERS = {
+    "anna": ({"score": 120, "lessons_completed": 2, "current_lesson": "Greetings",
+              "counters": {"lessons": {"Greetings": {"correct_answers": 3, "completions": 1}}}},
+             {"Punktesammler": "100 Punkte erreicht"}),
+    "ben": ({"score": 30, "current_lesson": "Numbers"}, {}),
+}
+
+
+def run(*argv):
+    # Exit status of the admin CLI
+    with pytest.raises(SystemExit) as exit_info:
+        admin.main(["--workers", "1", *argv])
+    return exit_info.value.code
+
+
+@pytest.fixture
+def source(tmp_path):
+    backend = JsonProgressBackend(str(tmp_path / "progress"))
+    os.makedirs(backend.directory)
+    for username, (progress, achievements) in USERS.items():
+        backend.save(username, progress=progress, achievements=achievements or None)
+    return backend
+
+
+def stored(backend):
+    return {username: (backend.load_progress(username), backend.load_achievements(username))
+            for username in backend.usernames()}
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_export_and_restore_into_an_empty_location(source, tmp_path, backend):
+    snapshot = str(tmp_path / "snapshot.jsonl.gz")
+    assert run("--location", source.directory, "export", snapshot) == 0
+    if backend == "json":
+        location = str(tmp_path / "new" / "progress")
+        target = JsonProgressBackend(location)
+    else:
+        location = str(tmp_path / "restored.db")
+        target = None
+    assert run("--backend", backend, "--location", location, "restore", snapshot) == 0
+    target = target or SqliteProgressBackend(location)
+    restored = stored(target)
+    assert sorted(restored) == sorted(USERS)
+    for username, (progress, achievements) in stored(source).items():
+        # The SQLite backend fills in the fields it has columns for
+        assert restored[username][0].items() >= progress.items()
+        assert restored[username][1] == achievements
+
+
+def test_restore_keeps_existing_users_unless_asked(source, tmp_path):
+    snapshot = str(tmp_path / "snapshot.jsonl.gz")
+    run("--location", source.directory, "export", snapshot)
+    source.save("anna", progress={"score": 999})
+    run("--location", source.directory, "restore", snapshot)
+    assert source.load_progress("anna") == {"score": 999}
+    run("--location", source.directory, "restore", "--overwrite", snapshot)
+    assert source.load_progress("anna")["score"] == 120
+
+
+def test_validate_quarantines_only_the_invalid_file(source, tmp_path):
+    with open(source.achievements_path("anna"), "w") as f:
+        f.write("{kaputt")
+    source.save("ben", progress={"score": -5})
+    assert run("--location", source.directory, "validate") == 1
+    quarantine = str(tmp_path / "quarantine")
+    assert run("--location", source.directory, "validate", "--quarantine", quarantine) == 0
+    assert sorted(name.split(".json")[0] for name in os.listdir(quarantine)) == ["anna_achievements", "ben_progress"]
+    assert source.load_progress("anna")["score"] == 120
+    assert run("--location", source.directory, "validate") == 0
+
+
+def test_remap_lessons_renames_current_lessons_counters_and_cards(source, tmp_path):
+    reviews = str(tmp_path / "reviews.db")
+    from review_scheduler import ReviewScheduler
+    scheduler = ReviewScheduler(reviews)
+    scheduler.review("anna", "Greetings", 0, 5, now=0)
+    scheduler.close()
+
+    arguments = ["--location", source.directory, "remap-lessons", "--rename", "Greetings=Begrüßung",
+                 "--reviews", reviews]
+    assert run(*arguments, "--dry-run") == 0
+    assert source.load_progress("anna")["current_lesson"] == "Greetings"
+    assert run(*arguments) == 0
+    progress = source.load_progress("anna")
+    assert progress["current_lesson"] == "Begrüßung"
+    assert progress["counters"]["lessons"] == {"Begrüßung": {"correct_answers": 3, "completions": 1}}
+    assert source.load_progress("ben")["current_lesson"] == "Numbers"
+    assert ReviewScheduler(reviews).card("anna", "Begrüßung", 0) is not None
+
+
+def test_remapping_two_lessons_onto_one_adds_their_counters():
+    progress = {"counters": {"lessons": {"A": {"completions": 1}, "B": {"completions": 2, "correct_answers": 4}}}}
+    remapped = admin.remap_progress(progress, {"A": "C", "B": "C"})
+    assert remapped["counters"]["lessons"] == {"C": {"completions": 3, "correct_answers": 4}}
+    assert admin.remap_progress({"current_lesson": "X"}, {"A": "C"}) is None
+
+
+def test_stats_summarizes_all_users(source, capsys):
+    assert run("--location", source.directory, "stats") == 0
+    report = json.loads(capsys.readouterr().out)
+    assert (report["users"], report["with_progress"], report["invalid"]) == (2, 2, 0)
+    assert report["score"]["sum"] == 150
+    assert report["badges"] == {"Punktesammler": 1}
+
+
+def test_commands_other_than_restore_need_an_existing_location(tmp_path):
+    with pytest.raises(SystemExit, match="does not exist"):
+        admin.main(["--location", str(tmp_path / "missing"), "stats"])
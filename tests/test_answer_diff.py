@@ -0,0 +1,135 @@
+import random
+
+from answer_diff import (
+    APPROX, DELETE, EQUAL, EXACT, INSERT, SUBSTITUTE, MatchOptions, align, colored_html, diff_answer,
+    edit_distance, first_mistake, is_correct, next_word, token_match,
+)
+
+LENIENT = MatchOptions(transliterate=True, max_typos=1)
+OP_COST = {EQUAL: 0, APPROX: 1, SUBSTITUTE: 2, INSERT: 2, DELETE: 2}
+
+
+def ops_of(ops):
+    return [op for op, _, _ in ops]
+
+
+def cost(ops):
+    return sum(OP_COST[op] for op, _, _ in ops)
+
+
+def full_alignment_cost(expected, actual, options=EXACT):
+    # Unbanded reference with the same costs as align
+    previous = [2 * j for j in range(len(actual) + 1)]
+    for i, token in enumerate(expected, 1):
+        current = [2 * i]
+        for j, other in enumerate(actual, 1):
+            match = token_match(token, other, options)
+            diagonal = previous[j - 1] + (0 if match == EQUAL else 1 if match == APPROX else 2)
+            current.append(min(diagonal, previous[j] + 2, current[j - 1] + 2))
+        previous = current
+    return previous[-1]
+
+
+def test_identical_answers_match_word_for_word():
+    ops = diff_answer("Wie geht es dir?", "Wie geht es dir?")
+    assert ops_of(ops) == [EQUAL] * 4
+    assert is_correct(ops)
+
+
+def test_case_and_punctuation_are_ignored():
+    assert is_correct(diff_answer("guten morgen", "Guten Morgen."))
+
+
+def test_an_extra_word_does_not_shift_the_rest_of_the_answer():
+    ops = diff_answer("ich bin sehr müde", "ich bin müde")
+    assert ops == [(EQUAL, "ich", "ich"), (EQUAL, "bin", "bin"), (INSERT, None, "sehr"), (EQUAL, "müde", "müde")]
+
+
+def test_a_missing_word_is_a_deletion():
+    ops = diff_answer("ich müde", "ich bin müde")
+    assert ops == [(EQUAL, "ich", "ich"), (DELETE, "bin", None), (EQUAL, "müde", "müde")]
+    assert next_word(ops) == "bin"
+    assert first_mistake(ops) == ("bin", "")
+
+
+def test_a_wrong_word_is_a_substitution():
+    ops = diff_answer("ich bin froh", "ich bin müde")
+    assert ops[-1] == (SUBSTITUTE, "müde", "froh")
+    assert first_mistake(ops) == ("müde", "froh")
+    assert not is_correct(ops)
+
+
+def test_wrong_words_are_substitutions_before_a_missing_word_at_equal_cost():
+    ops = diff_answer("du bist", "ich bin müde")
+    assert ops == [(SUBSTITUTE, "ich", "du"), (SUBSTITUTE, "bin", "bist"), (DELETE, "müde", None)]
+    assert first_mistake(ops) == ("ich", "du")
+    assert next_word(ops) == "ich"
+    ops = diff_answer("ich bi", "ich bin müde")
+    assert ops == [(EQUAL, "ich", "ich"), (SUBSTITUTE, "bin", "bi"), (DELETE, "müde", None)]
+    ops = diff_answer("a b c", "x")
+    assert ops == [(SUBSTITUTE, "x", "a"), (INSERT, None, "b"), (INSERT, None, "c")]
+
+
+def test_transliterated_umlauts_count_as_approximate_matches():
+    assert ops_of(diff_answer("tschuess", "tschüss", EXACT)) == [SUBSTITUTE]
+    ops = diff_answer("gruesse aus muenchen", "Grüße aus München", LENIENT)
+    assert ops_of(ops) == [APPROX, EQUAL, APPROX]
+    assert is_correct(ops)
+
+
+def test_typos_are_forgiven_only_in_long_words():
+    assert ops_of(diff_answer("Danek", "Danke", LENIENT)) == [SUBSTITUTE]  # a swap is two edits
+    assert ops_of(diff_answer("Dnke", "Danke", LENIENT)) == [APPROX]
+    assert ops_of(diff_answer("dr", "er", LENIENT)) == [SUBSTITUTE]
+
+
+def test_edit_distance_stops_once_over_the_limit():
+    assert edit_distance("kitten", "sitting", 5) == 3
+    assert edit_distance("kitten", "sitting", 1) == 2
+    assert edit_distance("a", "abcdef", 2) == 3
+
+
+def test_partial_answer_marks_only_inner_gaps():
+    ops = diff_answer("ich müde", "ich bin müde heute")
+    html = colored_html(ops)
+    assert html.count("…") == 1
+    assert "heute" not in html
+
+
+def test_alignment_reproduces_both_answers():
+    rng = random.Random(5)
+    words = ["der", "die", "das", "haus", "ist", "groß", "klein", "und", "alt"]
+    for _ in range(300):
+        expected = tuple(rng.choice(words) for _ in range(rng.randint(0, 12)))
+        actual = tuple(rng.choice(words) for _ in range(rng.randint(0, 12)))
+        ops = align(expected, actual)
+        assert tuple(e for op, e, _ in ops if op != INSERT) == expected
+        assert tuple(a for op, _, a in ops if op != DELETE) == actual
+
+
+def test_band_finds_the_optimal_alignment_for_near_misses():
+    rng = random.Random(8)
+    words = ["ich", "du", "er", "sie", "wir", "ihr", "gehen", "kommen", "heute", "morgen", "nach", "hause"]
+    for _ in range(300):
+        expected = [rng.choice(words) for _ in range(rng.randint(1, 30))]
+        actual = list(expected)
+        for _ in range(rng.randint(0, 3)):
+            edit = rng.choice(("insert", "delete", "substitute"))
+            position = rng.randint(0, len(actual))
+            if edit == "insert":
+                actual.insert(position, rng.choice(words))
+            elif actual and position < len(actual):
+                if edit == "delete":
+                    del actual[position]
+                else:
+                    actual[position] = rng.choice(words)
+        ops = align(tuple(expected), tuple(actual), LENIENT)
+        assert cost(ops) == full_alignment_cost(expected, actual, LENIENT)
+
+
+def test_long_unrelated_input_is_aligned_within_the_band():
+    expected = tuple("das ist ein kurzer satz".split())
+    actual = tuple(f"wort{k}" for k in range(500))
+    ops = align(expected, actual)
+    assert len([op for op in ops_of(ops) if op != INSERT]) == len(expected)
+    assert len(ops) == len(actual)
@@ -0,0 +1,121 @@
+import json
+import os
+
+import pytest
+
+import attempt_stats
+from attempt_log import CLOSED_SUFFIX, OPEN_SUFFIX, AttemptLog
+from attempt_stats import AttemptStats
+
+
+def event(lesson, question_index, correct, attempts=1, latency=1.0, expected=None, given=""):
+    return {"lesson": lesson, "question_index": question_index, "correct": correct, "attempts": attempts,
+            "latency": latency, "expected": expected, "given": given}
+
+
+def write_segment(directory, name, events, suffix=CLOSED_SUFFIX, partial=""):
+    path = os.path.join(directory, name + suffix)
+    with open(path, "a", encoding="utf-8") as f:
+        f.writelines(json.dumps(e) + "\n" for e in events)
+        f.write(partial)
+    return path
+
+
+@pytest.fixture
+def stats(tmp_path):
+    return AttemptStats(str(tmp_path / "attempt_stats.db"))
+
+
+def test_attempts_are_rolled_up_per_question(tmp_path, stats):
+    write_segment(str(tmp_path), "attempts-1", [
+        event("A", 0, False, latency=4.0, expected="bin", given="bist"),
+        event("A", 0, True, attempts=2, latency=2.0),
+        event("A", 0, True, latency=3.0),
+        event("A", 1, True, latency=1.0),
+        event("B", 0, False, expected="müde", given=""),
+    ])
+    assert stats.aggregate(str(tmp_path)) == 5
+    hardest = stats.hardest(min_attempts=1)
+    assert hardest[0] == ("B", 0, 1, 1.0, 0.0, 1.0)
+    assert hardest[1] == ("A", 0, 3, pytest.approx(1 / 3), 0.5, 3.0)
+    assert hardest[2] == ("A", 1, 1, 0.0, 1.0, 1.0)
+    assert stats.hardest(min_attempts=2) == [hardest[1]]
+    assert stats.common_mistakes("A", 0) == [("bin", "bist", 1)]
+    assert stats.lesson_difficulty() == [("B", 1, 1.0), ("A", 4, 0.25)]
+
+
+def test_mistakes_are_counted_and_ordered_by_frequency(tmp_path, stats):
+    write_segment(str(tmp_path), "attempts-1", [
+        event("A", 0, False, expected="bin", given="bist"),
+        event("A", 0, False, expected="ich", given="du"),
+        event("A", 0, False, expected="ich", given="du"),
+        # Wrong answers without a located mistake only count as wrong
+        event("A", 0, False),
+    ])
+    stats.aggregate(str(tmp_path))
+    assert stats.common_mistakes("A", 0) == [("ich", "du", 2), ("bin", "bist", 1)]
+    assert stats.common_mistakes("A", 0, limit=1) == [("ich", "du", 2)]
+
+
+def test_each_event_is_counted_once_across_runs(tmp_path, stats):
+    directory = str(tmp_path)
+    write_segment(directory, "attempts-1", [event("A", 0, True)], suffix=OPEN_SUFFIX)
+    assert stats.aggregate(directory) == 1
+    assert stats.aggregate(directory) == 0
+    # More events and a line still being written; the rename on rotation keeps the offset
+    write_segment(directory, "attempts-1", [event("A", 0, False)], suffix=OPEN_SUFFIX, partial='{"lesson": "A", ')
+    assert stats.aggregate(directory) == 1
+    os.rename(os.path.join(directory, "attempts-1" + OPEN_SUFFIX), os.path.join(directory, "attempts-1" + CLOSED_SUFFIX))
+    with open(os.path.join(directory, "attempts-1" + CLOSED_SUFFIX), "a", encoding="utf-8") as f:
+        f.write('"question_index": 0, "correct": true, "attempts": 1, "latency": 1.0}\n')
+    assert stats.aggregate(directory) == 1
+    assert stats.hardest(min_attempts=1) == [("A", 0, 3, pytest.approx(1 / 3), 1.0, 1.0)]
+
+
+def test_a_new_database_reads_each_segment_once(tmp_path):
+    directory = str(tmp_path / "logs")
+    os.makedirs(directory)
+    write_segment(directory, "attempts-1", [event("A", 0, True)] * 3)
+    stats = AttemptStats(str(tmp_path / "stats.db"))
+    stats.aggregate(directory)
+    stats.close()
+    assert AttemptStats(str(tmp_path / "stats.db")).aggregate(directory) == 0
+
+
+def test_malformed_lines_and_other_files_are_skipped(tmp_path, stats):
+    directory = str(tmp_path)
+    path = write_segment(directory, "attempts-1", [event("A", 0, True)])
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("not json\n[1, 2]\n" + json.dumps({"lesson": "A"}) + "\n")
+    with open(os.path.join(directory, "notes.txt"), "w") as f:
+        f.write(json.dumps(event("A", 0, False)) + "\n")
+    assert stats.aggregate(directory) == 1
+    assert stats.hardest(min_attempts=1) == [("A", 0, 1, 0.0, 1.0, 1.0)]
+
+
+def test_prune_deletes_only_closed_fully_read_segments(tmp_path, stats):
+    directory = str(tmp_path)
+    closed = write_segment(directory, "attempts-1", [event("A", 0, True)])
+    still_open = write_segment(directory, "attempts-2", [event("A", 0, True)], suffix=OPEN_SUFFIX)
+    unfinished = write_segment(directory, "attempts-3", [event("A", 0, True)], partial="{")
+    assert stats.aggregate(directory, prune=True) == 3
+    assert not os.path.exists(closed)
+    assert os.path.exists(still_open) and os.path.exists(unfinished)
+
+
+def test_large_segments_are_committed_in_batches(tmp_path, stats, monkeypatch):
+    monkeypatch.setattr(attempt_stats, "BATCH_EVENTS", 2)
+    write_segment(str(tmp_path), "attempts-1", [event("A", i % 2, i % 3 != 0) for i in range(7)])
+    assert stats.aggregate(str(tmp_path)) == 7
+    assert sum(row[2] for row in stats.hardest(min_attempts=1)) == 7
+
+
+def test_events_recorded_by_the_attempt_log_are_aggregated(tmp_path, stats):
+    directory = str(tmp_path / "logs")
+    log = AttemptLog(directory, segment_bytes=200, flush_interval=60)
+    for i in range(10):
+        log.record(event("A", i % 2, i % 2 == 0, expected=None if i % 2 == 0 else "Hund", given="Katze"))
+    log.close()
+    assert stats.aggregate(directory) == 10
+    assert stats.lesson_difficulty() == [("A", 10, 0.5)]
+    assert stats.common_mistakes("A", 1) == [("Hund", "Katze", 5)]
@@ -0,0 +1,128 @@
+import os
+import threading
+
+import pytest
+
+from audio_cache import AudioCache, audio_key, lesson_answers, load_lesson_store
+from custom_lesson_store import CustomLessonStore
+
+
+class FakeSynthesizer:
+    # Stands in for gTTS: returns size bytes derived from the text and counts the calls
+    def __init__(self, size=10):
+        self.size = size
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, text, lang, slow):
+        with self.lock:
+            self.calls.append((text, lang, slow))
+        return (text.encode("utf-8") * self.size)[:self.size].ljust(self.size, b".")
+
+
+def test_audio_key_depends_on_text_language_and_speed():
+    assert audio_key("Hallo") == audio_key("Hallo", "de", False)
+    assert len({audio_key("Hallo"), audio_key("Hallo", "en"), audio_key("Hallo", slow=True), audio_key("Hallo!")}) == 4
+
+
+def test_second_get_is_served_from_the_cache(tmp_path):
+    synthesize = FakeSynthesizer()
+    cache = AudioCache(str(tmp_path), synthesize=synthesize)
+    first = cache.get("Guten Morgen")
+    assert cache.get("Guten Morgen") == first
+    assert synthesize.calls == [("Guten Morgen", "de", False)]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_clips_survive_a_restart(tmp_path):
+    AudioCache(str(tmp_path), synthesize=FakeSynthesizer()).get("Danke")
+    synthesize = FakeSynthesizer()
+    cache = AudioCache(str(tmp_path), synthesize=synthesize)
+    assert cache.contains("Danke")
+    cache.get("Danke")
+    assert synthesize.calls == []
+
+
+def test_least_recently_used_clip_is_evicted(tmp_path):
+    cache = AudioCache(str(tmp_path), max_bytes=25, synthesize=FakeSynthesizer(size=10))
+    cache.get("eins")
+    cache.get("zwei")
+    cache.get("eins")
+    cache.get("drei")
+    assert cache.contains("eins") and cache.contains("drei")
+    assert not cache.contains("zwei")
+    assert not os.path.exists(os.path.join(str(tmp_path), f"{audio_key('zwei')}.mp3"))
+    assert cache.stats()["bytes"] == 20
+
+
+def test_concurrent_requests_synthesize_once(tmp_path):
+    release = threading.Event()
+    synthesize = FakeSynthesizer()
+
+    def slow_synthesize(text, lang, slow):
+        release.wait(5)
+        return synthesize(text, lang, slow)
+
+    cache = AudioCache(str(tmp_path), synthesize=slow_synthesize)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("Bitte"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(synthesize.calls) == 1
+    assert len(set(results)) == 1 and len(results) == 8
+
+
+def test_failed_synthesis_is_retried_on_the_next_get(tmp_path):
+    synthesize = FakeSynthesizer()
+    failures = [RuntimeError("offline")]
+
+    def flaky_synthesize(text, lang, slow):
+        if failures:
+            raise failures.pop()
+        return synthesize(text, lang, slow)
+
+    cache = AudioCache(str(tmp_path), synthesize=flaky_synthesize)
+    with pytest.raises(RuntimeError):
+        cache.get("Tschüss")
+    assert not cache.contains("Tschüss")
+    assert cache.get("Tschüss") == synthesize("Tschüss", "de", False)
+
+
+def test_clip_removed_from_disk_is_synthesized_again(tmp_path):
+    synthesize = FakeSynthesizer()
+    cache = AudioCache(str(tmp_path), synthesize=synthesize)
+    cache.get("Ja")
+    os.remove(os.path.join(str(tmp_path), f"{audio_key('Ja')}.mp3"))
+    assert cache.get("Ja") == synthesize("Ja", "de", False)
+    assert len(synthesize.calls) == 3
+    assert cache.stats()["entries"] == 1
+
+
+def test_prewarm_synthesizes_each_missing_text_once_and_reports_failures(tmp_path):
+    synthesize = FakeSynthesizer()
+
+    def failing_synthesize(text, lang, slow):
+        if text == "kaputt":
+            raise RuntimeError("quota")
+        return synthesize(text, lang, slow)
+
+    cache = AudioCache(str(tmp_path), synthesize=failing_synthesize)
+    cache.get("schon da")
+    synthesized, failures = cache.prewarm(["neu", "neu", "", "schon da", "kaputt"], workers=2)
+    assert synthesized == 1
+    assert list(failures) == ["kaputt"]
+    assert sorted(text for text, _, _ in synthesize.calls) == ["neu", "schon da"]
+
+
+def test_lessons_created_in_the_app_are_prewarmed(tmp_path):
+    path = str(tmp_path / "custom_lessons.db")
+    store = CustomLessonStore(path)
+    store.save("anna", "Farben", {"questions": [{"prompt": "red", "answer": "rot"}, {"prompt": "blue", "answer": "blau"}]})
+    store.save("ben", "Tiere", {"questions": [{"prompt": "dog", "answer": "Hund"}]}, shared=True)
+    store.close()
+    assert sorted(lesson_answers(load_lesson_store(path))) == ["Hund", "blau", "rot"]
+    assert load_lesson_store(str(tmp_path / "missing.db")) == {}
+    assert not os.path.exists(tmp_path / "missing.db")
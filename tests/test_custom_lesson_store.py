@@ -0,0 +1,123 @@
+import pytest
+
+from custom_lesson_store import CustomLessonStore, UserLessonLibrary, lesson_body
+
+COLORS = {"questions": [{"prompt": "red", "answer": "rot"}, {"prompt": "blue", "answer": "blau"}]}
+ANIMALS = {"questions": [{"prompt": "dog", "answer": "Hund"}]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CustomLessonStore(str(tmp_path / "custom_lessons.db"))
+
+
+def test_a_saved_lesson_reads_back_equal(store):
+    digest = store.save("anna", "Farben", dict(COLORS, title="Die Farben"))
+    lesson = store.body(digest)
+    assert [dict(question) for question in lesson["questions"]] == COLORS["questions"]
+    assert lesson["title"] == "Die Farben"
+    with pytest.raises(TypeError):
+        lesson["questions"][0]["answer"] = "grün"
+
+
+def test_lessons_survive_reopening_the_database(tmp_path):
+    path = str(tmp_path / "custom_lessons.db")
+    store = CustomLessonStore(path)
+    digest = store.save("anna", "Farben", COLORS)
+    store.close()
+    reopened = CustomLessonStore(path)
+    assert reopened.index("anna") == [("Farben", "anna", digest, False)]
+    assert reopened.body(digest)["questions"][1]["answer"] == "blau"
+
+
+def test_the_body_only_depends_on_the_stored_fields():
+    extra = {"questions": [dict(question, hint="?") for question in COLORS["questions"]], "author": "anna"}
+    assert lesson_body(extra) == lesson_body(COLORS)
+    assert lesson_body(dict(COLORS, title="Farben")) != lesson_body(COLORS)
+
+
+def test_equal_lessons_are_stored_once(store):
+    first = store.save("anna", "Farben", COLORS)
+    assert store.save("ben", "Colors", {"questions": [dict(question) for question in COLORS["questions"]]}) == first
+    assert store.save("anna", "Farben kopie", COLORS) == first
+    assert store.digests() == [first]
+    assert store.save("anna", "Tiere", ANIMALS) != first
+    assert len(store.digests()) == 2
+
+
+def test_a_body_is_deleted_with_its_last_reference(store):
+    digest = store.save("anna", "Farben", COLORS)
+    store.save("ben", "Colors", COLORS)
+    store.delete("anna", "Farben")
+    assert store.digests() == [digest]
+    store.delete("ben", "Colors")
+    assert store.digests() == []
+    with pytest.raises(KeyError):
+        store.body("0" * 64)
+
+
+def test_overwriting_a_lesson_drops_its_old_body(store):
+    old = store.save("anna", "Farben", COLORS)
+    new = store.save("anna", "Farben", ANIMALS)
+    assert store.digests() == [new]
+    assert old != new
+    assert store.index("anna") == [("Farben", "anna", new, False)]
+
+
+def test_users_see_their_own_lessons_then_shared_ones(store):
+    store.save("anna", "Farben", COLORS)
+    store.save("ben", "Tiere", ANIMALS, shared=True)
+    store.save("ben", "Geheim", COLORS)
+    assert [entry[0] for entry in store.index("anna")] == ["Farben", "Tiere (von ben)"]
+    assert [entry[0] for entry in store.index("ben")] == ["Geheim", "Tiere"]
+    assert [entry[0] for entry in store.index("carl")] == ["Tiere (von ben)"]
+
+
+def test_saving_keeps_the_sharing_setting_unless_one_is_given(store):
+    store.save("ben", "Tiere", ANIMALS, shared=True)
+    store.save("ben", "Tiere", COLORS)
+    assert store.index("ben")[0][3] is True
+    store.set_shared("ben", "Tiere", False)
+    assert store.index("carl") == []
+    store.save("ben", "Tiere", COLORS, shared=True)
+    assert store.index("carl")[0][3] is True
+
+
+def test_every_write_bumps_the_version(store):
+    versions = [store.version]
+    store.save("anna", "Farben", COLORS)
+    versions.append(store.version)
+    store.set_shared("anna", "Farben", True)
+    versions.append(store.version)
+    store.delete("anna", "Farben")
+    versions.append(store.version)
+    assert versions == sorted(set(versions))
+
+
+def test_bodies_are_cached_up_to_the_cache_size(store, monkeypatch):
+    monkeypatch.setattr("custom_lesson_store.BODY_CACHE_SIZE", 2)
+    digests = [store.save("anna", f"L{i}", {"questions": [{"prompt": str(i), "answer": str(i)}]}) for i in range(3)]
+    first = store.body(digests[0])
+    assert store.body(digests[0]) is first
+    store.body(digests[1])
+    store.body(digests[2])
+    assert store.body(digests[0]) is not first
+    assert store.body(digests[0]) == first
+
+
+def test_the_library_is_a_users_view_of_the_store(store):
+    anna = UserLessonLibrary(store, "anna")
+    ben = UserLessonLibrary(store, "ben")
+    anna.save("Farben", COLORS)
+    ben.save("Tiere", ANIMALS, shared=True)
+    assert list(anna) == ["Farben", "Tiere (von ben)"]
+    assert anna.is_own("Farben") and not anna.is_own("Tiere (von ben)")
+    assert anna.is_shared("Tiere (von ben)")
+    assert anna["Tiere (von ben)"]["questions"][0]["answer"] == "Hund"
+    assert anna.digest("Farben") == store.index("anna")[0][2]
+    assert anna.export() == {"Farben": COLORS}
+
+    ben.set_shared("Tiere", False)
+    assert "Tiere (von ben)" not in anna
+    anna.delete("Farben")
+    assert len(anna) == 0
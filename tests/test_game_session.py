@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from achievements import parse_rules
+from game_session import POINTS_PER_ANSWER, GameSession
+from progress_store import JsonProgressBackend
+
+LESSONS = {
+    "Greetings": {"questions": [{"prompt": "Hello", "answer": "Hallo"}, {"prompt": "Thanks", "answer": "Danke"}]},
+}
+RULES = parse_rules([
+    {"badge": "Anfänger", "description": "Erste Lektion abgeschlossen", "counter": "lessons_completed", "threshold": 1},
+    {"badge": "Punktesammler", "description": "10 Punkte erreicht", "counter": "score", "threshold": 10},
+])
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return JsonProgressBackend(str(tmp_path))
+
+
+def session(backend, rules=RULES):
+    return GameSession("anna", backend, LESSONS, achievement_rules=rules)
+
+
+def write(path, content):
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_a_new_user_starts_from_scratch(backend):
+    game = session(backend)
+    assert game.load() is False
+    assert game.unreadable == {}
+    game.select_lesson("Greetings")
+    assert game.submit("hallo")
+    assert game.advance() == ["Punktesammler"]
+    assert backend.load_progress("anna")["score"] == POINTS_PER_ANSWER
+    assert backend.load_achievements("anna") == {"Punktesammler": "10 Punkte erreicht"}
+
+
+def test_progress_is_kept_when_the_achievements_are_corrupt(backend):
+    progress = {"score": 990, "lessons_completed": 7, "current_lesson": "Greetings", "question_index": 0}
+    write(backend.progress_path("anna"), json.dumps(progress))
+    write(backend.achievements_path("anna"), "{kaputt")
+    game = session(backend)
+    assert game.load() is True
+    assert list(game.unreadable) == ["achievements"]
+    assert (game.score, game.lessons_completed) == (990, 7)
+    game.submit("Hallo")
+    game.advance()
+    assert backend.load_progress("anna")["lessons_completed"] == 7
+    with open(backend.achievements_path("anna")) as f:
+        assert f.read() == "{kaputt"
+
+
+def test_achievements_are_kept_when_the_progress_is_corrupt(backend):
+    write(backend.progress_path("anna"), "{kaputt")
+    write(backend.achievements_path("anna"), json.dumps({"Anfänger": "Erste Lektion abgeschlossen"}))
+    game = session(backend)
+    assert game.load() is False
+    assert list(game.unreadable) == ["progress"]
+    assert game.achievements == {"Anfänger": "Erste Lektion abgeschlossen"}
+    game.select_lesson("Greetings")
+    game.submit("Hallo")
+    assert game.advance() == ["Punktesammler"]
+    game.reset("Greetings")
+    with open(backend.progress_path("anna")) as f:
+        assert f.read() == "{kaputt"
+    assert list(backend.load_achievements("anna")) == ["Anfänger", "Punktesammler"]
+
+
+def test_submit_without_a_current_question_is_not_an_answer(backend):
+    game = session(backend)
+    game.load()
+    game.select_lesson("Greetings")
+    game.question_index = len(LESSONS["Greetings"]["questions"])
+    assert game.submit("Hallo") is False
+    assert game.attempts == 0
+
+
+def test_an_empty_rule_set_awards_nothing(backend):
+    game = session(backend, parse_rules([]))
+    game.load()
+    game.select_lesson("Greetings")
+    game.submit("Hallo")
+    assert game.advance() == []
+    assert len(game.achievement_rules) == 0
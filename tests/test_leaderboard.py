@@ -0,0 +1,92 @@
+import random
+
+from leaderboard import Leaderboard, RankIndex, metric_values
+from progress_store import ProgressBackend
+
+
+def expected_top(values, k):
+    return sorted(values.items(), key=lambda item: (-item[1], item[0]))[:k]
+
+
+def test_top_orders_by_value_then_username():
+    index = RankIndex()
+    index.load({"carla": 30, "anna": 50, "ben": 30, "dora": 10})
+    assert index.top(3) == [("anna", 50), ("ben", 30), ("carla", 30)]
+    assert len(index) == 4
+
+
+def test_equal_values_share_a_rank():
+    index = RankIndex()
+    index.load({"anna": 50, "ben": 30, "carla": 30, "dora": 10})
+    assert [index.rank(name) for name in ("anna", "ben", "carla", "dora")] == [(1, 50), (2, 30), (2, 30), (4, 10)]
+    assert index.rank("nobody") is None
+
+
+def test_update_moves_a_user_and_remove_drops_them():
+    index = RankIndex()
+    index.load({"anna": 50, "ben": 30})
+    index.update("ben", 70)
+    index.update("carla", 40)
+    assert index.top(5) == [("ben", 70), ("anna", 50), ("carla", 40)]
+    index.remove("anna")
+    index.remove("nobody")
+    assert index.top(5) == [("ben", 70), ("carla", 40)]
+    assert index.rank("carla") == (2, 40)
+    assert index.value("anna") is None
+
+
+def test_random_updates_match_a_full_sort():
+    rng = random.Random(17)
+    index = RankIndex()
+    values = {}
+    for _ in range(2000):
+        username = f"user{rng.randint(0, 60)}"
+        if rng.random() < 0.1:
+            index.remove(username)
+            values.pop(username, None)
+        else:
+            values[username] = rng.randint(0, 20)
+            index.update(username, values[username])
+        assert index.top(10) == expected_top(values, 10)
+    for username, value in values.items():
+        assert index.rank(username) == (1 + sum(other > value for other in values.values()), value)
+
+
+def test_metric_values_fall_back_to_the_current_streak():
+    assert metric_values({"score": 40, "streak": 6, "lessons_completed": 2}) == {
+        "score": 40, "best_streak": 6, "lessons_completed": 2
+    }
+    assert metric_values({"streak": 1, "best_streak": 9})["best_streak"] == 9
+    assert metric_values({}) == {"score": 0, "best_streak": 0, "lessons_completed": 0}
+
+
+class ListBackend(ProgressBackend):
+    def __init__(self, progress, during_iteration=None):
+        self.progress = progress
+        self.during_iteration = during_iteration
+
+    def iter_progress(self):
+        for number, item in enumerate(self.progress.items()):
+            if number == 1 and self.during_iteration:
+                self.during_iteration()
+            yield item
+
+
+def test_rebuild_ranks_stored_progress_and_commits_update_it():
+    leaderboard = Leaderboard()
+    backend = ListBackend({"anna": {"score": 50, "lessons_completed": 3}, "ben": {"score": 80, "streak": 4}})
+    assert leaderboard.rebuild(backend) == 2
+    assert leaderboard.top("score") == [("ben", 80), ("anna", 50)]
+    assert leaderboard.rank("lessons_completed", "anna") == (1, 3)
+    leaderboard.on_commit("anna", {"score": 90}, None)
+    leaderboard.on_commit("ben", None, {"Streber": "5er Serie erreicht"})
+    assert leaderboard.top("score", 1) == [("anna", 90)]
+
+
+def test_rebuild_keeps_updates_committed_while_it_was_reading():
+    leaderboard = Leaderboard()
+    stale = {"anna": {"score": 10}, "ben": {"score": 20}}
+    backend = ListBackend(stale, during_iteration=lambda: leaderboard.update("anna", {"score": 100}))
+    leaderboard.rebuild(backend)
+    assert leaderboard.rank("score", "anna") == (1, 100)
+    assert leaderboard.rank("score", "ben") == (2, 20)
@@ -0,0 +1,110 @@
+import io
+import json
+
+import pytest
+
+import lesson_import
+from lesson_import import UploadError, _JsonStream, import_lessons, iter_json_records
+
+
+@pytest.fixture(params=[1, 3, 7, 64 * 1024])
+def chunk_size(request, monkeypatch):
+    # Tiny chunks put every token of the documents below across a chunk boundary somewhere
+    monkeypatch.setattr(lesson_import, "CHUNK_SIZE", request.param)
+    return request.param
+
+
+def records(document):
+    return list(iter_json_records(io.StringIO(document)))
+
+
+def upload(content, file_name="upload.json", existing=None, **limits):
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    return import_lessons(io.BytesIO(data), file_name, existing, **limits)
+
+
+NESTED = {
+    "Begrüßung": {"title": "Hallo", "questions": [
+        {"prompt": "Hello", "answer": "Hallo"}, {"prompt": "Good \"morning\"", "answer": "Guten Morgen"}
+    ]},
+    "Zahlen": [{"prompt": "one", "answer": "eins", "extra": [1, 2.5e3, None, True]}],
+}
+
+
+def test_nested_lessons_are_read_record_by_record(chunk_size):
+    assert records(json.dumps(NESTED, ensure_ascii=False, indent=1)) == [
+        ("Begrüßung", {"prompt": "Hello", "answer": "Hallo"}),
+        ("Begrüßung", {"prompt": "Good \"morning\"", "answer": "Guten Morgen"}),
+        ("Zahlen", {"prompt": "one", "answer": "eins", "extra": [1, 2.5e3, None, True]}),
+    ]
+
+
+def test_flat_record_lists_are_read(chunk_size):
+    document = json.dumps([{"lesson": "A", "prompt": "p", "answer": "a"}, 12345678, "text", []])
+    assert records(document) == [(None, {"lesson": "A", "prompt": "p", "answer": "a"}), (None, 12345678),
+                                 (None, "text"), (None, [])]
+
+
+def test_numbers_and_literals_are_not_cut_at_chunk_boundaries(chunk_size):
+    reader = _JsonStream(io.StringIO("[123456789, -0.125e-2, false, null]"))
+    reader.expect("[")
+    assert [reader.value() for _ in reader.items("]")] == [123456789, -0.125e-2, False, None]
+
+
+@pytest.mark.parametrize("document", ["[{\"prompt\": \"p\"", "{\"A\": [1, 2", "[1] [2]", "[1,, 2]", "", "\"x\""])
+def test_malformed_documents_raise_upload_errors(document, chunk_size):
+    with pytest.raises(UploadError):
+        records(document)
+
+
+def test_oversized_records_are_rejected(monkeypatch):
+    monkeypatch.setattr(lesson_import, "CHUNK_SIZE", 16)
+    monkeypatch.setattr(lesson_import, "MAX_RECORD_CHARS", 100)
+    with pytest.raises(UploadError):
+        records(json.dumps([{"prompt": "x" * 500, "answer": "y"}]))
+
+
+def test_import_skips_invalid_and_duplicate_questions():
+    existing = {"Alt": {"questions": [{"prompt": "Hello", "answer": "Hallo"}]}}
+    report = upload(json.dumps([
+        {"lesson": "Neu", "prompt": "hello.", "answer": "HALLO"},
+        {"lesson": "Neu", "prompt": "Thanks", "answer": "Danke"},
+        {"lesson": "Neu", "prompt": "Thanks", "answer": "Danke"},
+        {"lesson": "Neu", "prompt": "", "answer": "leer"},
+        "kein Objekt",
+        {"prompt": "Bye", "answer": "Tschüss"},
+    ]), "meine_lektion.json", existing)
+    assert report.fatal is None
+    assert report.lessons == {
+        "Neu": {"questions": [{"prompt": "Thanks", "answer": "Danke"}]},
+        "meine_lektion": {"questions": [{"prompt": "Bye", "answer": "Tschüss"}]},
+    }
+    assert (report.imported, report.duplicates, report.error_count, report.lesson_count) == (2, 2, 2, 2)
+    assert [number for number, _ in report.errors] == [4, 5]
+
+
+def test_delimited_and_json_lines_uploads():
+    csv_report = upload("﻿Prompt,Answer,Lesson\nYes,Ja,Basics\nNo,Nein,\n", "words.csv")
+    assert csv_report.lessons == {"Basics": {"questions": [{"prompt": "Yes", "answer": "Ja"}]},
+                                  "words": {"questions": [{"prompt": "No", "answer": "Nein"}]}}
+    tsv_report = upload("prompt\tanswer\nCat\tKatze\n", "tiere.tsv")
+    assert tsv_report.lessons == {"tiere": {"questions": [{"prompt": "Cat", "answer": "Katze"}]}}
+    jsonl_report = upload('{"prompt": "Dog", "answer": "Hund"}\n{broken\n\n', "tiere.jsonl")
+    assert (jsonl_report.imported, jsonl_report.error_count) == (1, 1)
+    assert upload("question,solution\na,b\n", "x.csv").fatal
+
+
+def test_limits_end_the_import():
+    questions = [{"prompt": f"p{k}", "answer": f"a{k}"} for k in range(10)]
+    truncated = upload(json.dumps({"L": questions}), max_questions=4)
+    assert truncated.imported == 4 and truncated.truncated and truncated.fatal is None
+    too_big = upload(json.dumps({"L": questions}), max_bytes=100)
+    assert too_big.fatal and "MB" in too_big.fatal
+    assert upload(b"[\xff\xfe]").fatal == "Die Datei ist nicht UTF-8-kodiert."
+
+
+def test_only_the_first_errors_are_kept(monkeypatch):
+    monkeypatch.setattr(lesson_import, "MAX_REPORTED_ERRORS", 3)
+    report = upload(json.dumps([{"prompt": ""}] * 10))
+    assert report.error_count == 10
+    assert len(report.errors) == 3
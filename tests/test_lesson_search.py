@@ -0,0 +1,118 @@
+import json
+
+from custom_lesson_store import CustomLessonStore
+from lesson_catalog import LessonCatalog
+from lesson_search import LessonIndex, LibraryIndexer, parse_query
+
+GREETINGS = {"questions": [
+    {"prompt": "Good morning", "answer": "Guten Morgen"},
+    {"prompt": "Good evening", "answer": "Guten Abend"},
+    {"prompt": "Thank you very much", "answer": "Vielen Dank"},
+]}
+FOOD = {"questions": [
+    {"prompt": "The bread is good", "answer": "Das Brot ist gut"},
+    {"prompt": "Good appetite", "answer": "Guten Appetit"},
+]}
+
+
+def make_index():
+    index = LessonIndex()
+    index.add_lesson("greetings", GREETINGS)
+    index.add_lesson("food", FOOD)
+    return index
+
+
+def test_parse_query_reads_words_prefixes_and_phrases():
+    assert parse_query('guten "vielen dank" mor*') == [
+        ("word", ["guten"]), ("phrase", ["vielen", "dank"]), ("prefix", ["mor"])]
+    # While typing, the last word is a prefix until a space ends it
+    assert parse_query("Mor") == [("prefix", ["mor"])]
+    assert parse_query("Mor ") == [("word", ["mor"])]
+
+
+def test_words_match_prompts_and_answers_in_lesson_order():
+    index = make_index()
+    assert index.search("guten", prefix_last=False) == [("greetings", 0), ("greetings", 1), ("food", 1)]
+    assert index.search("good", prefix_last=False) == [("greetings", 0), ("greetings", 1), ("food", 0), ("food", 1)]
+    assert index.search("guten abend", prefix_last=False) == [("greetings", 1)]
+    assert index.search("tschüss", prefix_last=False) == []
+
+
+def test_prefix_queries_match_every_word_starting_with_the_prefix():
+    index = make_index()
+    assert index.search("a*") == [("greetings", 1), ("food", 1)]
+    assert index.search("gut") == [("greetings", 0), ("greetings", 1), ("food", 0), ("food", 1)]
+    assert index.search("gut", prefix_last=False) == [("food", 0)]
+
+
+def test_phrases_match_adjacent_words_within_one_field():
+    index = make_index()
+    assert index.search('"vielen dank"') == [("greetings", 2)]
+    assert index.search('"dank vielen"') == []
+    # The end of a prompt and the start of its answer are not adjacent
+    assert index.search('"morning guten"') == []
+    assert index.search('"brot ist gut"') == [("food", 0)]
+
+
+def test_search_is_restricted_to_the_given_keys_and_limited():
+    index = make_index()
+    assert index.search("guten", {"food"}, prefix_last=False) == [("food", 1)]
+    assert index.search("good", limit=2, prefix_last=False) == [("greetings", 0), ("greetings", 1)]
+
+
+def test_removing_a_lesson_drops_its_postings_and_vocabulary():
+    index = make_index()
+    index.remove_lesson("food")
+    assert "food" not in index
+    assert index.search("brot", prefix_last=False) == []
+    assert index.search("appetit") == []
+    assert dict(index.vocabulary())["guten"] == 2
+    assert "brot" not in dict(index.vocabulary())
+
+
+def test_vocabulary_counts_only_public_lessons():
+    index = make_index()
+    index.add_lesson("private", {"questions": [{"prompt": "Good", "answer": "Guten Tag"}]}, public=False)
+    assert index.vocabulary("gu") == [("guten", 3), ("gut", 1)]
+    assert index.search("tag", prefix_last=False) == [("private", 0)]
+
+
+def test_lessons_with_the_same_key_each_get_their_hits():
+    index = make_index()
+    hits = index.search_lessons("guten", {"Meine Grüße": "greetings", "Kopie": "greetings", "Essen": "food"},
+                                prefix_last=False)
+    assert hits == [("Meine Grüße", 0), ("Meine Grüße", 1), ("Kopie", 0), ("Kopie", 1), ("Essen", 1)]
+    assert len(index.search_lessons("guten", {"A": "greetings", "B": "greetings"}, limit=3)) == 3
+
+
+def test_catalog_lessons_are_reindexed_when_the_file_changes(tmp_path):
+    path = tmp_path / "lessons.json"
+    path.write_text(json.dumps({"Begrüßung": GREETINGS, "Essen": FOOD}))
+    catalog = LessonCatalog(str(path))
+    indexer = LibraryIndexer()
+    indexer.sync_catalog("lessons.json", catalog)
+    assert indexer.index.search("brot") == [(("lessons.json", "Essen"), 0)]
+
+    path.write_text(json.dumps({"Begrüßung": GREETINGS}) + " " * 10)
+    indexer.sync_catalog("lessons.json", catalog)
+    assert indexer.index.search("brot") == []
+    assert indexer.index.keys() == [("lessons.json", "Begrüßung")]
+
+
+def test_stored_lessons_are_indexed_once_per_body_and_dropped_when_deleted(tmp_path):
+    store = CustomLessonStore(str(tmp_path / "custom_lessons.db"))
+    digest = store.save("anna", "Essen", FOOD)
+    assert store.save("ben", "Mein Essen", FOOD) == digest
+    indexer = LibraryIndexer()
+    indexer.sync_store(store, [digest])
+    indexer.sync_store(store, [digest])
+    assert indexer.index.keys() == [digest]
+    assert indexer.index.search_lessons("brot", {"Essen": digest, "Mein Essen": digest}) == [
+        ("Essen", 0), ("Mein Essen", 0)]
+    # Private lessons stay out of the vocabulary
+    assert indexer.index.vocabulary("brot") == []
+
+    store.delete("anna", "Essen")
+    store.delete("ben", "Mein Essen")
+    indexer.sync_store(store, [])
+    assert digest not in indexer.index
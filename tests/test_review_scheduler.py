@@ -0,0 +1,98 @@
+import pytest
+
+from game_session import GameSession
+from progress_store import JsonProgressBackend
+from review_scheduler import (
+    DAY, DEFAULT_EASE, MAX_INTERVAL, MIN_EASE, RELEARN_DELAY, ReviewScheduler, quality_from_attempts, sm2,
+)
+
+
+def test_successful_reviews_follow_the_sm2_intervals():
+    repetitions, interval, ease = sm2(0, 0, DEFAULT_EASE, 5)
+    assert (repetitions, interval) == (1, DAY)
+    assert ease == pytest.approx(2.6)
+    repetitions, interval, ease = sm2(repetitions, interval, ease, 5)
+    assert (repetitions, interval) == (2, 6 * DAY)
+    repetitions, interval, ease = sm2(repetitions, interval, ease, 4)
+    assert repetitions == 3
+    assert ease == pytest.approx(2.7)
+    assert interval == round(6 * DAY * 2.7)
+
+
+def test_a_failed_review_restarts_the_card_soon():
+    repetitions, interval, ease = sm2(4, 30 * DAY, 2.5, 2)
+    assert (repetitions, interval) == (0, RELEARN_DELAY)
+    assert ease == pytest.approx(2.18)
+
+
+def test_ease_never_drops_below_the_minimum():
+    ease = DEFAULT_EASE
+    for _ in range(20):
+        _, _, ease = sm2(0, 0, ease, 0)
+    assert ease == MIN_EASE
+
+
+def test_quality_depends_on_the_attempts_needed():
+    assert [quality_from_attempts(attempts) for attempts in (1, 2, 3, 4, 10)] == [5, 4, 3, 2, 2]
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    scheduler = ReviewScheduler(str(tmp_path / "reviews.db"))
+    yield scheduler
+    scheduler.close()
+
+
+def test_reviewed_cards_come_due_in_due_order(scheduler):
+    scheduler.review("anna", "Greetings", 0, 5, now=0)
+    scheduler.review("anna", "Greetings", 1, 1, now=0)
+    scheduler.review("anna", "Numbers", 3, 5, now=100)
+    scheduler.review("ben", "Greetings", 0, 1, now=0)
+
+    assert [(card.lesson, card.question_index) for card in scheduler.due("anna", now=RELEARN_DELAY)] == [
+        ("Greetings", 1)
+    ]
+    due = scheduler.due("anna", now=2 * DAY)
+    assert [(card.lesson, card.question_index) for card in due] == [("Greetings", 1), ("Greetings", 0), ("Numbers", 3)]
+    assert scheduler.due_count("anna", now=2 * DAY) == 3
+    assert len(scheduler.due("anna", limit=2, now=2 * DAY)) == 2
+    assert scheduler.next_due("anna") == RELEARN_DELAY
+    assert scheduler.next_due("nobody") is None
+
+
+def test_reviews_update_the_stored_card(scheduler):
+    scheduler.review("anna", "Greetings", 0, 5, now=0)
+    card = scheduler.review("anna", "Greetings", 0, 2, now=DAY)
+    assert card == scheduler.card("anna", "Greetings", 0)
+    assert (card.repetitions, card.interval, card.lapses) == (0, RELEARN_DELAY, 1)
+    assert card.due == DAY + RELEARN_DELAY
+
+
+def test_intervals_are_capped():
+    repetitions, interval, ease = 5, 300 * DAY, 3.0
+    for _ in range(50):
+        repetitions, interval, ease = sm2(repetitions, interval, ease, 5)
+    assert interval == MAX_INTERVAL
+
+
+def test_answering_a_card_before_it_is_due_leaves_it_alone(scheduler):
+    first = scheduler.review("anna", "Greetings", 0, 5, now=0)
+    assert scheduler.review("anna", "Greetings", 0, 5, now=DAY / 2) == first
+    assert scheduler.review("anna", "Greetings", 0, 1, now=DAY / 2) == first
+    assert scheduler.review("anna", "Greetings", 0, 5, now=DAY).repetitions == 2
+
+
+def test_replaying_a_lesson_all_day_does_not_stretch_its_cards(scheduler, tmp_path):
+    lessons = {"Greetings": {"questions": [{"prompt": "Hello", "answer": "Hallo"}, {"prompt": "Bye", "answer": "Tschüss"}]}}
+    game = GameSession("anna", JsonProgressBackend(str(tmp_path)), lessons, scheduler=scheduler)
+    game.load()
+    game.select_lesson("Greetings")
+    for _ in range(30):
+        for question in lessons["Greetings"]["questions"]:
+            assert game.submit(question["answer"])
+            game.advance()
+        game.complete_lesson()
+        game.restart_lesson()
+    for question_index in (0, 1):
+        card = scheduler.card("anna", "Greetings", question_index)
+        assert (card.repetitions, card.interval) == (1, DAY)
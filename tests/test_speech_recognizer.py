@@ -0,0 +1,49 @@
+import pytest
+
+from speech_recognizer import (
+    FakeBackend, FileBackend, GoogleBackend, RecognitionCancelled, RecognitionError, RecognitionPool, open_backend,
+)
+
+
+@pytest.fixture
+def pool():
+    pool = RecognitionPool(workers=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_jobs_return_the_recognized_text_and_keep_their_key(pool):
+    job = pool.submit(FakeBackend(["Guten Morgen"]), key=("Greetings", 1))
+    assert job.wait(5)
+    assert job.result() == "Guten Morgen"
+    assert job.key == ("Greetings", 1)
+
+
+def test_failures_surface_as_recognition_errors(pool):
+    backend = FakeBackend([RecognitionError("Entschuldigung"), ValueError("kaputt")])
+    for message in ("Entschuldigung", "kaputt", "Keine Sprache"):
+        job = pool.submit(backend)
+        job.wait(5)
+        with pytest.raises(RecognitionError, match=message):
+            job.result()
+    stats = pool.latency_stats()["fake"]
+    assert (stats["count"], stats["errors"]) == (3, 3)
+
+
+def test_a_cancelled_job_reports_the_cancellation(pool):
+    job = pool.submit(FakeBackend(["zu spät"], delay=5))
+    assert not job.wait(0.05)
+    job.cancel()
+    assert job.wait(5)
+    with pytest.raises(RecognitionCancelled):
+        job.result()
+
+
+def test_open_backend_selects_by_name():
+    assert isinstance(open_backend("google", listen_timeout=1), GoogleBackend)
+    assert isinstance(open_backend("file", path="antwort.wav", listen_timeout=1), FileBackend)
+    assert isinstance(open_backend("fake", answers=["ja"], phrase_time_limit=1), FakeBackend)
+    with pytest.raises(ValueError):
+        open_backend("file")
+    with pytest.raises(ValueError):
+        open_backend("telepathy")
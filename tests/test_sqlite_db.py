@@ -0,0 +1,61 @@
+import os
+import threading
+
+import pytest
+
+from sqlite_db import SqliteDatabase
+
+
+class Counters(SqliteDatabase):
+    SCHEMA = "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+
+    def add(self, name, amount=1, fail=False):
+        with self._transaction() as conn:
+            value = self.value(name)
+            conn.execute("INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)", (name, value + amount))
+            if fail:
+                raise RuntimeError("rolled back")
+
+    def value(self, name):
+        rows = self._query("SELECT value FROM counters WHERE name = ?", (name,))
+        return rows[0][0] if rows else 0
+
+
+@pytest.fixture
+def counters(tmp_path):
+    counters = Counters(str(tmp_path / "counters.db"))
+    yield counters
+    counters.close()
+
+
+def test_failed_transactions_are_rolled_back(counters):
+    counters.add("a")
+    with pytest.raises(RuntimeError):
+        counters.add("a", 5, fail=True)
+    assert counters.value("a") == 1
+
+
+def test_concurrent_transactions_do_not_lose_increments(counters):
+    threads = [threading.Thread(target=lambda: [counters.add("a") for _ in range(50)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counters.value("a") == 400
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc to count open files")
+def test_short_lived_threads_do_not_leave_connections_open(counters):
+    counters.value("a")
+    before = len(os.listdir("/proc/self/fd"))
+    for _ in range(100):
+        thread = threading.Thread(target=counters.value, args=("a",))
+        thread.start()
+        thread.join()
+    assert len(os.listdir("/proc/self/fd")) <= before
+
+
+def test_a_closed_database_opens_again_on_use(counters):
+    counters.add("a")
+    counters.close()
+    assert counters.value("a") == 1
@@ -0,0 +1,154 @@
+import gc
+import threading
+import time
+
+import pytest
+
+from progress_store import ProgressBackend
+from write_behind import SessionFlushGuard, WriteBehindStore
+
+
+class BlockingBackend(ProgressBackend):
+    # Records saves in memory; while block is set, a save waits until release is set
+    def __init__(self):
+        self.progress = {}
+        self.achievements = {}
+        self.saves = 0
+        self.fail = False
+        self.block = threading.Event()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+        # Called at the start of every save, e.g. to drop a session in the middle of a flush
+        self.on_save = None
+
+    def load_progress(self, username):
+        return self.progress.get(username)
+
+    def load_achievements(self, username):
+        return dict(self.achievements.get(username, {}))
+
+    def save(self, username, progress=None, achievements=None):
+        if self.on_save is not None:
+            self.on_save()
+        if self.block.is_set():
+            self.writing.set()
+            self.release.wait(5)
+        if self.fail:
+            raise OSError("disk full")
+        self.saves += 1
+        if progress is not None:
+            self.progress[username] = progress
+        if achievements is not None:
+            self.achievements[username] = achievements
+
+    def usernames(self):
+        return sorted(set(self.progress) | set(self.achievements))
+
+
+@pytest.fixture
+def backend():
+    return BlockingBackend()
+
+
+@pytest.fixture
+def store(backend):
+    store = WriteBehindStore(backend, flush_interval=3600)
+    yield store
+    backend.release.set()
+    store.close()
+
+
+def flush_in_background(store, backend):
+    # Starts a flush and returns once it is inside the backend write
+    backend.block.set()
+    thread = threading.Thread(target=store.flush)
+    thread.start()
+    assert backend.writing.wait(5)
+    return thread
+
+
+def test_saves_are_coalesced_until_flushed(store, backend):
+    for score in range(5):
+        store.save("anna", progress={"score": score})
+    assert backend.saves == 0
+    assert store.load_progress("anna") == {"score": 4}
+    store.flush()
+    assert backend.saves == 1 and backend.progress["anna"] == {"score": 4}
+
+
+def test_unchanged_state_is_not_written_again(store, backend):
+    store.save("anna", progress={"score": 1, "timestamp": "a"}, achievements={"Anfänger": "x"})
+    store.flush()
+    store.save("anna", progress={"score": 1, "timestamp": "b"}, achievements={"Anfänger": "x"})
+    assert store.pending() == 0
+    assert store.skipped == 2
+
+
+def test_reverting_during_an_in_flight_write_is_not_lost(store, backend):
+    store.save("anna", progress={"score": 0})
+    store.flush()
+    store.save("anna", progress={"score": 10})
+    thread = flush_in_background(store, backend)
+    store.save("anna", progress={"score": 0})
+    backend.block.clear()
+    backend.release.set()
+    thread.join()
+    store.flush()
+    assert backend.progress["anna"] == {"score": 0}
+
+
+def test_saving_the_in_flight_state_again_is_skipped(store, backend):
+    store.save("anna", progress={"score": 10})
+    thread = flush_in_background(store, backend)
+    store.save("anna", progress={"score": 10})
+    assert store.pending() == 0
+    backend.block.clear()
+    backend.release.set()
+    thread.join()
+    assert backend.saves == 1
+
+
+def test_a_failed_write_is_retried_without_overriding_newer_saves(store, backend):
+    store.save("anna", progress={"score": 10}, achievements={"Anfänger": "x"})
+    backend.fail = True
+    thread = flush_in_background(store, backend)
+    store.save("anna", progress={"score": 20})
+    backend.block.clear()
+    backend.release.set()
+    thread.join()
+    backend.fail = False
+    store.flush()
+    assert backend.progress["anna"] == {"score": 20}
+    assert backend.achievements["anna"] == {"Anfänger": "x"}
+
+
+def test_listeners_see_every_committed_write(store, backend):
+    commits = []
+    store.add_listener(lambda username, progress, achievements: commits.append((username, progress)))
+    store.save("anna", progress={"score": 5})
+    store.save("ben", achievements={"Streber": "y"})
+    store.flush()
+    assert sorted(commits, key=lambda commit: commit[0]) == [("anna", {"score": 5}), ("ben", None)]
+
+
+def test_a_dropped_session_is_flushed_by_the_background_thread(store, backend):
+    store.save("anna", progress={"score": 5})
+    guard = SessionFlushGuard(store, "anna")
+    del guard
+    gc.collect()
+    deadline = time.monotonic() + 5
+    while "anna" not in backend.progress and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert backend.progress["anna"] == {"score": 5}
+
+
+def test_a_guard_finalized_during_a_flush_does_not_deadlock(store, backend):
+    guards = [SessionFlushGuard(store, "ben")]
+    backend.on_save = lambda: (guards.clear(), gc.collect())
+    store.save("anna", progress={"score": 1})
+    store.save("ben", progress={"score": 2})
+    thread = threading.Thread(target=store.flush, daemon=True)
+    thread.start()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert backend.progress["ben"] == {"score": 2}
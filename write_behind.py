@@ -0,0 +1,187 @@
+import atexit
+import copy
+import logging
+import threading
+import time
+import weakref
+from collections import deque
+
+from metrics import span
+from progress_store import ProgressBackend
+
+logger = logging.getLogger(__name__)
+
+# Keys that change on every save without the state itself changing
+VOLATILE_KEYS = ("timestamp",)
+
+
+def _comparable(progress):
+    return {key: value for key, value in progress.items() if key not in VOLATILE_KEYS}
+
+
+class WriteBehindStore(ProgressBackend):
+    # Coalesces saves per user in memory and writes them to the wrapped backend from a background thread
+
+    def __init__(self, backend, flush_interval=2.0):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.writes = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+        # Serializes flushes so an older batch can never be written after a newer one
+        self._flush_lock = threading.Lock()
+        # username -> {"progress": ..., "achievements": ...} waiting to be written
+        self._dirty = {}
+        # username -> last state known to be in the backend
+        self._committed_progress = {}
+        self._committed_achievements = {}
+        # username -> the entry a flush is writing right now, which the backend will hold once it succeeds
+        self._writing = {}
+        # Called as listener(username, progress, achievements) after each write reached the backend
+        self._listeners = []
+        # Usernames whose writes should go out before the next periodic flush; appended to without any lock,
+        # so finalizers running inside garbage collection on any thread can queue them
+        self._requested = deque()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="progress-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_interval
+        while not self._stop.is_set():
+            self._wake.wait(max(0.0, next_flush - time.monotonic()))
+            self._wake.clear()
+            while self._requested:
+                self.flush(self._requested.popleft())
+            if time.monotonic() >= next_flush:
+                self.flush()
+                next_flush = time.monotonic() + self.flush_interval
+
+    def request_flush(self, username):
+        # Has the background thread flush username soon; takes no lock and does no I/O, so it is safe anywhere
+        self._requested.append(username)
+        self._wake.set()
+
+    def load_progress(self, username):
+        with self._lock:
+            pending = self._dirty.get(username, {}).get("progress")
+            if pending is not None:
+                return copy.deepcopy(pending)
+        progress = self.backend.load_progress(username)
+        if progress is not None:
+            with self._lock:
+                self._committed_progress.setdefault(username, _comparable(progress))
+        return progress
+
+    def load_achievements(self, username):
+        with self._lock:
+            pending = self._dirty.get(username, {}).get("achievements")
+            if pending is not None:
+                return dict(pending)
+        achievements = self.backend.load_achievements(username)
+        with self._lock:
+            self._committed_achievements.setdefault(username, dict(achievements))
+        return achievements
+
+    def save(self, username, progress=None, achievements=None):
+        with self._lock:
+            entry = self._dirty.get(username, {})
+            writing = self._writing.get(username, {})
+            if progress is not None:
+                # Unchanged means equal to what the backend holds after the write in flight, not before it
+                expected = writing.get("progress", self._committed_progress.get(username))
+                if _comparable(progress) == expected:
+                    entry.pop("progress", None)
+                    self.skipped += 1
+                else:
+                    entry["progress"] = copy.deepcopy(progress)
+            if achievements is not None:
+                expected = writing.get("achievements", self._committed_achievements.get(username))
+                if achievements == expected:
+                    entry.pop("achievements", None)
+                    self.skipped += 1
+                else:
+                    entry["achievements"] = dict(achievements)
+            if entry:
+                self._dirty[username] = entry
+            else:
+                self._dirty.pop(username, None)
+
+    def flush(self, username=None):
+        with self._flush_lock:
+            self._flush(username)
+
+    def _flush(self, username):
+        with self._lock:
+            if username is None:
+                batch, self._dirty = self._dirty, {}
+            elif username in self._dirty:
+                batch = {username: self._dirty.pop(username)}
+            else:
+                batch = {}
+            for name, entry in batch.items():
+                self._writing[name] = {
+                    key: _comparable(value) if key == "progress" else value for key, value in entry.items()
+                }
+
+        for name, entry in batch.items():
+            try:
+                with span("progress_write"):
+                    self.backend.save(name, progress=entry.get("progress"), achievements=entry.get("achievements"))
+            except Exception:
+                logger.exception("Could not write progress for %s, will retry", name)
+                with self._lock:
+                    del self._writing[name]
+                    # Keep anything newer that was staged while we were writing
+                    newer = self._dirty.setdefault(name, {})
+                    for key, value in entry.items():
+                        newer.setdefault(key, value)
+                continue
+            with self._lock:
+                del self._writing[name]
+                self.writes += 1
+                if "progress" in entry:
+                    self._committed_progress[name] = _comparable(entry["progress"])
+                if "achievements" in entry:
+                    self._committed_achievements[name] = entry["achievements"]
+            for listener in self._listeners:
+                try:
+                    listener(name, entry.get("progress"), entry.get("achievements"))
+                except Exception:
+                    logger.exception("Commit listener failed for %s", name)
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def pending(self):
+        with self._lock:
+            return len(self._dirty)
+
+    def usernames(self):
+        self.flush()
+        return self.backend.usernames()
+
+    def iter_progress(self):
+        self.flush()
+        return self.backend.iter_progress()
+
+    def close(self):
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        self.backend.close()
+        atexit.unregister(self.close)
+
+
+class SessionFlushGuard:
+    # Kept in a user's session state; has that user's pending writes flushed once the session is dropped.
+    # The finalizer may run inside garbage collection on a thread holding the store's locks, so it only queues
+
+    def __init__(self, store, username):
+        self.username = username
+        weakref.finalize(self, store.request_flush, username)